@@ -8,3 +8,15 @@ class FraudDetectionConfig(AppConfig):
 
     def ready(self):
         import fraud_detection.signals  # Import signals here
+
+        from django.conf import settings
+        if settings.ML_PRELOAD_MODEL:
+            # Designated scoring processes load the ML stack up front so the
+            # first request does not spend its scoring budget on imports
+            import threading
+            threading.Thread(target=_preload_behavioral_model, daemon=True).start()
+
+
+def _preload_behavioral_model():
+    from fraud_detection.ml_registry import BehavioralModelRegistry
+    BehavioralModelRegistry().load_active()
@@ -0,0 +1,224 @@
+# fraud_detection/backtest.py
+"""
+What-if backtesting of scoring weights and decision thresholds. The
+per-component scores RiskScoringService produces are loaded once for a
+window of historical applications into NumPy arrays; a grid of weight and
+threshold configurations is then scored in one vectorized pass, reporting
+each configuration's decision distribution, decision flips against the
+current configuration and alert volume.
+"""
+import itertools
+
+import numpy as np
+
+from .models import LoanApplication
+from .rescoring import SCORING_FIELDS, ml_adjustment
+from .risk_context import RiskContext
+from .rules import get_rule_plan
+from .services import RiskScoringService
+
+LOAD_CHUNK_SIZE = 2000
+# Upper bound on applications x configurations scored at once (~8 bytes each)
+MAX_CELLS_PER_PASS = 20_000_000
+# Rule-based detection raises an alert above this score ("High risk score detected")
+HIGH_RISK_ALERT_SCORE = 70.0
+
+# Components whose scores do not depend on the weights; the device
+# component does (it is scaled by the device weight before weighting)
+FIXED_COMPONENTS = ('identity', 'ip', 'history')
+WEIGHT_NAMES = ('identity', 'device', 'ip', 'history')
+
+
+class ComponentScores:
+    """
+    Scoring inputs of a set of applications as parallel arrays: the fixed
+    components, the raw device rule total, the ML adjustment applied to
+    applications scored by ML, and whether a rule other than the score
+    threshold raised an alert.
+    """
+
+    def __init__(self, ids, fixed, device_total, has_visitor, ml_adjustment, signal_alert):
+        self.ids = ids
+        self.fixed = fixed                  # (n, 3) identity, ip, history
+        self.device_total = device_total    # (n,) sum of matching device rule scores
+        self.has_visitor = has_visitor      # (n,) device risk is a flat 50 without one
+        self.ml_adjustment = ml_adjustment  # (n,) 0 unless ML scoring completed
+        self.signal_alert = signal_alert    # (n,) alerted regardless of the score
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def load_component_scores(since=None, until=None, chunk_size=LOAD_CHUNK_SIZE):
+    """
+    Component scores of the applications submitted in [since, until),
+    computed with the current ruleset and counters loaded chunk by chunk
+    with RiskContext.load_many, windows ending at each application's
+    submission as for rescoring. The similar-applications check is not
+    replayed, so its alerts are not part of signal_alert.
+    """
+    plan = get_rule_plan()
+    scoring = RiskScoringService()
+    device_fields = sorted({rule['field'] for rule in plan.device_rules})
+
+    applications = LoanApplication.objects.only(*SCORING_FIELDS).order_by('pk')
+    if since:
+        applications = applications.filter(application_date__gte=since)
+    if until:
+        applications = applications.filter(application_date__lt=until)
+
+    ids, fixed, device_total, has_visitor, ml_adjustments, signal_alert = [], [], [], [], [], []
+    last_pk = None
+    while True:
+        chunk = applications.filter(pk__gt=last_pk) if last_pk else applications
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1].pk
+
+        contexts = RiskContext.load_many(chunk)
+        device_total.append(plan.device_scores_batch(
+            {field: [getattr(app, field) for app in chunk] for field in device_fields}
+        ))
+        for app in chunk:
+            context = contexts[app.id]
+            scores = scoring.component_scores(app, context)
+            ids.append(app.id)
+            fixed.append([scores[name] for name in FIXED_COMPONENTS])
+            has_visitor.append(bool(app.visitor_id_id))
+            ml_adjustments.append(ml_adjustment(app))
+            signal_alert.append(
+                context.visitor_recent >= 1
+                or context.shared_identity_other_visitors > 0
+                or plan.fake_data_match(app) is not None
+            )
+
+    return ComponentScores(
+        ids,
+        np.array(fixed, dtype=float).reshape(-1, len(FIXED_COMPONENTS)),
+        np.concatenate(device_total) if device_total else np.zeros(0),
+        np.array(has_visitor, dtype=bool),
+        np.array(ml_adjustments, dtype=float),
+        np.array(signal_alert, dtype=bool),
+    )
+
+
+def current_configuration():
+    """The weights, decision bounds and alert threshold in effect now."""
+    scoring = RiskScoringService()
+    return {
+        'weights': {
+            'identity': scoring.IDENTITY_WEIGHT,
+            'device': scoring.DEVICE_WEIGHT,
+            'ip': scoring.IP_WEIGHT,
+            'history': scoring.HISTORY_WEIGHT,
+        },
+        'decision_bounds': list(get_rule_plan().decision_bounds),
+        'alert_above': HIGH_RISK_ALERT_SCORE,
+    }
+
+
+def configuration_grid(weights, decision_bounds, alert_above):
+    """
+    Cartesian product of candidate values. `weights` maps each weight name
+    to its candidates, `decision_bounds` is one list of candidates per
+    decision bound; bound combinations that are not increasing are skipped.
+    """
+    configurations = []
+    for weight_values in itertools.product(*(weights[name] for name in WEIGHT_NAMES)):
+        for bounds in itertools.product(*decision_bounds):
+            if any(low >= high for low, high in zip(bounds, bounds[1:])):
+                continue
+            for alert in alert_above:
+                configurations.append({
+                    'weights': dict(zip(WEIGHT_NAMES, map(float, weight_values))),
+                    'decision_bounds': [float(bound) for bound in bounds],
+                    'alert_above': float(alert),
+                })
+    return configurations
+
+
+def score_grid(components, configurations):
+    """
+    Final risk scores, (n applications, k configurations), as
+    RiskScoringService.combine_scores plus the ML adjustment would produce
+    them under each configuration's weights.
+    """
+    weights = np.array([[config['weights'][name] for name in WEIGHT_NAMES] for config in configurations])
+    device_weight = weights[:, 1]
+    fixed_weights = weights[:, [0, 2, 3]]
+
+    # _calculate_device_risk scales by the device weight, and combine_scores weights it again
+    device = np.where(
+        components.has_visitor[:, None],
+        np.clip(components.device_total[:, None] * device_weight[None, :], 0, 100),
+        50.0
+    )
+    scores = components.fixed @ fixed_weights.T + device * device_weight[None, :]
+    scores = np.clip(scores, 0, 100)
+    # ML-scored applications carry their adjustment on top of the rule-based score
+    return np.minimum(100, scores + components.ml_adjustment[:, None])
+
+
+def _evaluate_pass(components, configurations, baseline_decisions, baseline_alerts, decisions):
+    scores = score_grid(components, configurations)
+    bounds = np.array([config['decision_bounds'] for config in configurations])
+    alert_above = np.array([config['alert_above'] for config in configurations])
+
+    # Same rule as RulePlan.decide: the first bound the score does not exceed
+    indexes = (scores[:, :, None] > bounds[None, :, :]).sum(axis=2)
+    alerts = components.signal_alert[:, None] | (scores > alert_above[None, :])
+
+    counts = np.stack([(indexes == i).sum(axis=0) for i in range(len(decisions))], axis=1)
+    flipped = indexes != baseline_decisions[:, None]
+    # Transition counts, (k, from, to)
+    transitions = np.zeros((len(configurations), len(decisions), len(decisions)), dtype=int)
+    for src in range(len(decisions)):
+        rows = baseline_decisions == src
+        for dst in range(len(decisions)):
+            if src != dst:
+                transitions[:, src, dst] = (indexes[rows] == dst).sum(axis=0)
+
+    return [
+        {
+            'configuration': config,
+            'decisions': dict(zip(decisions, counts[k].tolist())),
+            'flips': int(flipped[:, k].sum()),
+            'transitions': {
+                f"{decisions[src]}->{decisions[dst]}": int(transitions[k, src, dst])
+                for src in range(len(decisions)) for dst in range(len(decisions))
+                if transitions[k, src, dst]
+            },
+            'alerts': int(alerts[:, k].sum()),
+            'alert_delta': int(alerts[:, k].sum()) - baseline_alerts,
+            'mean_score': float(scores[:, k].mean()) if len(components) else 0.0,
+        }
+        for k, config in enumerate(configurations)
+    ]
+
+
+def backtest(components, configurations, baseline=None):
+    """
+    Evaluate every configuration against the baseline (the current
+    configuration by default). Returns the baseline's result and one result
+    per configuration, in order. Configurations are scored in passes of at
+    most MAX_CELLS_PER_PASS cells to bound memory.
+    """
+    baseline = baseline or current_configuration()
+    decisions = get_rule_plan().decisions
+    for config in [baseline] + list(configurations):
+        if len(config['decision_bounds']) != len(decisions) - 1:
+            raise ValueError(f"Expected {len(decisions) - 1} decision bounds, got {config['decision_bounds']}")
+
+    baseline_scores = score_grid(components, [baseline])[:, 0]
+    baseline_decisions = (baseline_scores[:, None] > np.array(baseline['decision_bounds'])[None, :]).sum(axis=1)
+    baseline_alerts = int((components.signal_alert | (baseline_scores > baseline['alert_above'])).sum())
+    baseline_result = _evaluate_pass(components, [baseline], baseline_decisions, baseline_alerts, decisions)[0]
+
+    per_pass = max(1, MAX_CELLS_PER_PASS // max(len(components), 1))
+    results = []
+    for start in range(0, len(configurations), per_pass):
+        results.extend(_evaluate_pass(
+            components, configurations[start:start + per_pass], baseline_decisions, baseline_alerts, decisions
+        ))
+    return baseline_result, results
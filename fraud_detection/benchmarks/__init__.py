@@ -0,0 +1 @@
+# fraud_detection/benchmarks/__init__.py
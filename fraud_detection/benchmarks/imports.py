@@ -0,0 +1,86 @@
+# fraud_detection/benchmarks/imports.py
+"""
+Import-time and memory benchmark. Each scenario runs in a fresh
+interpreter so it measures a cold start, reporting Django setup time,
+the time to import the scenario's modules, peak RSS and which heavy ML
+libraries ended up loaded.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Libraries that only scoring and training processes should load
+HEAVY_MODULES = ('numpy', 'pandas', 'scipy', 'sklearn', 'joblib')
+
+SCENARIOS = {
+    # What every manage.py command pays before doing any work
+    'django_setup': {'imports': [], 'load_model': False},
+    # A web worker serving the loan form, login and staff pages
+    'web_worker': {'imports': ['fraud_prevention.urls', 'fraud_prevention.wsgi'], 'load_model': False},
+    'services': {'imports': ['fraud_detection.services'], 'load_model': False},
+    'ml_services': {'imports': ['fraud_detection.ml_services'], 'load_model': False},
+    # A scoring process after its first request
+    'ml_model': {'imports': ['fraud_detection.ml_registry'], 'load_model': True},
+}
+
+# Scenarios that must not import anything in HEAVY_MODULES
+LAZY_SCENARIOS = ('django_setup', 'web_worker', 'services')
+
+_CHILD = """
+import importlib, json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+for name in {imports!r}:
+    importlib.import_module(name)
+if {load_model!r}:
+    from fraud_detection.ml_registry import BehavioralModelRegistry
+    BehavioralModelRegistry().load_active()
+finished = time.perf_counter()
+print(json.dumps({{
+    'setup_ms': (setup_done - started) * 1000,
+    'import_ms': (finished - setup_done) * 1000,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'heavy_modules': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def run_scenario(name, repeat=3):
+    """Run one scenario `repeat` times in fresh interpreters and return median figures."""
+    scenario = SCENARIOS[name]
+    code = _CHILD.format(imports=scenario['imports'], load_model=scenario['load_model'], heavy=HEAVY_MODULES)
+
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', code],
+            capture_output=True, text=True, check=True, env=os.environ.copy()
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    return {
+        'scenario': name,
+        'runs': repeat,
+        'setup_ms': round(statistics.median(run['setup_ms'] for run in runs), 1),
+        'import_ms': round(statistics.median(run['import_ms'] for run in runs), 1),
+        'max_rss_mb': round(statistics.median(run['max_rss_kb'] for run in runs) / 1024, 1),
+        'heavy_modules': runs[-1]['heavy_modules'],
+    }
+
+
+def run_benchmarks(names=None, repeat=3):
+    """Run the named scenarios (default: all) and return their results in order."""
+    return [run_scenario(name, repeat) for name in (names or SCENARIOS)]
+
+
+def lazy_violations(results):
+    """Scenarios from LAZY_SCENARIOS that loaded a heavy module, with the modules."""
+    return {
+        result['scenario']: result['heavy_modules']
+        for result in results
+        if result['scenario'] in LAZY_SCENARIOS and result['heavy_modules']
+    }
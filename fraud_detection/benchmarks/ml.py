@@ -0,0 +1,170 @@
+# fraud_detection/benchmarks/ml.py
+"""
+Scaling benchmarks for the behavioral ML pipeline. For each history size
+a synthetic dataset is generated and every stage is measured for wall
+time, peak Python memory (tracemalloc) and database queries. Models and
+snapshots go to a temporary directory so the active model is untouched.
+"""
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from fraud_detection.models import LoanApplication
+
+from .synthetic import generate_applications
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+# Single-application stages are averaged over this many applications
+SINGLE_CALLS = 50
+BATCH_SIZE = 500
+
+
+class BenchmarkRunner:
+    """Runs named stages and collects one result dict per stage."""
+
+    def __init__(self, size, trace_memory=True):
+        self.size = size
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def measure(self, name, func, calls=1):
+        """Run func once, record its cost (per call when it loops `calls` times) and return its result."""
+        if self.trace_memory:
+            tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+        if self.trace_memory:
+            tracemalloc.stop()
+
+        self.results.append({
+            'size': self.size,
+            'benchmark': name,
+            'calls': calls,
+            'seconds': round(elapsed, 6),
+            'ms_per_call': round(elapsed * 1000 / calls, 4),
+            'peak_memory_mb': round(peak / 2 ** 20, 3) if peak is not None else None,
+            'queries': len(queries),
+            'queries_per_call': round(len(queries) / calls, 2),
+        })
+        return result
+
+
+def run_size(size, seed=0, trace_memory=True):
+    """Benchmark every stage against a freshly generated history of `size` applications."""
+    # Imported here so the benchmark command itself starts without the ML stack
+    from sklearn.cluster import DBSCAN
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+
+    from fraud_detection.feature_snapshot import FeatureSnapshot
+    from fraud_detection.ml_registry import DBSCAN_EPS, DBSCAN_MIN_SAMPLES, BehavioralModelRegistry
+    from fraud_detection.ml_services import BehavioralPatternAnalyzer, MLFraudEnhancer
+
+    runner = BenchmarkRunner(size, trace_memory=trace_memory)
+    runner.measure('generate_applications', lambda: generate_applications(size, seed=seed))
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        analyzer = BehavioralPatternAnalyzer(registry=BehavioralModelRegistry(model_dir))
+        analyzer.snapshot = FeatureSnapshot(Path(model_dir) / 'snapshots')
+        enhancer = MLFraudEnhancer()
+        enhancer.behavioral_analyzer = analyzer
+
+        applications = LoanApplication.objects.select_related('visitor_id')
+        singles = list(applications.order_by('-application_date')[:SINGLE_CALLS])
+        batch = list(applications.order_by('-application_date')[:BATCH_SIZE])
+
+        runner.measure(
+            'extract_features_single',
+            lambda: [analyzer.extract_behavioral_features(app) for app in singles],
+            calls=len(singles)
+        )
+        runner.measure('extract_features_batch', lambda: analyzer.extract_behavioral_features_batch(LoanApplication.objects.all()))
+        runner.measure('feature_store_backfill', lambda: analyzer.feature_store.backfill())
+
+        window_start = timezone.now() - timedelta(days=settings.ML_TRAINING_WINDOW_DAYS)
+        _, X = runner.measure('build_training_matrix', lambda: analyzer.build_training_matrix(since=window_start))
+
+        X_scaled = runner.measure('scaler_fit', lambda: StandardScaler().fit_transform(X))
+        forest = runner.measure(
+            'isolation_forest_fit',
+            lambda: IsolationForest(contamination=0.1, random_state=42, n_estimators=100).fit(X_scaled)
+        )
+        runner.measure('isolation_forest_score', lambda: forest.decision_function(X_scaled))
+        runner.measure('dbscan_fit', lambda: DBSCAN(eps=DBSCAN_EPS, min_samples=DBSCAN_MIN_SAMPLES).fit(X_scaled))
+        model = runner.measure('train_model', lambda: analyzer.train_model())
+        if model is None:
+            return runner.results
+
+        if model.compiled_forest is not None:
+            row = X_scaled[:1]
+            runner.measure(
+                'compiled_forest_score_single',
+                lambda: [model.compiled_forest.decision_function(row) for _ in range(SINGLE_CALLS)],
+                calls=SINGLE_CALLS
+            )
+
+        runner.measure(
+            'analyze_current_application',
+            lambda: [analyzer.analyze_current_application(app) for app in singles],
+            calls=len(singles)
+        )
+        runner.measure(
+            'enhance_fraud_detection',
+            lambda: [enhancer.enhance_fraud_detection(app, float(app.risk_score)) for app in singles],
+            calls=len(singles)
+        )
+        runner.measure('enhance_many', lambda: enhancer.enhance_many(batch), calls=len(batch))
+
+    return runner.results
+
+
+def environment():
+    """Versions and settings needed to compare two result files."""
+    import numpy
+    import sklearn
+    import django
+
+    return {
+        'created_at': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'numpy': numpy.__version__,
+        'sklearn': sklearn.__version__,
+        'database': connection.vendor,
+        'training_sample_size': settings.ML_TRAINING_SAMPLE_SIZE,
+    }
+
+
+def find_regressions(results, baseline, tolerance=0.2, metric='ms_per_call'):
+    """
+    Compare results with a baseline run and return the (size, benchmark)
+    entries whose metric grew by more than `tolerance` (0.2 = 20%).
+    """
+    previous = {(r['size'], r['benchmark']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['size'], result['benchmark']))
+        if not before or before.get(metric) in (None, 0) or result.get(metric) is None:
+            continue
+        change = result[metric] / before[metric] - 1
+        if change > tolerance:
+            regressions.append({
+                'size': result['size'],
+                'benchmark': result['benchmark'],
+                'metric': metric,
+                'baseline': before[metric],
+                'current': result[metric],
+                'change': round(change, 3),
+            })
+    return regressions
@@ -0,0 +1,108 @@
+# fraud_detection/benchmarks/synthetic.py
+"""
+Synthetic VisitorID / LoanApplication generator for benchmarks. Rows are
+bulk-inserted with application dates spread over the training window so
+history-dependent features see realistic visitor histories.
+"""
+import json
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from fraud_detection.models import LoanApplication, VisitorID
+from fraud_detection.normalization import email_base, normalize_name
+
+INSERT_BATCH_SIZE = 2000
+
+FIRST_NAMES = ('Ada', 'Bola', 'Chen', 'Dana', 'Emeka', 'Fatima', 'Grace', 'Hiro', 'Ivan', 'Jade')
+LAST_NAMES = ('Okafor', 'Smith', 'Garcia', 'Ito', 'Novak', 'Mensah', 'Khan', 'Brown', 'Silva', 'Adeyemi')
+EMAIL_DOMAINS = ('gmail.com', 'yahoo.com', 'outlook.com', 'hotmail.com', 'proton.me', 'mail.ru')
+BROWSERS = ('Chrome', 'Firefox', 'Safari', 'Edge')
+OPERATING_SYSTEMS = ('Windows', 'macOS', 'Linux', 'Android', 'iOS')
+PURPOSES = ('rent', 'school fees', 'medical bills', 'business expansion', 'car repair', 'wedding')
+
+# Share of applications generated with fraud-like signals (bots, VPNs, reused devices)
+SUSPICIOUS_RATE = 0.08
+
+
+@contextmanager
+def explicit_application_dates():
+    """Let bulk_create keep the generated application_date instead of now()."""
+    field = LoanApplication._meta.get_field('application_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def generate_applications(count, seed=0, days=None, tag='bench'):
+    """
+    Insert `count` applications from about count / 4 visitors and return
+    the number created. Visitor ids are prefixed with `tag` so runs can be
+    told apart from real data.
+    """
+    rng = random.Random(seed)
+    days = days or settings.ML_TRAINING_WINDOW_DAYS
+    now = timezone.now()
+
+    visitors = VisitorID.objects.bulk_create(
+        [
+            VisitorID(
+                visitor_id=f"{tag}-{seed}-{i}",
+                ip_address=f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+                confidence_score=rng.uniform(0.5, 1.0),
+                browser_name=rng.choice(BROWSERS),
+                os=rng.choice(OPERATING_SYSTEMS)
+            )
+            for i in range(max(count // 4, 1))
+        ],
+        batch_size=INSERT_BATCH_SIZE
+    )
+
+    batch = []
+    with explicit_application_dates():
+        for i in range(count):
+            suspicious = rng.random() < SUSPICIOUS_RATE
+            # Suspicious traffic concentrates on a few visitors
+            visitor = visitors[rng.randrange(min(len(visitors), 20))] if suspicious else rng.choice(visitors)
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            full_name = f"{first} {last}"
+            email = f"{first.lower()}.{last.lower()}{rng.randrange(1000)}@{rng.choice(EMAIL_DOMAINS)}"
+            batch.append(LoanApplication(
+                visitor_id=visitor,
+                full_name=full_name,
+                email=email,
+                # bulk_create skips save(), which normally derives these
+                name_key=normalize_name(full_name),
+                email_base=email_base(email),
+                phone=f"+234{rng.randrange(10 ** 9, 10 ** 10)}",
+                address=f"{rng.randrange(1, 200)} {last} Street",
+                amount_requested=round(min(rng.lognormvariate(9, 1), 10 ** 7), 2),
+                purpose=rng.choice(PURPOSES),
+                ip_address=visitor.ip_address,
+                confidence_score=rng.uniform(0.1, 0.6) if suspicious else rng.uniform(0.8, 1.0),
+                bot_detected=suspicious and rng.random() < 0.5,
+                vpn_detected=rng.random() < (0.6 if suspicious else 0.05),
+                proxy_detected=suspicious and rng.random() < 0.3,
+                tor_detected=suspicious and rng.random() < 0.1,
+                tampering_detected=suspicious and rng.random() < 0.2,
+                ip_blocklisted=suspicious and rng.random() < 0.2,
+                incognito=rng.random() < (0.5 if suspicious else 0.1),
+                risk_score=round(rng.uniform(60, 95) if suspicious else rng.uniform(0, 50), 2),
+                metadata=json.dumps({
+                    'browserDetails': {'browser': visitor.browser_name},
+                    'osDetails': {'os': visitor.os}
+                }),
+                application_date=now - timedelta(seconds=rng.randrange(days * 86400))
+            ))
+            if len(batch) >= INSERT_BATCH_SIZE:
+                LoanApplication.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            LoanApplication.objects.bulk_create(batch)
+
+    return count
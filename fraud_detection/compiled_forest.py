@@ -0,0 +1,139 @@
+# fraud_detection/compiled_forest.py
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Maximum absolute difference from sklearn's decision_function accepted
+# when a compiled forest is checked
+PARITY_TOLERANCE = 1e-9
+
+# Rows scored per pass; bounds the (rows x trees) node index array
+ROW_CHUNK_SIZE = 4096
+
+
+def average_path_length(n_samples):
+    """
+    Expected path length of an unsuccessful BST search over n samples,
+    c(n) in the IsolationForest paper; 0 for n <= 1 and 1 for n == 2.
+    """
+    n = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros_like(n)
+    result[n == 2] = 1.0
+    large = n > 2
+    result[large] = 2.0 * (np.log(n[large] - 1.0) + np.euler_gamma) - 2.0 * (n[large] - 1.0) / n[large]
+    return result
+
+
+class CompiledIsolationForest:
+    """
+    A fitted IsolationForest flattened into packed arrays, one slot per
+    node across all trees. Leaves point back to themselves, so every row
+    walks every tree in lockstep for max_depth steps and ends on its leaf,
+    whose stored value is depth + c(n_node_samples).
+    """
+
+    def __init__(self, feature, threshold, left, right, leaf_value, roots, max_depth, max_samples, offset):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.max_samples = max_samples
+        self.offset = offset
+        self.normalizer = len(roots) * float(average_path_length([max_samples])[0])
+
+    def score_samples(self, X):
+        """Same as IsolationForest.score_samples: lower = more anomalous."""
+        # sklearn evaluates trees on float32 input against float64 thresholds
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        scores = np.empty(len(X), dtype=np.float64)
+
+        for start in range(0, len(X), ROW_CHUNK_SIZE):
+            chunk = X[start:start + ROW_CHUNK_SIZE]
+            rows = np.arange(len(chunk))[:, None]
+            node = np.tile(self.roots, (len(chunk), 1))
+            for _ in range(self.max_depth):
+                go_left = chunk[rows, self.feature[node]] <= self.threshold[node]
+                node = np.where(go_left, self.left[node], self.right[node])
+            depths = self.leaf_value[node].sum(axis=1)
+            scores[start:start + len(chunk)] = -(2.0 ** (-depths / self.normalizer))
+
+        return scores
+
+    def decision_function(self, X):
+        """Same as IsolationForest.decision_function: negative = outlier."""
+        return self.score_samples(X) - self.offset
+
+
+def compile_isolation_forest(forest):
+    """Flatten a fitted sklearn IsolationForest into a CompiledIsolationForest."""
+    features, thresholds, lefts, rights, leaf_values, roots = [], [], [], [], [], []
+    node_offset = 0
+    max_depth = 0
+
+    for estimator, estimator_features in zip(forest.estimators_, forest.estimators_features_):
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+
+        # Children always have larger ids than their parent
+        depth = np.zeros(tree.node_count, dtype=np.int64)
+        for node in node_ids[~is_leaf]:
+            depth[tree.children_left[node]] = depth[node] + 1
+            depth[tree.children_right[node]] = depth[node] + 1
+
+        # Trees index a column subset only when the forest subsamples features
+        feature = np.where(is_leaf, 0, tree.feature)
+        if len(estimator_features) != forest.n_features_in_:
+            feature = np.asarray(estimator_features)[feature]
+
+        features.append(feature)
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left) + node_offset)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right) + node_offset)
+        leaf_values.append(np.where(is_leaf, depth + average_path_length(tree.n_node_samples), 0.0))
+        roots.append(node_offset)
+
+        node_offset += tree.node_count
+        max_depth = max(max_depth, int(depth.max()))
+
+    return CompiledIsolationForest(
+        feature=np.concatenate(features).astype(np.intp),
+        threshold=np.concatenate(thresholds).astype(np.float64),
+        left=np.concatenate(lefts).astype(np.intp),
+        right=np.concatenate(rights).astype(np.intp),
+        leaf_value=np.concatenate(leaf_values).astype(np.float64),
+        roots=np.asarray(roots, dtype=np.intp),
+        max_depth=max_depth,
+        max_samples=forest.max_samples_,
+        offset=float(forest.offset_)
+    )
+
+
+def check_parity(forest, compiled, X):
+    """
+    Score X with both implementations and return the largest absolute
+    difference between their decision functions.
+    """
+    X = np.atleast_2d(X)
+    if len(X) == 0:
+        return 0.0
+    return float(np.max(np.abs(forest.decision_function(X) - compiled.decision_function(X))))
+
+
+def compile_with_parity_check(forest, X, tolerance=PARITY_TOLERANCE):
+    """
+    Compile a forest and verify it against sklearn on X. Returns the
+    compiled forest, or None when the scores disagree so callers keep
+    using sklearn.
+    """
+    compiled = compile_isolation_forest(forest)
+    error = check_parity(forest, compiled, X)
+    if error > tolerance:
+        logger.error(f"Compiled IsolationForest disagrees with sklearn (max error {error:.3g}); not using it")
+        return None
+    return compiled
@@ -0,0 +1,369 @@
+# fraud_detection/drift.py
+import atexit
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .feature_store import FEATURE_NAMES
+from .models import FeatureDriftSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Relative accuracy of sketch quantiles (1%)
+SKETCH_ALPHA = 0.01
+# Past this many buckets the lowest ones are merged, bounding sketch size
+SKETCH_MAX_BUCKETS = 2048
+# Magnitudes below this are counted as zero
+SKETCH_MIN_VALUE = 1e-9
+
+# Buffered statistics are written to the hourly snapshot this often
+FLUSH_INTERVAL_SECONDS = 60
+# Attempts at merging into an hour's row when concurrent workers race to create it
+FLUSH_ATTEMPTS = 3
+
+# Population stability index above which a feature is reported as drifted
+PSI_DRIFT_THRESHOLD = 0.2
+# Training quantiles that bound the PSI bins
+PSI_QUANTILES = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+REPORT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch in the style of DDSketch: each value is
+    counted in the bucket ceil(log_gamma(|x|)), so any quantile is within
+    SKETCH_ALPHA relative error, updates are O(1), and two sketches merge by
+    adding bucket counts.
+    """
+
+    def __init__(self, alpha=SKETCH_ALPHA):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0
+        self.count = 0
+
+    def _index(self, magnitude):
+        return math.ceil(math.log(magnitude) / self.log_gamma)
+
+    def _value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        if value > SKETCH_MIN_VALUE:
+            index = self._index(value)
+            self.positive[index] = self.positive.get(index, 0) + count
+        elif value < -SKETCH_MIN_VALUE:
+            index = self._index(-value)
+            self.negative[index] = self.negative.get(index, 0) + count
+        else:
+            self.zero += count
+        self.count += count
+        if len(self.positive) + len(self.negative) > SKETCH_MAX_BUCKETS:
+            self._collapse()
+
+    def add_array(self, values):
+        """Add a whole column at once (used for training matrices)."""
+        values = np.asarray(values, dtype=np.float64)
+        for buckets, magnitudes in ((self.positive, values[values > SKETCH_MIN_VALUE]),
+                                    (self.negative, -values[values < -SKETCH_MIN_VALUE])):
+            if len(magnitudes):
+                indices, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma), return_counts=True)
+                for index, count in zip(indices.astype(int).tolist(), counts.tolist()):
+                    buckets[index] = buckets.get(index, 0) + count
+        self.zero += int(np.sum(np.abs(values) <= SKETCH_MIN_VALUE))
+        self.count += len(values)
+        while len(self.positive) + len(self.negative) > SKETCH_MAX_BUCKETS:
+            self._collapse()
+
+    def _collapse(self):
+        """Fold the two smallest-magnitude positive buckets (or negative ones) together."""
+        buckets = self.positive if len(self.positive) > 1 else self.negative
+        lowest, second = sorted(buckets)[:2]
+        buckets[second] += buckets.pop(lowest)
+
+    def merge(self, other):
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in theirs.items():
+                mine[index] = mine.get(index, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+        while len(self.positive) + len(self.negative) > SKETCH_MAX_BUCKETS:
+            self._collapse()
+
+    def _ordered_buckets(self):
+        """(representative value, count) pairs in ascending value order."""
+        for index in sorted(self.negative, reverse=True):
+            yield -self._value(index), self.negative[index]
+        if self.zero:
+            yield 0.0, self.zero
+        for index in sorted(self.positive):
+            yield self._value(index), self.positive[index]
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for value, count in self._ordered_buckets():
+            seen += count
+            if seen > rank:
+                return value
+        return value
+
+    def cdf(self, x):
+        """Approximate fraction of values <= x."""
+        if not self.count:
+            return None
+        below = sum(count for value, count in self._ordered_buckets() if value <= x)
+        return below / self.count
+
+    def to_dict(self):
+        return {
+            'alpha': self.alpha,
+            'zero': self.zero,
+            'positive': {str(index): count for index, count in self.positive.items()},
+            'negative': {str(index): count for index, count in self.negative.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(alpha=data['alpha'])
+        sketch.zero = data['zero']
+        sketch.positive = {int(index): count for index, count in data['positive'].items()}
+        sketch.negative = {int(index): count for index, count in data['negative'].items()}
+        sketch.count = sketch.zero + sum(sketch.positive.values()) + sum(sketch.negative.values())
+        return sketch
+
+
+class RunningStats:
+    """Welford running mean/variance with min, max and a quantile sketch."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch()
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.sketch.add(value)
+
+    def merge(self, other):
+        """Combine with another accumulator (Chan et al. parallel update)."""
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @classmethod
+    def from_array(cls, values):
+        values = np.asarray(values, dtype=np.float64)
+        stats = cls()
+        if len(values):
+            stats.count = len(values)
+            stats.mean = float(values.mean())
+            stats.m2 = float(((values - stats.mean) ** 2).sum())
+            stats.min = float(values.min())
+            stats.max = float(values.max())
+            stats.sketch.add_array(values)
+        return stats
+
+    def to_dict(self):
+        return {
+            'count': self.count, 'mean': self.mean, 'm2': self.m2,
+            'min': self.min, 'max': self.max, 'sketch': self.sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count = data['count']
+        stats.mean = data['mean']
+        stats.m2 = data['m2']
+        stats.min = data['min']
+        stats.max = data['max']
+        stats.sketch = QuantileSketch.from_dict(data['sketch'])
+        return stats
+
+
+class FeatureStats:
+    """RunningStats for every feature in FEATURE_NAMES."""
+
+    def __init__(self, features=None):
+        self.features = features or {name: RunningStats() for name in FEATURE_NAMES}
+
+    @property
+    def count(self):
+        return self.features[FEATURE_NAMES[0]].count
+
+    def add_vector(self, vector):
+        for name, value in zip(FEATURE_NAMES, vector):
+            self.features[name].add(float(value))
+
+    def merge(self, other):
+        for name, stats in other.features.items():
+            self.features.setdefault(name, RunningStats()).merge(stats)
+
+    @classmethod
+    def from_matrix(cls, X, feature_names=FEATURE_NAMES):
+        X = np.asarray(X, dtype=np.float64)
+        return cls({name: RunningStats.from_array(X[:, i]) for i, name in enumerate(feature_names)})
+
+    def to_dict(self):
+        return {name: stats.to_dict() for name, stats in self.features.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls({name: RunningStats.from_dict(stats) for name, stats in data.items()})
+
+
+class DriftMonitor:
+    """
+    Accumulates feature statistics per hour in memory and periodically
+    merges them into that hour's FeatureDriftSnapshot row, so the cost per
+    application is a fixed number of in-memory updates.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL_SECONDS):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, vector, at=None):
+        hour = (at or timezone.now()).replace(minute=0, second=0, microsecond=0)
+        with self._lock:
+            self._pending.setdefault(hour, FeatureStats()).add_vector(vector)
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Merge buffered statistics into the hourly snapshot rows."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+
+        for hour, stats in pending.items():
+            for attempt in range(FLUSH_ATTEMPTS):
+                try:
+                    self._merge_into_snapshot(hour, stats)
+                    break
+                except IntegrityError as e:
+                    # Another worker created the hour's row between our lookup and insert; the
+                    # next lookup finds it, so retry rather than drop this hour's statistics
+                    if attempt == FLUSH_ATTEMPTS - 1:
+                        logger.error(f"Failed to flush feature drift stats for {hour}: {str(e)}")
+                except Exception as e:
+                    logger.error(f"Failed to flush feature drift stats for {hour}: {str(e)}")
+                    break
+
+    @staticmethod
+    def _merge_into_snapshot(hour, stats):
+        with transaction.atomic():
+            snapshot, _ = FeatureDriftSnapshot.objects.select_for_update().get_or_create(hour=hour)
+            merged = FeatureStats.from_dict(snapshot.stats) if snapshot.stats else FeatureStats()
+            merged.merge(stats)
+            snapshot.stats = merged.to_dict()
+            snapshot.application_count = merged.count
+            snapshot.save()
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_drift_monitor():
+    """Per-process monitor; buffered statistics are flushed at exit."""
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                _monitor = DriftMonitor()
+                atexit.register(_monitor.flush)
+    return _monitor
+
+
+def load_recent_stats(since):
+    """Merge the hourly snapshots since a time into one FeatureStats."""
+    merged = FeatureStats()
+    hourly = []
+    for snapshot in FeatureDriftSnapshot.objects.filter(hour__gte=since).order_by('hour'):
+        merged.merge(FeatureStats.from_dict(snapshot.stats))
+        hourly.append({'hour': snapshot.hour.isoformat(), 'applications': snapshot.application_count})
+    return merged, hourly
+
+
+def population_stability_index(expected, actual):
+    """
+    PSI of `actual` against `expected` over bins bounded by the training
+    deciles, with bin masses estimated from the two sketches.
+    """
+    edges = sorted({expected.sketch.quantile(q) for q in PSI_QUANTILES})
+    expected_cdf = [0.0] + [expected.sketch.cdf(edge) for edge in edges] + [1.0]
+    actual_cdf = [0.0] + [actual.sketch.cdf(edge) for edge in edges] + [1.0]
+
+    psi = 0.0
+    for i in range(1, len(expected_cdf)):
+        e = max(expected_cdf[i] - expected_cdf[i - 1], 1e-4)
+        a = max(actual_cdf[i] - actual_cdf[i - 1], 1e-4)
+        psi += (a - e) * math.log(a / e)
+    return psi
+
+
+def compare_to_training(training, recent):
+    """Per-feature comparison of recent statistics against the training distribution."""
+    report = {}
+    for name in FEATURE_NAMES:
+        train_stats = training.features.get(name)
+        recent_stats = recent.features.get(name)
+        if train_stats is None or not train_stats.count or recent_stats is None or not recent_stats.count:
+            continue
+
+        train_std = math.sqrt(train_stats.variance)
+        psi = population_stability_index(train_stats, recent_stats)
+        report[name] = {
+            'training': _summary(train_stats),
+            'recent': _summary(recent_stats),
+            'mean_shift_std': (recent_stats.mean - train_stats.mean) / train_std if train_std else None,
+            'psi': round(psi, 4),
+            'drifted': psi > PSI_DRIFT_THRESHOLD,
+        }
+    return report
+
+
+def _summary(stats):
+    summary = {
+        'count': stats.count,
+        'mean': stats.mean,
+        'std': math.sqrt(stats.variance),
+        'min': stats.min,
+        'max': stats.max,
+    }
+    for q in REPORT_QUANTILES:
+        summary[f"p{round(q * 100)}"] = stats.sketch.quantile(q)
+    return summary
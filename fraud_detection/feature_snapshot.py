@@ -0,0 +1,162 @@
+# fraud_detection/feature_snapshot.py
+"""
+Rolling-window feature matrix shared by every worker. The matrix and its
+id index are written as raw files sorted by application id, and a
+snapshot.json pointer is swapped atomically. Workers memory-map the
+current files read-only, so all processes share one page-cache copy,
+and look applications up by binary search over the mapped ids.
+"""
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .feature_store import FEATURE_NAMES, FEATURE_SCHEMA_VERSION, FeatureStore
+from .ml_registry import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Per-process view of the current snapshot, keyed by the pointer file's path and mtime
+_snapshot_cache = {'key': None, 'snapshot': None}
+_cache_lock = threading.Lock()
+
+
+class FeatureSnapshot:
+    """
+    Rolling-window feature matrix written to disk and memory-mapped read-only
+    by every worker, so all processes share one page-cache copy.
+    """
+
+    POINTER = 'snapshot.json'
+    KEEP_VERSIONS = 2  # Keep the previous files around for readers still mapping them
+
+    def __init__(self, snapshot_dir=None):
+        self.snapshot_dir = Path(snapshot_dir or settings.ML_SNAPSHOT_DIR)
+
+    def write(self, ids, X, window_start=None):
+        """Dump a matrix and its id index sorted by id, then atomically point readers at it."""
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        version = f"{timezone.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        matrix_name = f"features-{version}.f32"
+        ids_name = f"ids-{version}.bin"
+
+        id_bytes = _id_bytes(ids)
+        order = np.argsort(id_bytes, kind='stable')
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32).reshape(len(id_bytes), -1)[order])
+        X.tofile(self.snapshot_dir / matrix_name)
+        id_bytes[order].tofile(self.snapshot_dir / ids_name)
+
+        write_json_atomic(self.snapshot_dir / self.POINTER, {
+            'version': version,
+            'matrix': matrix_name,
+            'ids': ids_name,
+            'rows': int(X.shape[0]),
+            'columns': list(FEATURE_NAMES),
+            'schema_version': FEATURE_SCHEMA_VERSION,
+            'window_start': window_start.isoformat() if window_start else None,
+            'created_at': timezone.now().isoformat()
+        })
+        self._remove_old_versions()
+        logger.info(f"Wrote feature snapshot {version} with {X.shape[0]} rows")
+        return version
+
+    def load(self):
+        """
+        Return the current snapshot as a dict with read-only memmaps for
+        'ids' and 'X', or None if no snapshot exists.
+        """
+        pointer_path = self.snapshot_dir / self.POINTER
+        try:
+            key = (str(pointer_path), pointer_path.stat().st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+        if _snapshot_cache['key'] == key:
+            return _snapshot_cache['snapshot']
+
+        with _cache_lock:
+            if _snapshot_cache['key'] == key:
+                return _snapshot_cache['snapshot']
+            try:
+                with open(pointer_path) as f:
+                    pointer = json.load(f)
+                snapshot = self._open(pointer)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Failed to load feature snapshot: {str(e)}")
+                return _snapshot_cache['snapshot']
+
+            _snapshot_cache['key'] = key
+            _snapshot_cache['snapshot'] = snapshot
+            return snapshot
+
+    def lookup(self, ids, max_age=None):
+        """
+        (X, found) for application ids: a float32 matrix with the snapshot
+        row of each id that has one, and a mask of those ids. None when the
+        snapshot is missing, was written for a different feature layout or
+        schema, or is older than max_age.
+        """
+        snapshot = self.load()
+        if (snapshot is None or snapshot['columns'] != list(FEATURE_NAMES)
+                or snapshot['schema_version'] != FEATURE_SCHEMA_VERSION):
+            return None
+        if max_age is not None and timezone.now() - snapshot['created_at'] > max_age:
+            return None
+
+        keys = _id_bytes(ids)
+        X = np.zeros((len(keys), len(FEATURE_NAMES)), dtype=np.float32)
+        found = np.zeros(len(keys), dtype=bool)
+        if len(snapshot['ids']) and len(keys):
+            positions = np.minimum(np.searchsorted(snapshot['ids'], keys), len(snapshot['ids']) - 1)
+            found = snapshot['ids'][positions] == keys
+            X[found] = snapshot['X'][positions[found]]
+        return X, found
+
+    def _open(self, pointer):
+        rows = pointer['rows']
+        columns = len(pointer['columns'])
+        if rows == 0:
+            X = np.zeros((0, columns), dtype=np.float32)
+            ids = np.zeros(0, dtype='S16')
+        else:
+            X = np.memmap(self.snapshot_dir / pointer['matrix'], dtype=np.float32, mode='r', shape=(rows, columns))
+            ids = np.memmap(self.snapshot_dir / pointer['ids'], dtype='S16', mode='r', shape=(rows,))
+        return {
+            'version': pointer['version'],
+            'columns': pointer['columns'],
+            'schema_version': pointer.get('schema_version'),
+            'created_at': datetime.fromisoformat(pointer['created_at']),
+            'ids': ids,
+            'X': X
+        }
+
+    def _remove_old_versions(self):
+        """Delete snapshot files beyond the most recent KEEP_VERSIONS."""
+        matrices = sorted(self.snapshot_dir.glob('features-*.f32'), reverse=True)
+        for old_matrix in matrices[self.KEEP_VERSIONS:]:
+            version = old_matrix.name[len('features-'):-len('.f32')]
+            for path in (old_matrix, self.snapshot_dir / f"ids-{version}.bin"):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+
+def _id_bytes(ids):
+    return np.array([uuid.UUID(str(app_id)).bytes for app_id in ids], dtype='S16')
+
+
+def refresh_snapshot(feature_store=None, snapshot=None):
+    """Rebuild the rolling-window snapshot from the feature store."""
+    feature_store = feature_store or FeatureStore()
+    snapshot = snapshot or FeatureSnapshot()
+
+    window_start = timezone.now() - timedelta(days=settings.ML_TRAINING_WINDOW_DAYS)
+    ids, X = feature_store.load_matrix(since=window_start, backfill=True)
+    return snapshot.write(ids, X, window_start=window_start)
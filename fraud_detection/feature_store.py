@@ -0,0 +1,207 @@
+# fraud_detection/feature_store.py
+import hashlib
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import ApplicationFeatures, LoanApplication
+
+logger = logging.getLogger(__name__)
+
+# Column order of every behavioral feature matrix
+FEATURE_NAMES = (
+    'hour_of_day', 'day_of_week', 'is_weekend',
+    'amount_requested', 'confidence_score',
+    'bot_detected', 'vpn_detected', 'proxy_detected', 'tor_detected',
+    'tampering_detected', 'incognito', 'ip_blocklisted',
+    'visitor_app_count', 'hours_since_last_app',
+    'browser_stability', 'os_stability',
+    'name_length', 'email_length', 'purpose_length',
+    'common_email_domain',
+)
+
+# Bump whenever a feature definition changes so stale vectors are recomputed
+FEATURE_SCHEMA_VERSION = 2
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def features_to_vector(features):
+    """Pack a feature dict into a float32 vector in FEATURE_NAMES order."""
+    return np.array([features[name] for name in FEATURE_NAMES], dtype=np.float32)
+
+
+def sample_key(app_id, seed=None):
+    """
+    Seeded hash of an application id mapped to [0, 1). Keeping the k lowest
+    keys of a window is a uniform sample without replacement that stays
+    valid as rows arrive and expire (bottom-k sampling).
+    """
+    seed = settings.ML_TRAINING_SAMPLE_SEED if seed is None else seed
+    digest = hashlib.blake2b(f"{seed}:{app_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64
+
+
+def vector_to_features(vector):
+    """Unpack a stored vector back into a feature dict."""
+    return {name: float(value) for name, value in zip(FEATURE_NAMES, vector)}
+
+
+class FeatureStore:
+    """
+    Per-application feature vectors, written once at submission time and
+    read back in bulk as a ready-made matrix by the ML layer.
+    """
+
+    def __init__(self, analyzer=None):
+        if analyzer is None:
+            from .ml_services import BehavioralPatternAnalyzer
+            analyzer = BehavioralPatternAnalyzer()
+        self.analyzer = analyzer
+
+    def materialize(self, loan_application):
+        """Compute and store the feature vector for one application."""
+        try:
+            vector = features_to_vector(self.analyzer.extract_behavioral_features(loan_application))
+            with transaction.atomic():
+                ApplicationFeatures.objects.update_or_create(
+                    loan_application=loan_application,
+                    defaults={
+                        'application_date': loan_application.application_date,
+                        'schema_version': FEATURE_SCHEMA_VERSION,
+                        'vector': vector.tobytes(),
+                        'sample_key': sample_key(loan_application.id)
+                    }
+                )
+                # Count the application towards drift statistics once it commits
+                from .drift import get_drift_monitor
+                transaction.on_commit(
+                    lambda: get_drift_monitor().record(vector, loan_application.application_date)
+                )
+            return vector
+        except Exception as e:
+            logger.error(f"Failed to materialize features for {loan_application.id}: {str(e)}")
+            return None
+
+    def get_vector(self, loan_application):
+        """Return the stored vector for an application, materializing it if missing."""
+        stored = ApplicationFeatures.objects.filter(
+            loan_application=loan_application,
+            schema_version=FEATURE_SCHEMA_VERSION
+        ).values_list('vector', flat=True).first()
+
+        if stored is not None:
+            return np.frombuffer(stored, dtype=np.float32)
+        return self.materialize(loan_application)
+
+    def get_matrix(self, applications):
+        """
+        Return a float32 matrix with one row per application, in the given
+        order. Missing vectors are computed in one batch and stored.
+        """
+        ids = [app.id for app in applications]
+        stored = dict(
+            ApplicationFeatures.objects.filter(
+                loan_application_id__in=ids,
+                schema_version=FEATURE_SCHEMA_VERSION
+            ).values_list('loan_application_id', 'vector')
+        )
+        rows = {app_id: np.frombuffer(blob, dtype=np.float32) for app_id, blob in stored.items()}
+
+        missing_ids = [app_id for app_id in ids if app_id not in rows]
+        if missing_ids:
+            rows.update(self._store_batch(LoanApplication.objects.filter(id__in=missing_ids)))
+
+        X = np.zeros((len(ids), len(FEATURE_NAMES)), dtype=np.float32)
+        for i, app_id in enumerate(ids):
+            X[i] = rows[app_id]
+        return X
+
+    def load_matrix(self, since=None, exclude_id=None, backfill=False, limit=None):
+        """
+        Read stored vectors as (ids, X) without touching LoanApplication rows.
+        With backfill=True, applications in the window that have no current
+        vector are computed and stored first. With a limit, only the rows with
+        the lowest sample keys are returned (a seeded uniform sample).
+        """
+        if backfill:
+            self.backfill(since=since)
+
+        rows = self._window(since, exclude_id)
+        if limit is not None:
+            rows = rows.order_by('sample_key')[:limit]
+
+        rows = list(rows.values_list('loan_application_id', 'vector'))
+        if not rows:
+            return [], np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32)
+
+        ids, blobs = zip(*rows)
+        X = np.frombuffer(b''.join(blobs), dtype=np.float32).reshape(len(ids), len(FEATURE_NAMES))
+        return list(ids), X
+
+    def count(self, since=None, exclude_id=None):
+        """Number of stored vectors in a window."""
+        return self._window(since, exclude_id).count()
+
+    def resample(self, seed=None, batch_size=BACKFILL_BATCH_SIZE):
+        """Recompute every sample key, e.g. after ML_TRAINING_SAMPLE_SEED changes."""
+        updated = 0
+        batch = []
+        for row in ApplicationFeatures.objects.only('pk').iterator(chunk_size=batch_size):
+            row.sample_key = sample_key(row.pk, seed)
+            batch.append(row)
+            if len(batch) >= batch_size:
+                updated += ApplicationFeatures.objects.bulk_update(batch, ['sample_key'])
+                batch = []
+        if batch:
+            updated += ApplicationFeatures.objects.bulk_update(batch, ['sample_key'])
+        return updated
+
+    def _window(self, since, exclude_id):
+        rows = ApplicationFeatures.objects.filter(schema_version=FEATURE_SCHEMA_VERSION)
+        if since is not None:
+            rows = rows.filter(application_date__gte=since)
+        if exclude_id is not None:
+            rows = rows.exclude(loan_application_id=exclude_id)
+        return rows
+
+    def backfill(self, since=None, batch_size=BACKFILL_BATCH_SIZE):
+        """Store vectors for applications that are missing one or have a stale schema."""
+        missing = LoanApplication.objects.exclude(features__schema_version=FEATURE_SCHEMA_VERSION)
+        if since is not None:
+            missing = missing.filter(application_date__gte=since)
+
+        missing_ids = list(missing.values_list('id', flat=True))
+        written = 0
+        for start in range(0, len(missing_ids), batch_size):
+            chunk = LoanApplication.objects.filter(id__in=missing_ids[start:start + batch_size])
+            written += len(self._store_batch(chunk))
+
+        if written:
+            logger.info(f"Backfilled behavioral features for {written} applications")
+        return written
+
+    def _store_batch(self, applications):
+        """Compute vectors for a queryset with the batch extractor and replace any stored ones."""
+        ids, X = self.analyzer.extract_behavioral_features_batch(applications)
+        dates = dict(applications.values_list('id', 'application_date'))
+        with transaction.atomic():
+            # Delete and reinsert rather than upsert: MySQL has no conflict target for update_conflicts
+            ApplicationFeatures.objects.filter(loan_application__in=ids).delete()
+            ApplicationFeatures.objects.bulk_create(
+                [
+                    ApplicationFeatures(
+                        loan_application_id=app_id,
+                        application_date=dates[app_id],
+                        schema_version=FEATURE_SCHEMA_VERSION,
+                        vector=row.tobytes(),
+                        sample_key=sample_key(app_id)
+                    )
+                    for app_id, row in zip(ids, X)
+                ],
+                # A vector materialized concurrently was computed the same way
+                ignore_conflicts=True
+            )
+        return dict(zip(ids, X))
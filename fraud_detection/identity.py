@@ -0,0 +1,81 @@
+# fraud_detection/identity.py
+from django.db import transaction
+from django.db.models import Q
+
+from .models import IdentityKey, LoanApplication
+from .normalization import normalize_email, normalize_name, normalize_phone
+
+REBUILD_BATCH_SIZE = 1000
+
+# Fields that feed identity keys; saves touching none of them skip the sync
+IDENTITY_FIELDS = {'full_name', 'phone', 'email', 'visitor_id'}
+
+
+def identity_keys(loan_application):
+    """Return {key_type: normalized value} for the non-empty identity fields."""
+    keys = {
+        'name': normalize_name(loan_application.full_name),
+        'phone': normalize_phone(loan_application.phone),
+        'email': normalize_email(loan_application.email),
+    }
+    return {key_type: value[:255] for key_type, value in keys.items() if value}
+
+
+def matching_keys(loan_application):
+    """IdentityKey rows that share any normalized identity value with the application."""
+    keys = identity_keys(loan_application)
+    if not keys:
+        return IdentityKey.objects.none()
+
+    condition = Q()
+    for key_type, value in keys.items():
+        condition |= Q(key_type=key_type, value=value)
+    return IdentityKey.objects.filter(condition)
+
+
+def sync_identity_keys(loan_application):
+    """Replace the application's identity keys with those of its current fields."""
+    keys = identity_keys(loan_application)
+    with transaction.atomic():
+        # Delete and reinsert rather than upsert: MySQL has no conflict target for update_conflicts
+        IdentityKey.objects.filter(loan_application=loan_application).delete()
+        IdentityKey.objects.bulk_create([
+            IdentityKey(
+                key_type=key_type,
+                value=value,
+                loan_application_id=loan_application.id,
+                visitor_id=loan_application.visitor_id_id
+            )
+            for key_type, value in keys.items()
+        ])
+
+
+def rebuild_identity_keys(batch_size=REBUILD_BATCH_SIZE):
+    """Recompute identity keys for every application; returns the number of applications."""
+    rebuilt = 0
+    applications = LoanApplication.objects.only('id', 'full_name', 'phone', 'email', 'visitor_id')
+    batch = []
+    for loan_application in applications.iterator(chunk_size=batch_size):
+        batch.append(loan_application)
+        if len(batch) >= batch_size:
+            rebuilt += _rebuild_batch(batch)
+            batch = []
+    if batch:
+        rebuilt += _rebuild_batch(batch)
+    return rebuilt
+
+
+def _rebuild_batch(applications):
+    with transaction.atomic():
+        IdentityKey.objects.filter(loan_application__in=[app.id for app in applications]).delete()
+        IdentityKey.objects.bulk_create([
+            IdentityKey(
+                key_type=key_type,
+                value=value,
+                loan_application_id=app.id,
+                visitor_id=app.visitor_id_id
+            )
+            for app in applications
+            for key_type, value in identity_keys(app).items()
+        ])
+    return len(applications)
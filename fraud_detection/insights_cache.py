@@ -0,0 +1,64 @@
+# fraud_detection/insights_cache.py
+import hashlib
+import uuid
+
+from django.core.cache import caches
+
+from .models import ApplicationFeatures
+
+CACHE_ALIAS = 'ml_insights'
+
+
+def get_insights_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _generation_key(application_id):
+    return f"ml-insights-gen:{application_id}"
+
+
+def _generation(application_id):
+    """
+    Current cache generation of an application. A missing generation (never
+    set, invalidated or evicted) is replaced by a fresh random one, so
+    entries written under an older generation can never be served again.
+    """
+    cache = get_insights_cache()
+    key = _generation_key(application_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def stored_features(application_id):
+    """(schema version, vector bytes) stored for an application, or None; read without decoding."""
+    return ApplicationFeatures.objects.filter(loan_application_id=application_id).values_list(
+        'schema_version', 'vector'
+    ).first()
+
+
+def insights_key(loan_application, model_version, features):
+    """
+    Cache key for an application's ML insights: its id, the model version
+    and a hash of everything the insights are computed from (the stored
+    features as returned by stored_features, the rule-based risk score and
+    the last modification time), scoped to the application's current
+    generation.
+    """
+    digest = hashlib.blake2b(digest_size=12)
+    if features is not None:
+        schema_version, vector = features
+        digest.update(f"{schema_version}|".encode())
+        digest.update(bytes(vector))
+    digest.update(f"{loan_application.risk_score}|{loan_application.status}|{loan_application.last_modified}".encode())
+    return (
+        f"ml-insights:{loan_application.id}:{model_version}:{digest.hexdigest()}"
+        f":{_generation(loan_application.id)}"
+    )
+
+
+def invalidate_insights(application_id):
+    """Drop every cached insight for an application."""
+    get_insights_cache().delete(_generation_key(application_id))
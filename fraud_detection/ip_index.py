@@ -0,0 +1,202 @@
+# fraud_detection/ip_index.py
+"""
+Subnet-level IP reputation. Addresses are grouped into /24 (IPv4) and /48
+(IPv6) subnets, counted per window by the velocity counters, and matched
+against blocklisted CIDR ranges held in a prefix trie loaded from a local
+file (settings.IP_BLOCKLIST_PATH, one CIDR per line, '#' comments), which
+is reloaded whenever the file changes.
+"""
+import ipaddress
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Subnet width used for velocity per address family
+SUBNET_PREFIX = {4: 24, 6: 48}
+
+# The blocklist file is checked for changes at most this often
+RELOAD_CHECK_SECONDS = 1.0
+
+
+def parse_address(value):
+    """ip_address for a string, with IPv4-mapped IPv6 unwrapped; None if it is not an address."""
+    if not value:
+        return None
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped:
+        return address.ipv4_mapped
+    return address
+
+
+def subnet_text_prefix(subnet):
+    """
+    A string every address in the subnet starts with when written in
+    canonical form, for narrowing text lookups: '203.0.113.' for a /24, the
+    leading non-zero groups ('2001:db8:') for a /48 since zero groups may be
+    compressed away.
+    """
+    network = ipaddress.ip_network(subnet)
+    if network.version == 4:
+        return str(network.network_address).rsplit('.', 1)[0] + '.'
+    groups = []
+    for group in network.network_address.exploded.split(':')[:SUBNET_PREFIX[6] // 16]:
+        if int(group, 16) == 0:
+            break
+        groups.append(format(int(group, 16), 'x'))
+    return ':'.join(groups) + ':' if groups else ''
+
+
+def routable_subnet(*values):
+    """
+    Subnet of the first globally routable address among the values. Private
+    and reserved addresses are skipped: behind a proxy or NAT they are shared
+    by unrelated clients.
+    """
+    for value in values:
+        address = parse_address(value)
+        if address is not None and address.is_global:
+            return str(ipaddress.ip_network(f"{address}/{SUBNET_PREFIX[address.version]}", strict=False))
+    return None
+
+
+def application_subnet(loan_application):
+    """Subnet the application is counted under: of its client address, else of its public address."""
+    return routable_subnet(loan_application.ip_address, loan_application.public_ip)
+
+
+class _Node:
+    __slots__ = ('children', 'partial', 'value')
+
+    def __init__(self):
+        self.children = {}  # next byte -> _Node
+        # next byte -> (prefix length, value) for prefixes ending inside that byte
+        self.partial = {}
+        # (prefix length, value) for a prefix ending exactly at this node
+        self.value = None
+
+
+class PrefixTrie:
+    """
+    Longest-prefix-match trie over IPv4 and IPv6 networks with a stride of
+    one byte: a lookup walks at most one node per address byte (4 for IPv4,
+    16 for IPv6). Prefixes that end inside a byte are expanded over the
+    byte values they cover, keeping the longest prefix for each.
+    """
+
+    def __init__(self):
+        self._roots = {4: _Node(), 6: _Node()}
+        self.size = 0
+
+    def insert(self, network, value=True):
+        network = ipaddress.ip_network(network, strict=False)
+        data = network.network_address.packed
+        full, remainder = divmod(network.prefixlen, 8)
+        node = self._roots[network.version]
+        for byte in data[:full]:
+            node = node.children.setdefault(byte, _Node())
+        entry = (network.prefixlen, value)
+        if remainder == 0:
+            if node.value is None or node.value[0] <= network.prefixlen:
+                node.value = entry
+        else:
+            first = data[full]
+            for byte in range(first, first + (1 << (8 - remainder))):
+                current = node.partial.get(byte)
+                if current is None or current[0] <= network.prefixlen:
+                    node.partial[byte] = entry
+        self.size += 1
+
+    def lookup(self, address):
+        """(prefix length, value) of the longest network containing the address, or None."""
+        address = parse_address(address) if isinstance(address, str) else address
+        if address is None:
+            return None
+        node = self._roots[address.version]
+        best = node.value
+        for byte in address.packed:
+            # Deeper matches are always longer prefixes than shallower ones
+            best = node.partial.get(byte, best)
+            node = node.children.get(byte)
+            if node is None:
+                break
+            if node.value is not None:
+                best = node.value
+        return best
+
+    def __contains__(self, address):
+        return self.lookup(address) is not None
+
+
+def load_blocklist(path):
+    """PrefixTrie of the CIDR ranges in a file; each matches with its network string as value."""
+    trie = PrefixTrie()
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                network = ipaddress.ip_network(line, strict=False)
+            except ValueError:
+                logger.warning(f"Skipping invalid CIDR on line {line_number} of {path}: {line!r}")
+                continue
+            trie.insert(network, str(network))
+    return trie
+
+
+# Per-process blocklist, keyed by the file path and mtime
+_blocklist_cache = {'key': None, 'trie': PrefixTrie(), 'checked': 0.0}
+_cache_lock = threading.Lock()
+
+
+def get_ip_blocklist(path=None):
+    """
+    The blocklist trie for the configured file, reloaded when its mtime
+    changes (checked at most every RELOAD_CHECK_SECONDS). A missing file
+    is an empty blocklist.
+    """
+    path = str(path or settings.IP_BLOCKLIST_PATH)
+    now = time.monotonic()
+    if (_blocklist_cache['key'] and _blocklist_cache['key'][0] == path
+            and now - _blocklist_cache['checked'] < RELOAD_CHECK_SECONDS):
+        return _blocklist_cache['trie']
+
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        key = (path, None)
+    _blocklist_cache['checked'] = now
+    if _blocklist_cache['key'] == key:
+        return _blocklist_cache['trie']
+
+    with _cache_lock:
+        if _blocklist_cache['key'] != key:
+            try:
+                trie = load_blocklist(path) if key[1] is not None else PrefixTrie()
+            except OSError as e:
+                logger.error(f"Failed to load IP blocklist {path}, keeping the previous one: {str(e)}")
+            else:
+                logger.info(f"Loaded {trie.size} blocklisted IP ranges from {path}")
+                _blocklist_cache['trie'] = trie
+            _blocklist_cache['key'] = key
+        return _blocklist_cache['trie']
+
+
+def blocklisted_range(loan_application):
+    """The blocklisted range containing the application's client or public address, or None."""
+    blocklist = get_ip_blocklist()
+    if not blocklist.size:
+        return None
+    for value in (loan_application.ip_address, loan_application.public_ip):
+        match = blocklist.lookup(value)
+        if match:
+            return match[1]
+    return None
@@ -0,0 +1,95 @@
+# fraud_detection/job_queue.py
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ScoringJob
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before retrying a job, doubled per failed attempt
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 3600
+
+
+def worker_name():
+    """Identifier recorded on claimed jobs, e.g. 'web-1:4242'."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_scoring(loan_application, reason=None):
+    """
+    Queue ML scoring for an application unless a job is already open. Call
+    inside the submission transaction so the job commits with the row.
+    """
+    existing = ScoringJob.objects.filter(
+        loan_application=loan_application,
+        status__in=['queued', 'running']
+    ).first()
+    if existing is not None:
+        return existing
+    return ScoringJob.objects.create(loan_application=loan_application, reason=reason)
+
+
+def claim_jobs(worker, limit):
+    """
+    Claim up to `limit` due jobs for a worker and mark them running.
+    Uses SELECT ... FOR UPDATE SKIP LOCKED where the database supports it
+    (PostgreSQL, MySQL 8+) so concurrent workers never block on or share a
+    job. Elsewhere (SQLite) each candidate is taken with a conditional
+    UPDATE that only succeeds while the job is still queued.
+    """
+    now = timezone.now()
+    due = ScoringJob.objects.filter(status='queued', run_after__lte=now).order_by('run_after')
+    claim = {'status': 'running', 'locked_by': worker, 'locked_at': now, 'attempts': F('attempts') + 1}
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job_ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            ScoringJob.objects.filter(id__in=job_ids).update(**claim)
+    else:
+        job_ids = [
+            job_id for job_id in due.values_list('id', flat=True)[:limit]
+            if ScoringJob.objects.filter(id=job_id, status='queued').update(**claim)
+        ]
+
+    return list(ScoringJob.objects.filter(id__in=job_ids).select_related('loan_application__visitor_id'))
+
+
+def complete_jobs(jobs):
+    """Mark claimed jobs as done."""
+    ScoringJob.objects.filter(id__in=[job.id for job in jobs]).update(
+        status='done', locked_by=None, locked_at=None, last_error=None, updated_at=timezone.now()
+    )
+
+
+def retry_job(job, error):
+    """Requeue a job with exponential backoff, or fail it after ML_JOB_MAX_ATTEMPTS."""
+    job.last_error = str(error)
+    job.locked_by = None
+    job.locked_at = None
+    if job.attempts >= settings.ML_JOB_MAX_ATTEMPTS:
+        job.status = 'failed'
+        logger.error(f"Scoring job {job.id} failed after {job.attempts} attempts: {error}")
+    else:
+        delay = min(RETRY_BASE_DELAY * 2 ** (job.attempts - 1), RETRY_MAX_DELAY)
+        job.status = 'queued'
+        job.run_after = timezone.now() + timedelta(seconds=delay)
+    job.save(update_fields=['status', 'run_after', 'locked_by', 'locked_at', 'last_error', 'updated_at'])
+
+
+def release_stale_jobs():
+    """Requeue running jobs whose worker stopped without finishing them."""
+    cutoff = timezone.now() - timedelta(seconds=settings.ML_JOB_LOCK_TIMEOUT_SECONDS)
+    released = ScoringJob.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status='queued', locked_by=None, locked_at=None, updated_at=timezone.now()
+    )
+    if released:
+        logger.warning(f"Released {released} stale scoring jobs")
+    return released
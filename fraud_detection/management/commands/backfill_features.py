@@ -0,0 +1,37 @@
+# fraud_detection/management/commands/backfill_features.py
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from fraud_detection.feature_store import FeatureStore
+
+
+class Command(BaseCommand):
+    help = "Materialize behavioral feature vectors for applications that are missing one."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help="Only backfill applications from the last N days (default: all)."
+        )
+        parser.add_argument(
+            '--resample',
+            action='store_true',
+            help="Recompute every training sample key, e.g. after ML_TRAINING_SAMPLE_SEED changed."
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days'] is not None:
+            since = timezone.now() - timedelta(days=options['days'])
+
+        feature_store = FeatureStore()
+        written = feature_store.backfill(since=since)
+        self.stdout.write(self.style.SUCCESS(f"Stored feature vectors for {written} applications"))
+
+        if options['resample']:
+            updated = feature_store.resample()
+            self.stdout.write(self.style.SUCCESS(f"Recomputed sample keys for {updated} applications"))
@@ -0,0 +1,47 @@
+# fraud_detection/management/commands/benchmark_imports.py
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from fraud_detection.benchmarks.imports import SCENARIOS, lazy_violations, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Measure cold-start import time and peak RSS of web, service and ML processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios',
+            nargs='*',
+            help=f"Scenarios to run (default: all): {', '.join(SCENARIOS)}."
+        )
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--json', action='store_true', help="Print results as JSON.")
+        parser.add_argument(
+            '--check-lazy',
+            action='store_true',
+            help="Fail if a non-ML scenario imports numpy, pandas, scipy, sklearn or joblib."
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        results = run_benchmarks(options['scenarios'], repeat=options['repeat'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(f"{'scenario':<14}{'setup ms':>10}{'import ms':>11}{'rss MB':>9}  heavy modules")
+            for result in results:
+                self.stdout.write(
+                    f"{result['scenario']:<14}{result['setup_ms']:>10}{result['import_ms']:>11}"
+                    f"{result['max_rss_mb']:>9}  {', '.join(result['heavy_modules']) or '-'}"
+                )
+
+        if options['check_lazy']:
+            violations = lazy_violations(results)
+            if violations:
+                raise CommandError(f"ML libraries loaded outside scoring processes: {violations}")
+            self.stdout.write(self.style.SUCCESS("No ML libraries loaded by non-ML scenarios"))
@@ -0,0 +1,65 @@
+# fraud_detection/management/commands/benchmark_ml.py
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from fraud_detection.benchmarks.ml import DEFAULT_SIZES, environment, find_regressions, run_size
+from fraud_detection.models import LoanApplication
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the behavioral ML pipeline on synthetic histories of several sizes. "
+        "Each size runs in a transaction that is rolled back, leaving the database unchanged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write results as JSON to this file (default: stdout).")
+        parser.add_argument('--baseline', help="Previous results file to check for regressions.")
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help="Allowed slowdown per stage against the baseline (0.2 = 20%%)."
+        )
+        parser.add_argument(
+            '--no-tracemalloc',
+            action='store_true',
+            help="Skip peak-memory tracing, which slows allocation-heavy stages."
+        )
+
+    def handle(self, *args, **options):
+        report = {
+            'environment': environment(),
+            'existing_applications': LoanApplication.objects.count(),
+            'seed': options['seed'],
+            'tracemalloc': not options['no_tracemalloc'],
+            'results': [],
+        }
+
+        for size in options['sizes']:
+            self.stderr.write(f"Benchmarking {size} applications...")
+            with transaction.atomic():
+                report['results'].extend(
+                    run_size(size, seed=options['seed'], trace_memory=not options['no_tracemalloc'])
+                )
+                transaction.set_rollback(True)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {len(report['results'])} results to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = find_regressions(report['results'], baseline, tolerance=options['tolerance'])
+            if regressions:
+                raise CommandError(f"Regressions against {options['baseline']}: {json.dumps(regressions, indent=2)}")
+            self.stderr.write(self.style.SUCCESS("No regressions against the baseline"))
@@ -0,0 +1,19 @@
+# fraud_detection/management/commands/rebuild_fraud_rings.py
+
+from django.core.management.base import BaseCommand
+from fraud_detection.rings import REBUILD_BATCH_SIZE, rebuild_fraud_rings
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute fraud rings from every application (run once after migrating, "
+        "after changing FRAUD_RING_KEY_TYPES or FRAUD_RING_MAX_KEY_APPLICATIONS, after a bulk rescore, "
+        "or to drop links from edited identifiers)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        linked = rebuild_fraud_rings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt fraud rings from {linked} applications"))
@@ -0,0 +1,15 @@
+# fraud_detection/management/commands/rebuild_identity_keys.py
+
+from django.core.management.base import BaseCommand
+from fraud_detection.identity import REBUILD_BATCH_SIZE, rebuild_identity_keys
+
+
+class Command(BaseCommand):
+    help = "Recompute the normalized identity keys of every application (run once after migrating)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_identity_keys(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt identity keys for {rebuilt} applications"))
@@ -0,0 +1,18 @@
+# fraud_detection/management/commands/rebuild_similarity_index.py
+
+from django.core.management.base import BaseCommand
+from fraud_detection.similarity import REBUILD_BATCH_SIZE, SimilarityIndex
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the near-duplicate name/address index from every application. "
+        "Run once after deploying; applications saved during the rebuild are re-indexed on their next save."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        indexed = SimilarityIndex().rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} applications for similarity"))
@@ -0,0 +1,25 @@
+# fraud_detection/management/commands/rebuild_velocity_counters.py
+
+from django.core.management.base import BaseCommand
+from fraud_detection.velocity import REBUILD_BATCH_SIZE, get_velocity_backend, rebuild_velocity_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the velocity counters from applications inside the retention period "
+        "(run once after migrating or switching backends), or drop expired buckets with --prune."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+        parser.add_argument('--prune', action='store_true', help="Only drop buckets past their retention")
+
+    def handle(self, *args, **options):
+        backend = get_velocity_backend()
+        if options['prune']:
+            pruned = backend.prune()
+            self.stdout.write(self.style.SUCCESS(f"Pruned {pruned or 0} expired velocity buckets"))
+            return
+
+        counted = rebuild_velocity_counters(backend=backend, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt velocity counters from {counted} applications"))
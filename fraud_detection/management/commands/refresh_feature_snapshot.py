@@ -0,0 +1,12 @@
+# fraud_detection/management/commands/refresh_feature_snapshot.py
+
+from django.core.management.base import BaseCommand
+from fraud_detection.feature_snapshot import refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuild the memory-mapped feature snapshot shared by scoring workers."
+
+    def handle(self, *args, **options):
+        version = refresh_snapshot()
+        self.stdout.write(self.style.SUCCESS(f"Wrote feature snapshot {version}"))
@@ -0,0 +1,83 @@
+# fraud_detection/management/commands/run_scoring_worker.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from fraud_detection.job_queue import (
+    claim_jobs, complete_jobs, enqueue_scoring, release_stale_jobs, retry_job, worker_name
+)
+from fraud_detection.models import LoanApplication
+from fraud_detection.services import EnhancedFraudDetectionService
+
+
+class Command(BaseCommand):
+    help = "Claim queued ML scoring jobs and run the deferred ML stage for their applications."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help="Seconds to sleep when the queue is empty."
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Exit once no jobs are due instead of polling."
+        )
+        parser.add_argument(
+            '--enqueue-pending',
+            action='store_true',
+            help="First queue jobs for 'ML pending' applications that have none."
+        )
+
+    def handle(self, *args, **options):
+        service = EnhancedFraudDetectionService()
+        worker = worker_name()
+
+        if options['enqueue_pending']:
+            orphaned = LoanApplication.objects.filter(ml_status='pending').exclude(
+                scoring_jobs__status__in=['queued', 'running']
+            )
+            queued = sum(1 for app in orphaned if enqueue_scoring(app, 'backlog'))
+            self.stdout.write(f"Queued {queued} pending applications")
+
+        self.stdout.write(f"Scoring worker {worker} started")
+        processed = 0
+        try:
+            while True:
+                release_stale_jobs()
+                jobs = claim_jobs(worker, options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                processed += self.process(service, jobs)
+        except KeyboardInterrupt:
+            self.stdout.write("Interrupted; unfinished jobs are requeued once their lock expires")
+
+        self.stdout.write(self.style.SUCCESS(f"Scored {processed} applications"))
+
+    def process(self, service, jobs):
+        """Rescore the applications behind a batch of claimed jobs."""
+        # Jobs whose application was already scored (e.g. by a duplicate job) are done
+        pending = [job for job in jobs if job.loan_application.ml_status == 'pending']
+        done = [job for job in jobs if job.loan_application.ml_status != 'pending']
+
+        try:
+            rescored = set(service.rescore_pending([job.loan_application for job in pending]))
+        except Exception as e:
+            for job in pending:
+                retry_job(job, e)
+            complete_jobs(done)
+            return 0
+
+        for job in pending:
+            if job.loan_application_id in rescored:
+                done.append(job)
+            else:
+                retry_job(job, "No active behavioral model")
+        complete_jobs(done)
+        return len(rescored)
@@ -0,0 +1,29 @@
+# fraud_detection/management/commands/train_behavioral_model.py
+
+from django.core.management.base import BaseCommand
+from fraud_detection.ml_services import BehavioralPatternAnalyzer
+
+
+class Command(BaseCommand):
+    help = "Train a new behavioral anomaly model and store it in the model registry."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-activate',
+            action='store_true',
+            help="Save the new version without making it the active model."
+        )
+
+    def handle(self, *args, **options):
+        analyzer = BehavioralPatternAnalyzer()
+        model = analyzer.train_model(activate=not options['no_activate'])
+
+        if model is None:
+            self.stdout.write(self.style.WARNING("Not enough applications to train a model."))
+            return
+
+        sample = model.training_sample
+        self.stdout.write(self.style.SUCCESS(
+            f"Trained behavioral model {model.version} on {sample['sample_size']} of "
+            f"{sample['window_size']} applications (seed {sample['seed']})"
+        ))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fraud_detection', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationFeatures',
+            fields=[
+                ('loan_application', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='features', serialize=False, to='fraud_detection.loanapplication')),
+                ('application_date', models.DateTimeField(db_index=True)),
+                ('schema_version', models.PositiveSmallIntegerField()),
+                ('vector', models.BinaryField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:10
+
+import hashlib
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_sample_keys(apps, schema_editor):
+    """Give existing feature rows the same seeded key new rows get on write."""
+    ApplicationFeatures = apps.get_model('fraud_detection', 'ApplicationFeatures')
+    seed = getattr(settings, 'ML_TRAINING_SAMPLE_SEED', 42)
+
+    batch = []
+    for row in ApplicationFeatures.objects.filter(sample_key__isnull=True).only('pk').iterator():
+        digest = hashlib.blake2b(f"{seed}:{row.pk}".encode(), digest_size=8).digest()
+        row.sample_key = int.from_bytes(digest, 'big') / 2 ** 64
+        batch.append(row)
+        if len(batch) >= 1000:
+            ApplicationFeatures.objects.bulk_update(batch, ['sample_key'])
+            batch = []
+    if batch:
+        ApplicationFeatures.objects.bulk_update(batch, ['sample_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fraud_detection', '0002_application_features'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='applicationfeatures',
+            name='sample_key',
+            field=models.FloatField(db_index=True, null=True),
+        ),
+        migrations.RunPython(populate_sample_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fraud_detection', '0003_features_sample_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loanapplication',
+            name='ml_status',
+            field=models.CharField(blank=True, choices=[('complete', 'Complete'), ('pending', 'ML Pending'), ('failed', 'Failed')], db_index=True, max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fraud_detection', '0006_feature_drift_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentityKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_type', models.CharField(choices=[('name', 'Name'), ('phone', 'Phone'), ('email', 'Email')], max_length=10)),
+                ('value', models.CharField(max_length=255)),
+                ('loan_application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='identity_keys', to='fraud_detection.loanapplication')),
+                ('visitor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='identity_keys', to='fraud_detection.visitorid')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key_type', 'value'], name='fraud_detec_key_typ_671ec3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('loan_application', 'key_type'), name='unique_identity_key_per_type')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:25
+
+import re
+
+from django.db import migrations, models
+
+
+def populate_similarity_keys(apps, schema_editor):
+    """Derive name_key and email_base for existing rows the way LoanApplication.save() does."""
+    LoanApplication = apps.get_model('fraud_detection', 'LoanApplication')
+
+    batch = []
+    for app in LoanApplication.objects.only('pk', 'full_name', 'email').iterator():
+        app.name_key = ' '.join((app.full_name or '').casefold().split())[:255]
+        local = (app.email or '').strip().lower().split('@', 1)[0]
+        app.email_base = (re.sub(r'\d+$', '', local) or local)[:254]
+        batch.append(app)
+        if len(batch) >= 1000:
+            LoanApplication.objects.bulk_update(batch, ['name_key', 'email_base'])
+            batch = []
+    if batch:
+        LoanApplication.objects.bulk_update(batch, ['name_key', 'email_base'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fraud_detection', '0007_identity_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loanapplication',
+            name='email_base',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=254),
+        ),
+        migrations.AddField(
+            model_name='loanapplication',
+            name='name_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.RunPython(populate_similarity_keys, migrations.RunPython.noop),
+    ]
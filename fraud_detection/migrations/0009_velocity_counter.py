@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fraud_detection', '0008_similarity_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VelocityCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('visitor', 'Visitor'), ('ip', 'IP address'), ('email', 'Email'), ('phone', 'Phone')], max_length=10)),
+                ('key', models.CharField(max_length=255)),
+                ('granularity', models.PositiveIntegerField()),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'bucket_start'], name='fraud_detec_granula_b70f5f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('entity_type', 'key', 'granularity', 'bucket_start'), name='unique_velocity_bucket')],
+            },
+        ),
+    ]
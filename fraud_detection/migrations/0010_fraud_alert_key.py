@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fraud_detection', '0009_velocity_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fraudalert',
+            name='alert_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
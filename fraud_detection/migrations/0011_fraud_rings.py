@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:44
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fraud_detection', '0010_fraud_alert_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FraudRing',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('risk_total', models.FloatField(default=0.0)),
+                ('max_risk', models.FloatField(default=0.0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RingMember',
+            fields=[
+                ('loan_application', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ring_membership', serialize=False, to='fraud_detection.loanapplication')),
+                ('risk_score', models.FloatField(default=0.0)),
+                ('ring', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='fraud_detection.fraudring')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RingKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_type', models.CharField(choices=[('visitor', 'Visitor'), ('ip', 'IP address'), ('email', 'Email'), ('phone', 'Phone'), ('address', 'Address')], max_length=10)),
+                ('value', models.CharField(max_length=255)),
+                ('application_count', models.PositiveIntegerField(default=0)),
+                ('ring', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='keys', to='fraud_detection.fraudring')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('key_type', 'value'), name='unique_ring_key')],
+            },
+        ),
+    ]
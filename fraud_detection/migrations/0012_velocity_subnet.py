@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fraud_detection', '0011_fraud_rings'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='velocitycounter',
+            name='entity_type',
+            field=models.CharField(choices=[('visitor', 'Visitor'), ('ip', 'IP address'), ('subnet', 'Subnet'), ('email', 'Email'), ('phone', 'Phone')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,219 @@
+# fraud_detection/ml_registry.py
+import json
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+
+import joblib
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .compiled_forest import compile_with_parity_check
+from .drift import FeatureStats
+from .model_pointer import ACTIVE_POINTER, active_version
+
+logger = logging.getLogger(__name__)
+
+DBSCAN_EPS = 0.5
+DBSCAN_MIN_SAMPLES = 5
+
+# Scaled rows used to check a compiled forest when the training data is gone
+PARITY_PROBE_ROWS = 512
+
+# Per-process cache of the active model, keyed by the pointer file's mtime
+_active_model_cache = {'mtime': None, 'model': None}
+_cache_lock = threading.Lock()
+
+
+def write_json_atomic(path, data):
+    """Atomically replace a small JSON file so readers never see a partial write."""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class BehavioralModel:
+    """
+    A fitted scaler + IsolationForest pair, the DBSCAN core points indexed
+    for cluster assignment, and the metadata needed to reproduce and audit
+    the scores it produces. The forest is also kept compiled to flat NumPy
+    arrays so scoring makes no per-tree sklearn calls.
+    """
+
+    # Defaults for artifacts saved before clustering was part of the model
+    cluster_index = None
+    core_labels = None
+    cluster_eps = None
+    training_sample = None
+    compiled_forest = None
+    feature_stats = None
+
+    def __init__(self, version, feature_names, scaler, isolation_forest, training_size, trained_at,
+                 cluster_index=None, core_labels=None, cluster_eps=None, training_sample=None,
+                 compiled_forest=None, feature_stats=None):
+        self.version = version
+        self.feature_names = list(feature_names)
+        self.scaler = scaler
+        self.isolation_forest = isolation_forest
+        self.training_size = training_size
+        self.trained_at = trained_at
+        self.cluster_index = cluster_index
+        self.core_labels = core_labels
+        self.cluster_eps = cluster_eps
+        self.training_sample = training_sample
+        self.compiled_forest = compiled_forest
+        # Per-feature distribution of the training data, for drift reports
+        self.feature_stats = feature_stats
+
+    def transform(self, X):
+        """Scale raw feature rows with the scaler fitted at training time."""
+        X = np.nan_to_num(np.asarray(X, dtype=np.float64), nan=0.0)
+        return self.scaler.transform(X)
+
+    def decision_function(self, X_scaled):
+        """Anomaly scores for already-scaled rows (lower = more anomalous)."""
+        if self.compiled_forest is not None:
+            return self.compiled_forest.decision_function(X_scaled)
+        return self.isolation_forest.decision_function(X_scaled)
+
+    def assign_clusters(self, X_scaled):
+        """
+        DBSCAN cluster label for already-scaled rows: the label of the nearest
+        core point if it lies within eps, otherwise -1 (noise).
+        """
+        X_scaled = np.atleast_2d(X_scaled)
+        if self.cluster_index is None:
+            return np.full(len(X_scaled), -1, dtype=np.int64)
+
+        distances, indices = self.cluster_index.query(X_scaled, k=1)
+        return np.where(
+            distances[:, 0] <= self.cluster_eps,
+            self.core_labels[indices[:, 0]],
+            -1
+        )
+
+
+class BehavioralModelRegistry:
+    """
+    Trains behavioral models offline and stores them as versioned artifacts
+    on local disk. Workers load the active version once and only re-read it
+    when the active pointer changes.
+    """
+
+    ACTIVE_POINTER = ACTIVE_POINTER
+
+    def __init__(self, model_dir=None):
+        self.model_dir = Path(model_dir or settings.ML_MODEL_DIR)
+
+    def train(self, X, feature_names, training_sample=None):
+        """
+        Fit a new scaler, IsolationForest and cluster index on the given
+        feature matrix. training_sample describes how X was drawn.
+        """
+        # sklearn is only needed to fit; scoring processes unpickle what they use
+        from sklearn.cluster import DBSCAN
+        from sklearn.ensemble import IsolationForest
+        from sklearn.neighbors import KDTree
+        from sklearn.preprocessing import StandardScaler
+
+        X = np.nan_to_num(np.asarray(X, dtype=np.float64), nan=0.0)
+
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+
+        isolation_forest = IsolationForest(
+            contamination=0.1,  # Expect 10% anomalies
+            random_state=42,
+            n_estimators=100
+        )
+        isolation_forest.fit(X_scaled)
+
+        # Cluster once per training run and index only the core points;
+        # new rows are assigned by a nearest-core lookup instead of a refit
+        dbscan = DBSCAN(eps=DBSCAN_EPS, min_samples=DBSCAN_MIN_SAMPLES).fit(X_scaled)
+        core_points = X_scaled[dbscan.core_sample_indices_]
+        cluster_index = KDTree(core_points) if len(core_points) else None
+        core_labels = dbscan.labels_[dbscan.core_sample_indices_]
+
+        trained_at = timezone.now()
+        version = f"{trained_at.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+        return BehavioralModel(
+            version=version,
+            feature_names=feature_names,
+            scaler=scaler,
+            isolation_forest=isolation_forest,
+            training_size=len(X),
+            trained_at=trained_at.isoformat(),
+            cluster_index=cluster_index,
+            core_labels=core_labels,
+            cluster_eps=DBSCAN_EPS,
+            training_sample=training_sample,
+            compiled_forest=compile_with_parity_check(isolation_forest, X_scaled),
+            feature_stats=FeatureStats.from_matrix(X, feature_names).to_dict()
+        )
+
+    def save(self, model, activate=True):
+        """Persist a trained model and optionally make it the active version."""
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        artifact_path = self.model_dir / f"behavioral-{model.version}.joblib"
+        joblib.dump(model, artifact_path)
+        logger.info(f"Saved behavioral model {model.version} to {artifact_path}")
+
+        if activate:
+            write_json_atomic(self.model_dir / self.ACTIVE_POINTER, {
+                'version': model.version,
+                'artifact': artifact_path.name,
+                'trained_at': model.trained_at,
+                'training_size': model.training_size,
+                'training_sample': model.training_sample
+            })
+        return artifact_path
+
+    def active_version(self):
+        """Version of the active model, read from the pointer without loading the model."""
+        return active_version(self.model_dir)
+
+    def load_active(self):
+        """Return the active model, loading it from disk only when it changed."""
+        pointer_path = self.model_dir / self.ACTIVE_POINTER
+        try:
+            mtime = pointer_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        if _active_model_cache['mtime'] == mtime:
+            return _active_model_cache['model']
+
+        with _cache_lock:
+            if _active_model_cache['mtime'] == mtime:
+                return _active_model_cache['model']
+            try:
+                with open(pointer_path) as f:
+                    pointer = json.load(f)
+                model = joblib.load(self.model_dir / pointer['artifact'])
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Failed to load active behavioral model: {str(e)}")
+                return _active_model_cache['model']
+
+            if model.compiled_forest is None:
+                # Artifacts from before compilation: check parity on probe rows
+                # drawn from the scaled (zero mean, unit variance) space
+                probe = np.random.default_rng(0).standard_normal((PARITY_PROBE_ROWS, len(model.feature_names)))
+                model.compiled_forest = compile_with_parity_check(model.isolation_forest, probe)
+
+            _active_model_cache['mtime'] = mtime
+            _active_model_cache['model'] = model
+            logger.info(f"Loaded behavioral model {model.version}")
+            return model
@@ -1,40 +1,92 @@
 # fraud_detection/ml_services.py
 import numpy as np
-import pandas as pd
-from sklearn.cluster import DBSCAN
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-from django.db.models import Q
+from django.conf import settings
+from django.db.models import Q, Count, Max
+from django.db.models.functions import Length
 from datetime import timedelta
 from django.utils import timezone
 import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from bisect import bisect_left
+from collections import defaultdict
 from .models import LoanApplication, VisitorID
+from .ml_registry import BehavioralModelRegistry
+from .feature_snapshot import FeatureSnapshot, refresh_snapshot
+from .feature_store import FeatureStore, FEATURE_NAMES, vector_to_features
 
 logger = logging.getLogger(__name__)
 
+# Shared pool for deadline-bounded scoring; its slots double as a load gauge
+_scoring_executor = None
+_scoring_slots = None
+_executor_lock = threading.Lock()
+
+SMART_SIGNAL_FIELDS = (
+    'bot_detected', 'vpn_detected', 'proxy_detected', 'tor_detected',
+    'tampering_detected', 'incognito', 'ip_blocklisted',
+)
+COMMON_EMAIL_DOMAINS = ('gmail.com', 'yahoo.com', 'outlook.com', 'hotmail.com')
+
+
+def _get_scoring_executor():
+    """Create the per-process scoring pool on first use."""
+    global _scoring_executor, _scoring_slots
+    if _scoring_executor is None:
+        with _executor_lock:
+            if _scoring_executor is None:
+                _scoring_slots = threading.BoundedSemaphore(settings.ML_MAX_CONCURRENT_SCORING)
+                _scoring_executor = ThreadPoolExecutor(
+                    max_workers=settings.ML_MAX_CONCURRENT_SCORING,
+                    thread_name_prefix='ml-scoring'
+                )
+    return _scoring_executor, _scoring_slots
+
+
+def _device_stability(metadata):
+    """Return (browser_stability, os_stability) flags from stored metadata."""
+    if not metadata:
+        return 0, 0
+    try:
+        metadata = json.loads(metadata) if isinstance(metadata, str) else metadata
+        browser_details = metadata.get('browserDetails', {})
+        return (
+            1 if browser_details.get('browser') else 0,
+            1 if metadata.get('osDetails', {}).get('os') else 0
+        )
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        return 0, 0
+
+
+def _common_email_domain(email):
+    """Return 1 if the email uses one of the common free-mail domains."""
+    if email and '@' in email:
+        return 1 if email.split('@')[-1].lower() in COMMON_EMAIL_DOMAINS else 0
+    return 0
+
 class BehavioralPatternAnalyzer:
     """
     Analyzes behavioral patterns using unsupervised ML algorithms
     to detect anomalous loan applications without training data.
     """
     
-    def __init__(self):
-        self.scaler = StandardScaler()
-        self.isolation_forest = IsolationForest(
-            contamination=0.1,  # Expect 10% anomalies
-            random_state=42,
-            n_estimators=100
-        )
-        self.dbscan = DBSCAN(eps=0.5, min_samples=5)
+    def __init__(self, registry=None):
+        self.registry = registry or BehavioralModelRegistry()
+        self.feature_store = FeatureStore(self)
+        self.snapshot = FeatureSnapshot()
         
     def extract_behavioral_features(self, loan_application):
-        """Extract behavioral features from loan application and visitor data."""
+        """
+        Extract behavioral features from loan application and visitor data.
+        Visitor history is taken as of the application's own date so the
+        values never drift after submission.
+        """
         features = {}
         
         # Time-based features
-        app_time = loan_application.application_date
+        app_time = loan_application.application_date or timezone.now()
         features['hour_of_day'] = app_time.hour
         features['day_of_week'] = app_time.weekday()
         features['is_weekend'] = 1 if app_time.weekday() >= 5 else 0
@@ -52,14 +104,17 @@ class BehavioralPatternAnalyzer:
         features['incognito'] = int(loan_application.incognito or False)
         features['ip_blocklisted'] = int(loan_application.ip_blocklisted or False)
         
-        # Visitor behavior features
-        if loan_application.visitor_id:
-            visitor = loan_application.visitor_id
-            features['visitor_app_count'] = visitor.application_count or 0
+        # Visitor behavior features (earlier applications from the same visitor)
+        if loan_application.visitor_id_id:
+            prior = LoanApplication.objects.filter(
+                visitor_id=loan_application.visitor_id_id,
+                application_date__lt=app_time
+            ).aggregate(count=Count('id'), last=Max('application_date'))
+            features['visitor_app_count'] = prior['count']
             
             # Time since last application
-            if visitor.last_application_date:
-                time_diff = (timezone.now() - visitor.last_application_date).total_seconds() / 3600  # hours
+            if prior['last']:
+                time_diff = (app_time - prior['last']).total_seconds() / 3600  # hours
                 features['hours_since_last_app'] = min(time_diff, 168)  # Cap at 1 week
             else:
                 features['hours_since_last_app'] = 168  # Default to 1 week
@@ -68,18 +123,7 @@ class BehavioralPatternAnalyzer:
             features['hours_since_last_app'] = 168
             
         # Device consistency features
-        if loan_application.metadata:
-            try:
-                metadata = json.loads(loan_application.metadata) if isinstance(loan_application.metadata, str) else loan_application.metadata
-                browser_details = metadata.get('browserDetails', {})
-                features['browser_stability'] = 1 if browser_details.get('browser') else 0
-                features['os_stability'] = 1 if metadata.get('osDetails', {}).get('os') else 0
-            except (json.JSONDecodeError, TypeError):
-                features['browser_stability'] = 0
-                features['os_stability'] = 0
-        else:
-            features['browser_stability'] = 0
-            features['os_stability'] = 0
+        features['browser_stability'], features['os_stability'] = _device_stability(loan_application.metadata)
             
         # Text-based features (length and patterns)
         features['name_length'] = len(loan_application.full_name or '')
@@ -87,75 +131,214 @@ class BehavioralPatternAnalyzer:
         features['purpose_length'] = len(loan_application.purpose or '')
         
         # Email domain features
-        if loan_application.email and '@' in loan_application.email:
-            domain = loan_application.email.split('@')[-1].lower()
-            common_domains = ['gmail.com', 'yahoo.com', 'outlook.com', 'hotmail.com']
-            features['common_email_domain'] = 1 if domain in common_domains else 0
-        else:
-            features['common_email_domain'] = 0
+        features['common_email_domain'] = _common_email_domain(loan_application.email)
             
         return features
     
+    def extract_behavioral_features_batch(self, applications):
+        """
+        Extract features for a whole queryset in two queries (the rows and
+        their visitors' application dates).
+        Returns (ids, X) where X is a float32 matrix whose columns follow
+        FEATURE_NAMES and match extract_behavioral_features value for value.
+        """
+        rows = list(applications.order_by().values_list(
+            'id',
+            'application_date',
+            'amount_requested',
+            'confidence_score',
+            *SMART_SIGNAL_FIELDS,
+            'visitor_id',
+            'metadata',
+            Length('full_name'),
+            'email',
+            Length('purpose'),
+        ))
+        X = np.zeros((len(rows), len(FEATURE_NAMES)), dtype=np.float32)
+        if not rows:
+            return [], X
+
+        (ids, app_dates, amounts, confidences, *signals,
+         visitor_ids, metadatas, name_lengths, emails, purpose_lengths) = zip(*rows)
+
+        # Application dates per visitor, to derive as-of visitor history
+        visitor_dates = defaultdict(list)
+        for visitor_id, app_date in LoanApplication.objects.filter(
+            visitor_id__in=applications.order_by().values('visitor_id')
+        ).values_list('visitor_id', 'application_date'):
+            visitor_dates[visitor_id].append(app_date)
+        for dates in visitor_dates.values():
+            dates.sort()
+
+        app_counts = []
+        hours_since_last = []
+        for visitor_id, app_date in zip(visitor_ids, app_dates):
+            dates = visitor_dates.get(visitor_id, ()) if visitor_id else ()
+            prior_count = bisect_left(dates, app_date)
+            app_counts.append(prior_count)
+            if prior_count:
+                time_diff = (app_date - dates[prior_count - 1]).total_seconds() / 3600
+                hours_since_last.append(min(time_diff, 168))
+            else:
+                hours_since_last.append(168)
+
+        # Taken from the fetched datetimes as the single-row path does; database
+        # timezone conversion (CONVERT_TZ on MySQL) needs the server's zone tables
+        hours = [app_date.hour for app_date in app_dates]
+        weekdays = np.array([app_date.weekday() for app_date in app_dates], dtype=np.float32)
+        stability = np.array([_device_stability(m) for m in metadatas], dtype=np.float32)
+
+        columns = {
+            'hour_of_day': hours,
+            'day_of_week': weekdays,
+            'is_weekend': weekdays >= 5,
+            'amount_requested': np.array(amounts, dtype=np.float64),
+            'confidence_score': [c or 0.5 for c in confidences],
+            'visitor_app_count': app_counts,
+            'hours_since_last_app': hours_since_last,
+            'browser_stability': stability[:, 0],
+            'os_stability': stability[:, 1],
+            'name_length': [n or 0 for n in name_lengths],
+            'email_length': [len(e or '') for e in emails],
+            'purpose_length': [n or 0 for n in purpose_lengths],
+            'common_email_domain': [_common_email_domain(e) for e in emails],
+        }
+        for name, values in zip(SMART_SIGNAL_FIELDS, signals):
+            columns[name] = [bool(v) for v in values]
+
+        for i, name in enumerate(FEATURE_NAMES):
+            X[:, i] = columns[name]
+
+        return list(ids), X
+
+    def build_training_matrix(self, since, exclude_id=None):
+        """
+        Load (ids, X) for the training window from the feature store, capped
+        at ML_TRAINING_SAMPLE_SIZE rows by seeded bottom-k sampling.
+        """
+        return self.feature_store.load_matrix(
+            since=since,
+            exclude_id=exclude_id,
+            backfill=True,
+            limit=settings.ML_TRAINING_SAMPLE_SIZE
+        )
+
+    def train_model(self, activate=True):
+        """
+        Train and persist a new behavioral model version on a sample of the
+        training window, then refresh the shared feature snapshot with the
+        whole window for the scoring workers.
+        Meant to run offline (see the train_behavioral_model command).
+        """
+        window_start = timezone.now() - timedelta(days=settings.ML_TRAINING_WINDOW_DAYS)
+        _, X = self.build_training_matrix(since=window_start)
+        if len(X) < settings.ML_MIN_TRAINING_SAMPLES:
+            logger.warning(f"Not enough applications to train a behavioral model ({len(X)})")
+            return None
+
+        training_sample = {
+            'sample_size': len(X),
+            'window_size': self.feature_store.count(since=window_start),
+            'max_sample_size': settings.ML_TRAINING_SAMPLE_SIZE,
+            'seed': settings.ML_TRAINING_SAMPLE_SEED,
+            'window_start': window_start.isoformat()
+        }
+        model = self.registry.train(X, list(FEATURE_NAMES), training_sample=training_sample)
+        self.registry.save(model, activate=activate)
+        refresh_snapshot(self.feature_store, self.snapshot)
+        return model
+
+    def application_matrix(self, applications):
+        """
+        Feature matrix with one row per application, in order. Rows are read
+        from the shared memory-mapped snapshot when it is fresh and holds the
+        application; the rest come from the feature store.
+        """
+        snapshot_rows = self.snapshot.lookup(
+            [app.id for app in applications],
+            max_age=timedelta(minutes=settings.ML_SNAPSHOT_MAX_AGE_MINUTES)
+        )
+        if snapshot_rows is None:
+            X = np.zeros((len(applications), len(FEATURE_NAMES)), dtype=np.float32)
+            found = np.zeros(len(applications), dtype=bool)
+        else:
+            X, found = snapshot_rows
+
+        missing = [app for app, hit in zip(applications, found) if not hit]
+        if len(missing) == 1:
+            X[~found] = self.feature_store.get_vector(missing[0])
+        elif missing:
+            X[~found] = self.feature_store.get_matrix(missing)
+        return X
+
+    def get_active_model(self):
+        """
+        Return the active model, or None if none has been trained yet.
+        Models are trained offline by the train_behavioral_model command;
+        until one exists callers fall back to rule-only scoring.
+        """
+        return self.registry.load_active()
+
     def analyze_current_application(self, loan_application):
         """
         Analyze current application against recent patterns to detect anomalies.
         """
+        return self.analyze_applications([loan_application])[0]
+    
+    def analyze_applications(self, applications):
+        """
+        Analyze many applications with one model load and one vectorized
+        scoring pass. Returns one analysis dict per application, in order.
+        """
+        applications = list(applications)
         try:
-            # Get recent applications for comparison (last 30 days)
-            recent_date = timezone.now() - timedelta(days=30)
-            recent_applications = LoanApplication.objects.filter(
-                application_date__gte=recent_date
-            ).exclude(id=loan_application.id)
+            model = self.get_active_model()
+            
+            if model is None or model.training_size < 10:  # Need minimum data for analysis
+                return [self._insufficient_data_analysis(model) for _ in applications]
             
-            if recent_applications.count() < 10:  # Need minimum data for analysis
-                return {
-                    'anomaly_score': 0.5,  # Neutral score
+            X = self.application_matrix(applications)
+            
+            return self.analyze_vectors(model, X)
+            
+        except Exception as e:
+            logger.error(f"Error in behavioral pattern analysis: {str(e)}")
+            return [
+                {
+                    'anomaly_score': 0.5,
                     'anomaly_detected': False,
                     'cluster_label': -1,
                     'behavioral_risk': 'medium',
-                    'analysis_details': 'Insufficient historical data for ML analysis'
+                    'analysis_details': f'Analysis failed: {str(e)}',
+                    'model_version': None
                 }
-            
-            # Extract features for all applications
-            all_features = []
-            feature_names = []
-            
-            # Process recent applications
-            for app in recent_applications:
-                features = self.extract_behavioral_features(app)
-                all_features.append(list(features.values()))
-                if not feature_names:  # Get feature names from first application
-                    feature_names = list(features.keys())
-            
-            # Process current application
-            current_features = self.extract_behavioral_features(loan_application)
-            current_feature_vector = [current_features[name] for name in feature_names]
-            
-            # Convert to numpy array
-            X = np.array(all_features)
-            X_current = np.array([current_feature_vector])
-            
-            # Handle any NaN values
-            X = np.nan_to_num(X, nan=0.0)
-            X_current = np.nan_to_num(X_current, nan=0.0)
-            
-            # Scale features
-            X_scaled = self.scaler.fit_transform(X)
-            X_current_scaled = self.scaler.transform(X_current)
-            
-            # Isolation Forest for anomaly detection
-            self.isolation_forest.fit(X_scaled)
-            anomaly_score = self.isolation_forest.decision_function(X_current_scaled)[0]
-            is_anomaly = self.isolation_forest.predict(X_current_scaled)[0] == -1
-            
-            # DBSCAN for clustering
-            cluster_labels = self.dbscan.fit_predict(X_scaled)
-            
-            # Find which cluster the current application belongs to
-            # Add current application to the dataset and re-cluster
-            X_with_current = np.vstack([X_scaled, X_current_scaled])
-            all_cluster_labels = self.dbscan.fit_predict(X_with_current)
-            current_cluster = all_cluster_labels[-1]  # Last item is current application
+                for _ in applications
+            ]
+    
+    def analyze_vectors(self, model, X):
+        """
+        Score stored feature vectors (rows in FEATURE_NAMES order) with a
+        loaded model. Pure computation: no database access.
+        """
+        if model is None or model.training_size < 10:
+            return [self._insufficient_data_analysis(model) for _ in X]
+        
+        feature_names = model.feature_names
+        columns = [FEATURE_NAMES.index(name) for name in feature_names]
+        
+        # Scale features with the scaler fitted at training time
+        X_scaled = model.transform(X[:, columns])
+        
+        # Isolation Forest for anomaly detection (negative scores are outliers)
+        anomaly_scores = model.decision_function(X_scaled)
+        
+        # Cluster membership from the core points indexed at training time
+        cluster_labels = model.assign_clusters(X_scaled)
+        
+        results = []
+        for vector, anomaly_score, current_cluster in zip(X, anomaly_scores, cluster_labels):
+            current_features = vector_to_features(vector)
+            is_anomaly = anomaly_score < 0
             
             # Calculate behavioral risk
             behavioral_risk = self._calculate_behavioral_risk(
@@ -164,27 +347,31 @@ class BehavioralPatternAnalyzer:
             
             # Generate analysis details
             analysis_details = self._generate_analysis_details(
-                current_features, anomaly_score, current_cluster, recent_applications.count()
+                current_features, anomaly_score, current_cluster, model.training_size,
+                model.training_sample
             )
             
-            return {
+            results.append({
                 'anomaly_score': float(anomaly_score),
                 'anomaly_detected': bool(is_anomaly),
                 'cluster_label': int(current_cluster),
                 'behavioral_risk': behavioral_risk,
                 'analysis_details': analysis_details,
-                'feature_importance': self._get_feature_importance(current_features, feature_names)
-            }
-            
-        except Exception as e:
-            logger.error(f"Error in behavioral pattern analysis: {str(e)}")
-            return {
-                'anomaly_score': 0.5,
-                'anomaly_detected': False,
-                'cluster_label': -1,
-                'behavioral_risk': 'medium',
-                'analysis_details': f'Analysis failed: {str(e)}'
-            }
+                'feature_importance': self._get_feature_importance(current_features, feature_names),
+                'model_version': model.version,
+                'training_sample': model.training_sample
+            })
+        return results
+    
+    def _insufficient_data_analysis(self, model):
+        return {
+            'anomaly_score': 0.5,  # Neutral score
+            'anomaly_detected': False,
+            'cluster_label': -1,
+            'behavioral_risk': 'medium',
+            'analysis_details': 'Insufficient historical data for ML analysis',
+            'model_version': model.version if model else None
+        }
     
     def _calculate_behavioral_risk(self, anomaly_score, is_anomaly, cluster_label, features):
         """Calculate behavioral risk level based on ML analysis."""
@@ -218,11 +405,16 @@ class BehavioralPatternAnalyzer:
         else:
             return 'low'
     
-    def _generate_analysis_details(self, features, anomaly_score, cluster_label, sample_size):
+    def _generate_analysis_details(self, features, anomaly_score, cluster_label, sample_size, training_sample=None):
         """Generate human-readable analysis details."""
         details = []
         
         details.append(f"Analyzed against {sample_size} recent applications")
+        if training_sample and training_sample['sample_size'] < training_sample['window_size']:
+            details.append(
+                f"Sampled {training_sample['sample_size']} of {training_sample['window_size']} "
+                f"(seed {training_sample['seed']})"
+            )
         details.append(f"Anomaly score: {anomaly_score:.3f} (lower = more anomalous)")
         
         if cluster_label == -1:
@@ -236,7 +428,7 @@ class BehavioralPatternAnalyzer:
         if features['vpn_detected'] or features['proxy_detected']:
             details.append("⚠️ Network anonymization detected")
         if features['visitor_app_count'] > 3:
-            details.append(f"⚠️ High application frequency ({features['visitor_app_count']} applications)")
+            details.append(f"⚠️ High application frequency ({int(features['visitor_app_count'])} applications)")
         if features['hours_since_last_app'] < 1:
             details.append("⚠️ Very recent previous application")
             
@@ -275,33 +467,7 @@ class MLFraudEnhancer:
         try:
             # Get behavioral analysis
             behavioral_analysis = self.behavioral_analyzer.analyze_current_application(loan_application)
-            
-            # Calculate ML risk adjustment
-            ml_risk_adjustment = self._calculate_ml_risk_adjustment(behavioral_analysis)
-            
-            # Combine with existing risk score
-            enhanced_risk_score = min(100, existing_risk_score + ml_risk_adjustment)
-            
-            # Update loan application metadata with ML analysis
-            if loan_application.metadata:
-                try:
-                    metadata = json.loads(loan_application.metadata) if isinstance(loan_application.metadata, str) else loan_application.metadata
-                except json.JSONDecodeError:
-                    metadata = {}
-            else:
-                metadata = {}
-                
-            metadata['ml_analysis'] = behavioral_analysis
-            metadata['ml_risk_adjustment'] = ml_risk_adjustment
-            metadata['enhanced_risk_score'] = enhanced_risk_score
-            
-            loan_application.metadata = json.dumps(metadata)
-            
-            return {
-                'enhanced_risk_score': enhanced_risk_score,
-                'ml_risk_adjustment': ml_risk_adjustment,
-                'behavioral_analysis': behavioral_analysis
-            }
+            return self._apply_analysis(loan_application, existing_risk_score, behavioral_analysis)
             
         except Exception as e:
             logger.error(f"Error in ML fraud enhancement: {str(e)}")
@@ -311,6 +477,113 @@ class MLFraudEnhancer:
                 'behavioral_analysis': {'analysis_details': f'ML enhancement failed: {str(e)}'}
             }
     
+    def enhance_within_budget(self, loan_application, existing_risk_score, budget_ms=None):
+        """
+        Enhance one application only if scoring finishes within the latency
+        budget (ML_SCORING_BUDGET_MS). Returns (ml_results, None) on success
+        or (None, reason) when the caller should fall back to the rule-based
+        score: 'load' if every scoring slot is busy, 'no_model' if no model
+        is trained yet, 'timeout' or 'error'.
+        """
+        budget = (settings.ML_SCORING_BUDGET_MS if budget_ms is None else budget_ms) / 1000
+        started = time.monotonic()
+        
+        executor, slots = _get_scoring_executor()
+        if not slots.acquire(blocking=False):
+            return None, 'load'
+        
+        try:
+            # Database reads stay on the request thread and its transaction
+            vector = self.behavioral_analyzer.feature_store.get_vector(loan_application)
+            if vector is None:
+                slots.release()
+                return None, 'error'
+            future = executor.submit(self._score_vector, vector, slots)
+        except Exception as e:
+            slots.release()
+            logger.error(f"Error preparing ML scoring: {str(e)}")
+            return None, 'error'
+        
+        try:
+            behavioral_analysis = future.result(timeout=max(budget - (time.monotonic() - started), 0))
+        except FuturesTimeoutError:
+            logger.warning(f"ML scoring exceeded {budget * 1000:.0f}ms budget for {loan_application.id}")
+            return None, 'timeout'
+        except Exception as e:
+            logger.error(f"Error in budgeted ML scoring: {str(e)}")
+            return None, 'error'
+        
+        if behavioral_analysis is None:
+            return None, 'no_model'
+        return self._apply_analysis(loan_application, existing_risk_score, behavioral_analysis), None
+    
+    def _score_vector(self, vector, slots):
+        """Runs on the scoring pool: load the active model and score one vector."""
+        try:
+            model = self.behavioral_analyzer.registry.load_active()
+            if model is None:
+                return None
+            return self.behavioral_analyzer.analyze_vectors(model, vector.reshape(1, -1))[0]
+        finally:
+            slots.release()
+    
+    def enhance_many(self, applications, existing_risk_scores=None):
+        """
+        Enhance many applications at once: the model is loaded once and all
+        rows are scored in a single vectorized pass. Existing risk scores
+        default to each application's stored risk_score.
+        """
+        applications = list(applications)
+        if existing_risk_scores is None:
+            existing_risk_scores = [float(app.risk_score) for app in applications]
+        
+        try:
+            analyses = self.behavioral_analyzer.analyze_applications(applications)
+            return [
+                self._apply_analysis(app, risk_score, analysis)
+                for app, risk_score, analysis in zip(applications, existing_risk_scores, analyses)
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error in batch ML fraud enhancement: {str(e)}")
+            return [
+                {
+                    'enhanced_risk_score': risk_score,
+                    'ml_risk_adjustment': 0,
+                    'behavioral_analysis': {'analysis_details': f'ML enhancement failed: {str(e)}'}
+                }
+                for risk_score in existing_risk_scores
+            ]
+    
+    def _apply_analysis(self, loan_application, existing_risk_score, behavioral_analysis):
+        """Combine an analysis with the rule-based score and record it in metadata."""
+        # Calculate ML risk adjustment
+        ml_risk_adjustment = self._calculate_ml_risk_adjustment(behavioral_analysis)
+        
+        # Combine with existing risk score
+        enhanced_risk_score = min(100, existing_risk_score + ml_risk_adjustment)
+        
+        # Update loan application metadata with ML analysis
+        if loan_application.metadata:
+            try:
+                metadata = json.loads(loan_application.metadata) if isinstance(loan_application.metadata, str) else loan_application.metadata
+            except json.JSONDecodeError:
+                metadata = {}
+        else:
+            metadata = {}
+            
+        metadata['ml_analysis'] = behavioral_analysis
+        metadata['ml_risk_adjustment'] = ml_risk_adjustment
+        metadata['enhanced_risk_score'] = enhanced_risk_score
+        
+        loan_application.metadata = json.dumps(metadata)
+        
+        return {
+            'enhanced_risk_score': enhanced_risk_score,
+            'ml_risk_adjustment': ml_risk_adjustment,
+            'behavioral_analysis': behavioral_analysis
+        }
+    
     def _calculate_ml_risk_adjustment(self, behavioral_analysis):
         """Calculate risk score adjustment based on ML analysis."""
         adjustment = 0
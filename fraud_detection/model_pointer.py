@@ -0,0 +1,26 @@
+# fraud_detection/model_pointer.py
+"""
+The model registry's active pointer: a small JSON file naming the active
+behavioral model version and its artifact. Reading it needs none of the
+ML libraries, so web requests can learn the active version without
+loading the model.
+"""
+import json
+from pathlib import Path
+
+from django.conf import settings
+
+ACTIVE_POINTER = 'active.json'
+
+
+def pointer_path(model_dir=None):
+    return Path(model_dir or settings.ML_MODEL_DIR) / ACTIVE_POINTER
+
+
+def active_version(model_dir=None):
+    """Version named by the active pointer, or None if no model is active or the pointer is unreadable."""
+    try:
+        with open(pointer_path(model_dir)) as f:
+            return json.load(f).get('version')
+    except (OSError, ValueError):
+        return None
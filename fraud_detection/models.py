@@ -4,6 +4,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from .normalization import email_base, normalize_name
 
 class VisitorID(models.Model):
     """Stores unique visitor identifiers and associated metadata for fraud detection."""
@@ -42,6 +43,11 @@ class LoanApplication(models.Model):
         ("rejected", "Rejected"),
         ("flagged", "Flagged for Review")
     ]
+    ML_STATUS_CHOICES = [
+        ("complete", "Complete"),
+        ("pending", "ML Pending"),
+        ("failed", "Failed")
+    ]
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
@@ -90,6 +96,20 @@ class LoanApplication(models.Model):
     last_modified = models.DateTimeField(auto_now=True)
     fraud_patterns = models.JSONField(null=True, blank=True)
     risk_factors = models.JSONField(null=True, blank=True)
+    # "pending" when the decision came from rules only and ML scoring was deferred
+    ml_status = models.CharField(max_length=20, choices=ML_STATUS_CHOICES, null=True, blank=True, db_index=True)
+    
+    # Derived on save for indexed similar-application lookups
+    name_key = models.CharField(max_length=255, blank=True, default="", db_index=True)
+    email_base = models.CharField(max_length=254, blank=True, default="", db_index=True)
+    
+    def save(self, *args, **kwargs):
+        self.name_key = (normalize_name(self.full_name) or "")[:255]
+        self.email_base = email_base(self.email)[:254]
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"full_name", "email"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"name_key", "email_base"}
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"Loan {self.id} - {self.full_name} ({self.status})"
@@ -113,6 +133,15 @@ class FraudAlert(models.Model):
     )
     risk_score = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
     metadata = models.JSONField(null=True, blank=True)
+    # Identifies the check that raised the alert (e.g. "rules:<application id>"),
+    # so retried or repeated checks update their alert instead of adding one
+    alert_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+
+    @classmethod
+    def record(cls, alert_key, **fields):
+        """Create or update the alert identified by alert_key."""
+        alert, _ = cls.objects.update_or_create(alert_key=alert_key, defaults=fields)
+        return alert
 
     def save(self, *args, **kwargs):
         """Ensure status defaults to 'PENDING' if an invalid value is set."""
@@ -123,3 +152,177 @@ class FraudAlert(models.Model):
 
     def __str__(self):
         return f"Fraud Alert for Loan {self.loan_application.id} - Status: {self.status}"
+
+
+class ApplicationFeatures(models.Model):
+    """Behavioral feature vector materialized once when an application is submitted."""
+    loan_application = models.OneToOneField(
+        LoanApplication, on_delete=models.CASCADE, primary_key=True, related_name="features"
+    )
+    # Copied from the application so window scans don't need a join
+    application_date = models.DateTimeField(db_index=True)
+    schema_version = models.PositiveSmallIntegerField()
+    vector = models.BinaryField()  # float32 values in FEATURE_NAMES order
+    # Seeded hash of the application id in [0, 1); the lowest keys in a window
+    # form a uniform, reproducible training sample
+    sample_key = models.FloatField(null=True, db_index=True)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Features for Loan {self.loan_application_id} (schema v{self.schema_version})"
+
+
+class ScoringJob(models.Model):
+    """Queued ML scoring work for an application, claimed by run_scoring_worker."""
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed")
+    ]
+
+    loan_application = models.ForeignKey(LoanApplication, on_delete=models.CASCADE, related_name="scoring_jobs")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+    reason = models.CharField(max_length=20, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, null=True, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self):
+        return f"Scoring job {self.id} for Loan {self.loan_application_id} ({self.status})"
+
+
+class FeatureDriftSnapshot(models.Model):
+    """Mergeable running statistics of the behavioral features seen in one hour."""
+    hour = models.DateTimeField(unique=True)
+    application_count = models.PositiveIntegerField(default=0)
+    stats = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Feature stats for {self.hour:%Y-%m-%d %H:00} ({self.application_count} applications)"
+
+
+class IdentityKey(models.Model):
+    """
+    Normalized name, phone or email of an application, kept in sync on save
+    so identity checks are indexed equality lookups.
+    """
+    KEY_TYPE_CHOICES = [
+        ("name", "Name"),
+        ("phone", "Phone"),
+        ("email", "Email")
+    ]
+
+    key_type = models.CharField(max_length=10, choices=KEY_TYPE_CHOICES)
+    value = models.CharField(max_length=255)
+    loan_application = models.ForeignKey(LoanApplication, on_delete=models.CASCADE, related_name="identity_keys")
+    # Denormalized from the application so "other devices" filters stay on this table
+    visitor = models.ForeignKey(VisitorID, on_delete=models.CASCADE, null=True, blank=True, related_name="identity_keys")
+
+    class Meta:
+        indexes = [models.Index(fields=["key_type", "value"])]
+        constraints = [
+            models.UniqueConstraint(fields=["loan_application", "key_type"], name="unique_identity_key_per_type")
+        ]
+
+    def __str__(self):
+        return f"{self.key_type}:{self.value} -> Loan {self.loan_application_id}"
+
+
+class VelocityCounter(models.Model):
+    """
+    Applications per entity (visitor, IP, subnet, email, phone) in one time
+    bucket, used by the database velocity backend.
+    """
+    ENTITY_TYPE_CHOICES = [
+        ("visitor", "Visitor"),
+        ("ip", "IP address"),
+        ("subnet", "Subnet"),
+        ("email", "Email"),
+        ("phone", "Phone")
+    ]
+
+    entity_type = models.CharField(max_length=10, choices=ENTITY_TYPE_CHOICES)
+    key = models.CharField(max_length=255)
+    # Bucket width in seconds
+    granularity = models.PositiveIntegerField()
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["entity_type", "key", "granularity", "bucket_start"], name="unique_velocity_bucket"
+            )
+        ]
+        indexes = [models.Index(fields=["granularity", "bucket_start"])]
+
+    def __str__(self):
+        return f"{self.entity_type}:{self.key} {self.bucket_start:%Y-%m-%d %H:%M} ({self.count})"
+
+
+class FraudRing(models.Model):
+    """
+    A connected component of applications linked by shared identifiers
+    (visitor, IP address, email, phone, address), with running totals of
+    its members' risk.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    size = models.PositiveIntegerField(default=0)
+    risk_total = models.FloatField(default=0.0)
+    # Highest member risk score seen; not lowered when a member is rescored down
+    max_risk = models.FloatField(default=0.0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def mean_risk(self):
+        return self.risk_total / self.size if self.size else 0.0
+
+    def __str__(self):
+        return f"Fraud ring {self.id} ({self.size} applications)"
+
+
+class RingKey(models.Model):
+    """A normalized identifier value and the ring of every application that has it."""
+    KEY_TYPE_CHOICES = [
+        ("visitor", "Visitor"),
+        ("ip", "IP address"),
+        ("email", "Email"),
+        ("phone", "Phone"),
+        ("address", "Address")
+    ]
+
+    key_type = models.CharField(max_length=10, choices=KEY_TYPE_CHOICES)
+    value = models.CharField(max_length=255)
+    ring = models.ForeignKey(FraudRing, on_delete=models.CASCADE, related_name="keys")
+    # Applications linked through this value; past FRAUD_RING_MAX_KEY_APPLICATIONS it links no more
+    application_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["key_type", "value"], name="unique_ring_key")
+        ]
+
+    def __str__(self):
+        return f"{self.key_type}:{self.value} -> Ring {self.ring_id}"
+
+
+class RingMember(models.Model):
+    """An application's ring and the risk score it contributes to the ring totals."""
+    loan_application = models.OneToOneField(
+        LoanApplication, on_delete=models.CASCADE, primary_key=True, related_name="ring_membership"
+    )
+    ring = models.ForeignKey(FraudRing, on_delete=models.CASCADE, related_name="members")
+    risk_score = models.FloatField(default=0.0)
+
+    def __str__(self):
+        return f"Loan {self.loan_application_id} in Ring {self.ring_id}"
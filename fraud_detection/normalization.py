@@ -0,0 +1,42 @@
+# fraud_detection/normalization.py
+"""Canonical forms of applicant details shared by the identity and similarity indexes."""
+import re
+
+# Providers that ignore dots in the local part
+DOTLESS_EMAIL_DOMAINS = {'gmail.com': 'gmail.com', 'googlemail.com': 'gmail.com'}
+
+
+def normalize_name(name):
+    """Case-folded name with surrounding and repeated whitespace removed."""
+    return ' '.join((name or '').casefold().split()) or None
+
+
+def normalize_phone(phone):
+    """Phone number reduced to its digits."""
+    return re.sub(r'\D', '', phone or '') or None
+
+
+def normalize_email(email):
+    """
+    Lowercased email with any +tag removed; for Gmail addresses dots in the
+    local part are removed too, since Gmail delivers those to one inbox.
+    """
+    email = (email or '').strip().lower()
+    if '@' not in email:
+        return email or None
+    local, domain = email.rsplit('@', 1)
+    local = local.split('+', 1)[0]
+    if domain in DOTLESS_EMAIL_DOMAINS:
+        local = local.replace('.', '')
+        domain = DOTLESS_EMAIL_DOMAINS[domain]
+    return f"{local}@{domain}"
+
+
+def email_base(email):
+    """
+    Local part of an email, lowercased, with trailing digits stripped, so
+    john.doe@x, john.doe7@y and john.doe1990@z share one base. Local parts
+    that are all digits are kept whole.
+    """
+    local = (email or '').strip().lower().split('@', 1)[0]
+    return re.sub(r'\d+$', '', local) or local
@@ -0,0 +1,125 @@
+# fraud_detection/pipeline.py
+"""
+Named, checkpointed stages for fraud detection. Each stage result is
+memoized on the run, so a retry resumes at the stage that failed instead
+of recomputing the ones before it. Stages retry transient errors with
+exponential backoff, and each stage name has a per-process circuit
+breaker that fails fast while those errors keep happening.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying; anything else is a bug and fails the stage at once
+RETRYABLE_ERRORS = (DatabaseError, OSError)
+
+
+class CircuitOpenError(RuntimeError):
+    """A stage was skipped because its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds; then lets one trial call through, closing
+    again if it succeeds.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == 'open':
+                raise CircuitOpenError(f"Circuit for stage '{self.name}' is open")
+            if state == 'half_open':
+                # Let this call through as the trial; others are rejected until it reports back
+                self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Opening circuit for stage '{self.name}' after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """Per-process circuit breaker for a stage name."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(
+                name,
+                failure_threshold=settings.DETECTION_BREAKER_FAILURES,
+                reset_timeout=settings.DETECTION_BREAKER_RESET_SECONDS
+            ))
+    return breaker
+
+
+class StageRun:
+    """
+    One detection attempt. `stage(name, func)` returns the memoized result
+    of a completed stage or runs it: each try runs in its own savepoint so
+    a database error can be retried inside an outer transaction.
+    """
+
+    def __init__(self, retries=None, base_delay=None, max_delay=None, sleep=time.sleep):
+        self.retries = settings.DETECTION_STAGE_RETRIES if retries is None else retries
+        self.base_delay = settings.DETECTION_RETRY_BASE_DELAY_MS / 1000 if base_delay is None else base_delay
+        self.max_delay = settings.DETECTION_RETRY_MAX_DELAY_MS / 1000 if max_delay is None else max_delay
+        self.sleep = sleep
+        self.results = {}
+        self.tries = {}
+
+    def stage(self, name, func):
+        if name in self.results:
+            return self.results[name]
+
+        breaker = get_breaker(name)
+        for attempt in range(self.retries + 1):
+            breaker.before_call()
+            self.tries[name] = attempt + 1
+            try:
+                with transaction.atomic():
+                    result = func()
+            except RETRYABLE_ERRORS as e:
+                breaker.record_failure()
+                if attempt == self.retries:
+                    raise
+                delay = min(self.base_delay * 2 ** attempt, self.max_delay)
+                logger.warning(f"Stage '{name}' failed ({str(e)}); retry {attempt + 1} in {delay:.2f}s")
+                self.sleep(delay)
+            else:
+                breaker.record_success()
+                self.results[name] = result
+                return result
@@ -0,0 +1,246 @@
+# fraud_detection/rings.py
+"""
+Fraud rings: connected components of the graph linking applications that
+share a visitor id, IP address (client or public), normalized email, phone
+or address. Components are a persisted union-find: every identifier value
+(RingKey) and application (RingMember) points directly at its ring, so an
+application's ring and its members are indexed lookups, and linking a new
+application merges the rings of its identifiers by relabelling the smaller
+ones into the largest (union by size). Rings only grow; an identifier
+that is later edited away keeps its link until `manage.py rebuild_fraud_rings`.
+"""
+import ipaddress
+import logging
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+
+from .models import FraudRing, LoanApplication, RingKey, RingMember
+from .normalization import normalize_email, normalize_name, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BATCH_SIZE = 2000
+
+# Fields that feed ring keys; saves touching none of them (or the risk score) skip the update
+RING_FIELDS = {'visitor_id', 'ip_address', 'public_ip', 'email', 'phone', 'address', 'risk_score'}
+
+
+def _placeholder(field, normalize):
+    # Form defaults ("000-000-0000", "Not provided") would link every application that left the field blank
+    return normalize(LoanApplication._meta.get_field(field).default)
+
+
+PLACEHOLDERS = {
+    'email': _placeholder('email', normalize_email),
+    'phone': _placeholder('phone', normalize_phone),
+    'address': _placeholder('address', normalize_name),
+}
+
+
+def _linkable_ip(value):
+    """The address if it is globally routable; private, loopback and reserved addresses link nothing."""
+    if not value:
+        return None
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    return str(address) if address.is_global else None
+
+
+def ring_keys(loan_application):
+    """Set of (key_type, value) identifiers linking the application, limited to FRAUD_RING_KEY_TYPES."""
+    candidates = [
+        ('visitor', str(loan_application.visitor_id_id) if loan_application.visitor_id_id else None),
+        # Client and public addresses share one namespace: the same IP links either way
+        ('ip', _linkable_ip(loan_application.ip_address)),
+        ('ip', _linkable_ip(loan_application.public_ip)),
+        ('email', normalize_email(loan_application.email)),
+        ('phone', normalize_phone(loan_application.phone)),
+        ('address', normalize_name(loan_application.address)),
+    ]
+    enabled = settings.FRAUD_RING_KEY_TYPES
+    return {
+        (key_type, value[:255]) for key_type, value in candidates
+        if value and key_type in enabled and value != PLACEHOLDERS.get(key_type)
+    }
+
+
+def _keys_condition(keys):
+    condition = Q()
+    for key_type, value in keys:
+        condition |= Q(key_type=key_type, value=value)
+    return condition
+
+
+def _merge(ring_ids):
+    """Merge rings into the largest one and return its id."""
+    if len(ring_ids) == 1:
+        return next(iter(ring_ids))
+    rings = list(FraudRing.objects.select_for_update().filter(id__in=ring_ids))
+    if not rings:
+        # Merged away by another worker since they were read
+        return FraudRing.objects.create().id
+    target = max(rings, key=lambda ring: (ring.size, str(ring.id)))
+    others = [ring for ring in rings if ring.id != target.id]
+    if not others:
+        return target.id
+
+    other_ids = [ring.id for ring in others]
+    RingMember.objects.filter(ring__in=other_ids).update(ring=target.id)
+    RingKey.objects.filter(ring__in=other_ids).update(ring=target.id)
+    FraudRing.objects.filter(id=target.id).update(
+        size=F('size') + sum(ring.size for ring in others),
+        risk_total=F('risk_total') + sum(ring.risk_total for ring in others),
+        max_risk=Greatest('max_risk', max(ring.max_risk for ring in others))
+    )
+    FraudRing.objects.filter(id__in=other_ids).delete()
+    return target.id
+
+
+def link_application(loan_application):
+    """
+    Add the application to the ring of its identifiers, merging rings it
+    connects, and bring its risk score into the ring totals. Identifiers
+    already shared by FRAUD_RING_MAX_KEY_APPLICATIONS applications are
+    skipped. Returns the ring id.
+    """
+    keys = ring_keys(loan_application)
+    risk = float(loan_application.risk_score or 0)
+    limit = settings.FRAUD_RING_MAX_KEY_APPLICATIONS
+    member = RingMember.objects.filter(loan_application_id=loan_application.id).first()
+    known = {
+        (key_type, value): (ring_id, application_count)
+        for key_type, value, ring_id, application_count in RingKey.objects.filter(_keys_condition(keys))
+        .values_list('key_type', 'value', 'ring_id', 'application_count')
+    } if keys else {}
+    linking = {key: ring_id for key, (ring_id, application_count) in known.items() if application_count < limit}
+    ring_ids = set(linking.values()) | ({member.ring_id} if member else set())
+    # Most saves change nothing the ring depends on
+    if member and ring_ids == {member.ring_id} and len(known) == len(keys) and member.risk_score == risk:
+        return member.ring_id
+
+    with transaction.atomic():
+        ring_id = _merge(ring_ids) if ring_ids else FraudRing.objects.create().id
+
+        # Count the application under each identifier it newly links through; for an existing
+        # member, identifiers already in its ring may be its own and are not counted again
+        counted = [key for key, key_ring in linking.items() if member is None or key_ring != member.ring_id]
+        if counted:
+            RingKey.objects.filter(_keys_condition(counted)).update(application_count=F('application_count') + 1)
+
+        missing = keys - set(known)
+        if missing:
+            RingKey.objects.bulk_create(
+                [
+                    RingKey(key_type=key_type, value=value, ring_id=ring_id, application_count=1)
+                    for key_type, value in missing
+                ],
+                ignore_conflicts=True
+            )
+            # Keys another worker created in the meantime belong to its ring; join the two
+            raced = set(RingKey.objects.filter(_keys_condition(missing)).exclude(ring=ring_id)
+                        .values_list('ring_id', flat=True))
+            if raced:
+                ring_id = _merge(raced | {ring_id})
+
+        if member is None:
+            RingMember.objects.create(loan_application_id=loan_application.id, ring_id=ring_id, risk_score=risk)
+            size_delta, risk_delta = 1, risk
+        else:
+            RingMember.objects.filter(pk=member.pk).update(risk_score=risk)
+            size_delta, risk_delta = 0, risk - member.risk_score
+        if size_delta or risk_delta:
+            FraudRing.objects.filter(id=ring_id).update(
+                size=F('size') + size_delta,
+                risk_total=F('risk_total') + risk_delta,
+                max_risk=Greatest('max_risk', risk)
+            )
+    return ring_id
+
+
+def ring_of(loan_application_id, member_limit=None):
+    """(FraudRing, members ordered by risk) for an application, or (None, []) if it is in no ring."""
+    member = RingMember.objects.select_related('ring').filter(loan_application_id=loan_application_id).first()
+    if member is None:
+        return None, []
+    members = RingMember.objects.filter(ring=member.ring_id).select_related('loan_application').order_by(
+        '-risk_score', 'loan_application_id'
+    )
+    if member_limit:
+        members = members[:member_limit]
+    return member.ring, list(members)
+
+
+def rebuild_fraud_rings(batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recompute every ring from scratch with an in-memory union-find (path
+    halving, union by size) over applications and identifier values,
+    replaying applications in submission order so identifier limits apply
+    as they do incrementally, then replace the ring tables. Returns the
+    number of applications linked.
+    """
+    limit = settings.FRAUD_RING_MAX_KEY_APPLICATIONS
+    parent = {}
+    size = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        size.setdefault(node, 1)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(a, b):
+        a, b = find(a), find(b)
+        if a == b:
+            return
+        if size[a] < size[b]:
+            a, b = b, a
+        parent[b] = a
+        size[a] += size[b]
+
+    risks = {}
+    key_counts = {}
+    applications = LoanApplication.objects.only(
+        'id', 'visitor_id', 'ip_address', 'public_ip', 'email', 'phone', 'address', 'risk_score',
+        'application_date'
+    ).order_by('application_date', 'pk')
+    for app in applications.iterator(chunk_size=batch_size):
+        node = ('application', app.id)
+        find(node)
+        risks[app.id] = float(app.risk_score or 0)
+        for key in ring_keys(app):
+            if key_counts.get(key, 0) < limit:
+                key_counts[key] = key_counts.get(key, 0) + 1
+                union(node, key)
+
+    ring_ids = {}
+    rings = {}
+    members = []
+    keys = []
+    for node in list(parent):
+        root = find(node)
+        ring_id = ring_ids.setdefault(root, uuid.uuid4())
+        if node[0] == 'application':
+            risk = risks[node[1]]
+            ring = rings.setdefault(ring_id, FraudRing(id=ring_id))
+            ring.size += 1
+            ring.risk_total += risk
+            ring.max_risk = max(ring.max_risk, risk)
+            members.append(RingMember(loan_application_id=node[1], ring_id=ring_id, risk_score=risk))
+        else:
+            keys.append(RingKey(key_type=node[0], value=node[1], ring_id=ring_id, application_count=key_counts[node]))
+
+    with transaction.atomic():
+        FraudRing.objects.all().delete()
+        FraudRing.objects.bulk_create(rings.values(), batch_size=batch_size)
+        RingKey.objects.bulk_create(keys, batch_size=batch_size)
+        RingMember.objects.bulk_create(members, batch_size=batch_size)
+    logger.info(f"Rebuilt {len(rings)} fraud rings from {len(members)} applications")
+    return len(members)
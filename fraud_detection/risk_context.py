@@ -0,0 +1,244 @@
+# fraud_detection/risk_context.py
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .identity import identity_keys, matching_keys
+from .ip_index import application_subnet, routable_subnet, subnet_text_prefix
+from .models import IdentityKey, LoanApplication, RingMember
+from .velocity import velocity_counts, window_start
+
+HISTORY_WINDOW = timedelta(days=7)
+
+
+def ip_window():
+    return timedelta(hours=settings.VELOCITY_IP_WINDOW_HOURS)
+
+
+class RiskContext:
+    """
+    Every counter the rule-based checks need for one application: one
+    conditional-aggregation query for the visitor, identity-key and ring
+    counts, and windowed counts from the velocity counters.
+    Build it once per scoring pass and pass it to each component.
+    """
+
+    def __init__(self, visitor_applications=0, visitor_recent=0, ip_applications=0, subnet_applications=0,
+                 shared_identity_other_visitors=0, shared_identity_same_visitor=0,
+                 ring_linked=0, ring_mean_risk=0.0):
+        # Other applications from the same visitor: all time and last 7 days
+        self.visitor_applications = visitor_applications
+        self.visitor_recent = visitor_recent
+        # Applications from the same IP address in the IP window, this one included
+        self.ip_applications = ip_applications
+        # Applications from the same /24 (IPv4) or /48 (IPv6) subnet in the IP window, this one included
+        self.subnet_applications = subnet_applications
+        # Other applications sharing a normalized name, phone or email
+        self.shared_identity_other_visitors = shared_identity_other_visitors
+        self.shared_identity_same_visitor = shared_identity_same_visitor
+        # Other applications in the application's fraud ring and their mean risk score
+        self.ring_linked = ring_linked
+        self.ring_mean_risk = ring_mean_risk
+
+    @property
+    def different_identities(self):
+        """Other applications from the same visitor that share no identity detail."""
+        return self.visitor_applications - self.shared_identity_same_visitor
+
+    @staticmethod
+    def ring_counts(ring_size, ring_risk_total, member_risk):
+        """
+        ring_linked and ring_mean_risk for an application in a ring of
+        ring_size (None when in no ring), leaving the application out.
+        """
+        if not ring_size or ring_size <= 1:
+            return {'ring_linked': 0, 'ring_mean_risk': 0.0}
+        linked = ring_size - 1
+        return {
+            'ring_linked': linked,
+            'ring_mean_risk': max(ring_risk_total - member_risk, 0.0) / linked,
+        }
+
+    @classmethod
+    def load(cls, loan_application, now=None):
+        now = now or timezone.now()
+        this = Q(id=loan_application.id)
+        # A missing visitor matches other visitor-less applications, as the checks always did
+        same_visitor = Q(visitor_id=loan_application.visitor_id_id)
+
+        # One pass over the application itself, its visitor's applications and those sharing
+        # an identity key; the ring totals come in through the application's own row
+        condition = this | same_visitor
+        aggregates = {
+            'visitor_applications': Count('id', filter=same_visitor & ~this),
+            'ring_size': Max('ring_membership__ring__size', filter=this),
+            'ring_risk_total': Max('ring_membership__ring__risk_total', filter=this),
+            'member_risk': Max('ring_membership__risk_score', filter=this),
+        }
+        if identity_keys(loan_application):
+            shared = Q(id__in=matching_keys(loan_application).values('loan_application_id'))
+            condition |= shared
+            aggregates['shared_identity_other_visitors'] = Count('id', filter=shared & ~same_visitor & ~this)
+            aggregates['shared_identity_same_visitor'] = Count('id', filter=shared & same_visitor & ~this)
+        counts = LoanApplication.objects.filter(condition).aggregate(**aggregates)
+
+        velocity = velocity_counts(loan_application, {
+            'visitor_recent': ('visitor', HISTORY_WINDOW),
+            'ip_applications': ('ip', ip_window()),
+            'subnet_applications': ('subnet', ip_window()),
+        }, now=now)
+        if loan_application.ip_address:
+            velocity['ip_applications'] += 1
+        if application_subnet(loan_application):
+            velocity['subnet_applications'] += 1
+
+        return cls(
+            visitor_applications=counts['visitor_applications'],
+            shared_identity_other_visitors=counts.get('shared_identity_other_visitors') or 0,
+            shared_identity_same_visitor=counts.get('shared_identity_same_visitor') or 0,
+            **velocity,
+            **cls.ring_counts(counts['ring_size'], counts['ring_risk_total'], counts['member_risk'])
+        )
+
+    @classmethod
+    def load_many(cls, loan_applications, now=None):
+        """
+        {application id: RiskContext} for a batch of applications with a
+        fixed number of set-based queries. Windowed counts come from the
+        applications table over the same bucket-rounded windows as the
+        velocity counters. With `now` every window ends there, matching
+        load() while the counters are in sync; without it each application's
+        windows end at its own submission and count only applications
+        submitted up to then, as the counters stood when it was first scored.
+        All-time visitor, identity and ring counts are as of now either way.
+        """
+        loan_applications = list(loan_applications)
+        if not loan_applications:
+            return {}
+        ends = {app.id: now or app.application_date or timezone.now() for app in loan_applications}
+        history_starts = {app_id: window_start(HISTORY_WINDOW, end) for app_id, end in ends.items()}
+        ip_starts = {app_id: window_start(ip_window(), end) for app_id, end in ends.items()}
+        last_end = max(ends.values())
+        visitors = {app.visitor_id_id for app in loan_applications if app.visitor_id_id}
+        ip_addresses = {app.ip_address for app in loan_applications if app.ip_address}
+
+        visitor_totals = dict(
+            LoanApplication.objects.filter(visitor_id__in=visitors).values('visitor_id').annotate(total=Count('id'))
+            .values_list('visitor_id', 'total')
+        )
+        # Submission times per visitor and address, spanning every window of the batch;
+        # each application's counts are then ranges of these sorted lists
+        visitor_dates = _dates_by_key(
+            LoanApplication.objects.filter(
+                visitor_id__in=visitors, application_date__gte=min(history_starts.values()),
+                application_date__lte=last_end
+            ).values_list('visitor_id', 'application_date')
+        )
+        ip_dates = _dates_by_key(
+            LoanApplication.objects.filter(
+                ip_address__in=ip_addresses, application_date__gte=min(ip_starts.values()),
+                application_date__lte=last_end
+            ).values_list('ip_address', 'application_date')
+        )
+        # Subnets are not stored on the table: addresses sharing the subnets' text
+        # prefixes within their applications' windows are fetched and grouped here
+        subnets = {app.id: application_subnet(app) for app in loan_applications}
+        subnet_ranges = {}
+        for app in loan_applications:
+            if subnets[app.id]:
+                prefix = subnet_text_prefix(subnets[app.id])
+                start, end = subnet_ranges.get(prefix, (ip_starts[app.id], ends[app.id]))
+                subnet_ranges[prefix] = (min(start, ip_starts[app.id]), max(end, ends[app.id]))
+        subnet_dates = {}
+        if subnet_ranges:
+            condition = Q()
+            for prefix, (start, end) in subnet_ranges.items():
+                condition |= (Q(ip_address__startswith=prefix) | Q(public_ip__startswith=prefix)) & Q(
+                    application_date__gte=start, application_date__lte=end
+                )
+            subnet_dates = _dates_by_key(
+                (routable_subnet(ip_address, public_ip), application_date)
+                for ip_address, public_ip, application_date in LoanApplication.objects.filter(condition)
+                .values_list('ip_address', 'public_ip', 'application_date')
+            )
+
+        # Identity keys of the batch, then every application sharing one of them
+        keys_by_application = defaultdict(set)
+        for application_id, key_type, value in IdentityKey.objects.filter(
+                loan_application__in=[app.id for app in loan_applications]
+        ).values_list('loan_application_id', 'key_type', 'value'):
+            keys_by_application[application_id].add((key_type, value))
+        values_by_type = defaultdict(set)
+        for keys in keys_by_application.values():
+            for key_type, value in keys:
+                values_by_type[key_type].add(value)
+        sharing = defaultdict(set)
+        if values_by_type:
+            condition = Q()
+            for key_type, values in values_by_type.items():
+                condition |= Q(key_type=key_type, value__in=values)
+            for key_type, value, application_id, visitor in IdentityKey.objects.filter(condition).values_list(
+                    'key_type', 'value', 'loan_application_id', 'visitor_id'):
+                sharing[(key_type, value)].add((application_id, visitor))
+
+        members = {
+            application_id: (ring_size, ring_risk_total, member_risk)
+            for application_id, ring_size, ring_risk_total, member_risk in RingMember.objects.filter(
+                loan_application__in=[app.id for app in loan_applications]
+            ).values_list('loan_application_id', 'ring__size', 'ring__risk_total', 'risk_score')
+        }
+
+        contexts = {}
+        for app in loan_applications:
+            visitor = app.visitor_id_id
+            end = ends[app.id]
+            history_start, ip_start = history_starts[app.id], ip_starts[app.id]
+            in_history = _within(app.application_date, history_start, end)
+            in_ip_window = _within(app.application_date, ip_start, end)
+            subnet = subnets[app.id]
+
+            shared = set()
+            for key in keys_by_application.get(app.id, ()):
+                shared |= sharing[key]
+            shared.discard((app.id, visitor))
+            same_visitor = sum(1 for _, other_visitor in shared if other_visitor == visitor)
+
+            contexts[app.id] = cls(
+                # Components never read visitor counts for applications without a visitor
+                visitor_applications=max(visitor_totals.get(visitor, 0) - 1, 0) if visitor else 0,
+                visitor_recent=max(
+                    _count_between(visitor_dates.get(visitor, []), history_start, end) - in_history, 0
+                ) if visitor else 0,
+                # The application itself is always included, as in load()
+                ip_applications=_count_between(ip_dates.get(app.ip_address, []), ip_start, end) - in_ip_window + 1
+                if app.ip_address else 0,
+                subnet_applications=_count_between(subnet_dates.get(subnet, []), ip_start, end) - in_ip_window + 1
+                if subnet else 0,
+                shared_identity_other_visitors=len(shared) - same_visitor,
+                shared_identity_same_visitor=same_visitor,
+                **cls.ring_counts(*members.get(app.id, (None, None, None)))
+            )
+        return contexts
+
+
+def _dates_by_key(rows):
+    """{key: sorted datetimes} from (key, datetime) pairs."""
+    dates = defaultdict(list)
+    for key, value in rows:
+        dates[key].append(value)
+    for values in dates.values():
+        values.sort()
+    return dates
+
+
+def _count_between(dates, start, end):
+    """Number of sorted datetimes in [start, end]."""
+    return bisect_right(dates, end) - bisect_left(dates, start)
+
+
+def _within(value, start, end):
+    return value is not None and start <= value <= end
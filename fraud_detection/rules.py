@@ -0,0 +1,242 @@
+# fraud_detection/rules.py
+"""
+Declarative rule engine for the rule-based risk checks. Device risk
+scores, decision thresholds and fake-data patterns live in a versioned
+JSON ruleset (settings.RISK_RULESET_PATH) that is compiled into a flat
+RulePlan on load and reloaded whenever the file changes.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# The ruleset file is checked for changes at most this often
+RELOAD_CHECK_SECONDS = 1.0
+
+# Per-process plan, keyed by the ruleset path and mtime
+_plan_cache = {'key': None, 'plan': None, 'checked': 0.0}
+_cache_lock = threading.Lock()
+
+
+class RulesetError(ValueError):
+    """The ruleset file is malformed; the previously loaded plan stays active."""
+
+
+def _detected(value, threshold=None):
+    # Smart signals arrive as booleans or as "detected"/"not_detected" strings
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() == 'detected'
+
+
+DEVICE_OPS = {
+    'detected': _detected,
+    'lt': lambda value, threshold: value is not None and value < threshold,
+    'lte': lambda value, threshold: value is not None and value <= threshold,
+    'gt': lambda value, threshold: value is not None and value > threshold,
+    'gte': lambda value, threshold: value is not None and value >= threshold,
+}
+
+
+def _resolve_value(value):
+    """Rule values may read an environment variable: {"env": "NAME", "default": 0.9}."""
+    if isinstance(value, dict):
+        return float(os.getenv(value['env'], value['default']))
+    return value
+
+
+class RulePlan:
+    """
+    A compiled ruleset. Device rules are flattened into a tuple of
+    (rule index, field, predicate, value, score, group) steps, decision
+    thresholds into parallel sorted lists and the fake-data patterns into
+    one alternation per target field, so evaluating an application is a
+    single pass with no per-call allocation beyond the result.
+
+    Hit counters are kept per process, per rule id, from load time.
+    """
+
+    def __init__(self, ruleset):
+        try:
+            self.version = str(ruleset['version'])
+            self._compile_device(ruleset['device']['rules'])
+            self._compile_decision(ruleset['decision'])
+            self._compile_fake_data(ruleset['fake_data'])
+        except (KeyError, TypeError, ValueError, re.error) as e:
+            raise RulesetError(f"Invalid ruleset: {e}") from e
+        self.loaded_at = timezone.now()
+        self.hits = dict.fromkeys([rule['id'] for rule in self.device_rules] + list(self.pattern_ids), 0)
+        self.hits.update({f"decision:{decision}": 0 for decision in self.decisions})
+
+    def _compile_device(self, rules):
+        self.device_rules = rules
+        groups = {}
+        steps = []
+        for index, rule in enumerate(rules):
+            if rule['op'] not in DEVICE_OPS:
+                raise ValueError(f"unknown op {rule['op']!r} in rule {rule['id']}")
+            # Within a group only the first matching rule scores
+            group = groups.setdefault(rule['group'], len(groups)) if rule.get('group') else None
+            steps.append((index, rule['field'], DEVICE_OPS[rule['op']], _resolve_value(rule.get('value')),
+                          float(rule['score']), group))
+        self.device_steps = tuple(steps)
+        self.group_count = len(groups)
+
+    def _compile_decision(self, decision):
+        thresholds = sorted(decision['thresholds'], key=lambda t: t['max_score'])
+        self.decision_bounds = [float(t['max_score']) for t in thresholds]
+        self.decisions = [t['decision'] for t in thresholds] + [decision['otherwise']]
+
+    def _compile_fake_data(self, fake_data):
+        patterns = fake_data['patterns']
+        self.pattern_ids = [pattern['id'] for pattern in patterns]
+        for pattern in patterns:
+            re.compile(pattern['regex'])  # Report the offending rule rather than the combined pattern
+        alternation = '|'.join(f"(?P<p{i}>{pattern['regex']})" for i, pattern in enumerate(patterns))
+        self.fake_data_targets = tuple(
+            (target['field'], target.get('lowercase', False),
+             re.compile(alternation, re.IGNORECASE if target.get('ignore_case') else 0))
+            for target in fake_data['targets']
+        )
+
+    def device_score(self, values):
+        """
+        Sum of matching device rule scores for one application (anything
+        with the rule fields as attributes), and the indexes of the rules
+        that matched.
+        """
+        total = 0.0
+        matched = []
+        groups_done = [False] * self.group_count
+        for index, field, predicate, value, score, group in self.device_steps:
+            if group is not None and groups_done[group]:
+                continue
+            if predicate(getattr(values, field), value):
+                total += score
+                matched.append(index)
+                if group is not None:
+                    groups_done[group] = True
+        for index in matched:
+            self.hits[self.device_rules[index]['id']] += 1
+        return total, matched
+
+    def decide(self, risk_score):
+        for bound, decision in zip(self.decision_bounds, self.decisions):
+            if risk_score <= bound:
+                break
+        else:
+            decision = self.decisions[-1]
+        self.hits[f"decision:{decision}"] += 1
+        return decision
+
+    def fake_data_match(self, values):
+        """Id of the first fake-data pattern matching any target field, or None."""
+        for field, lowercase, regex in self.fake_data_targets:
+            text = getattr(values, field) or ''
+            match = regex.match(text.lower() if lowercase else text)
+            if match:
+                rule_id = self.pattern_ids[int(match.lastgroup[1:])]
+                self.hits[rule_id] += 1
+                return rule_id
+        return None
+
+    def device_scores_batch(self, columns):
+        """
+        Device scores for many applications at once. `columns` maps each
+        rule field to a sequence (a dict of lists, NumPy arrays or a pandas
+        DataFrame); returns a float array. Hits are counted per rule.
+        """
+        import numpy as np
+
+        size = len(next(iter(columns.values()))) if len(columns) else 0
+        total = np.zeros(size)
+        groups_open = np.ones((self.group_count, size), dtype=bool)
+        for index, field, predicate, value, score, group in self.device_steps:
+            column = np.asarray(columns[field])
+            if predicate is _detected:
+                if column.dtype == bool:
+                    mask = column
+                else:
+                    # Mixed bools and strings would otherwise be coerced to strings
+                    mask = np.array([_detected(item) for item in np.asarray(columns[field], dtype=object)], dtype=bool)
+            else:
+                numeric = np.asarray(column, dtype=float)
+                with np.errstate(invalid='ignore'):
+                    mask = predicate(numeric, value) & ~np.isnan(numeric)
+            if group is not None:
+                mask = mask & groups_open[group]
+                groups_open[group] &= ~mask
+            total += np.where(mask, score, 0.0)
+            self.hits[self.device_rules[index]['id']] += int(mask.sum())
+        return total
+
+    def decide_batch(self, risk_scores):
+        """Decision for each score in an array."""
+        import numpy as np
+
+        indexes = np.searchsorted(self.decision_bounds, np.asarray(risk_scores, dtype=float), side='left')
+        decisions = np.array(self.decisions, dtype=object)[indexes]
+        for index, count in zip(*np.unique(indexes, return_counts=True)):
+            self.hits[f"decision:{self.decisions[index]}"] += int(count)
+        return decisions
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at.isoformat(),
+            'hits': dict(self.hits),
+        }
+
+
+def load_ruleset(path):
+    with open(path) as f:
+        return RulePlan(json.load(f))
+
+
+def get_rule_plan(path=None):
+    """
+    The compiled plan for the configured ruleset, recompiled when the
+    file's mtime changes (checked at most every RELOAD_CHECK_SECONDS). A ruleset that cannot be read or
+    fails to load is logged and the previous plan kept; with no previous plan the error is raised.
+    """
+    path = str(path or settings.RISK_RULESET_PATH)
+    now = time.monotonic()
+    if (_plan_cache['key'] and _plan_cache['key'][0] == path
+            and now - _plan_cache['checked'] < RELOAD_CHECK_SECONDS):
+        return _plan_cache['plan']
+
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except OSError as e:
+        if _plan_cache['plan'] is None:
+            raise
+        logger.error(f"Failed to check ruleset {path}, keeping version {_plan_cache['plan'].version}: {str(e)}")
+        _plan_cache['checked'] = now
+        return _plan_cache['plan']
+    _plan_cache['checked'] = now
+    if _plan_cache['key'] == key:
+        return _plan_cache['plan']
+
+    with _cache_lock:
+        if _plan_cache['key'] == key:
+            return _plan_cache['plan']
+        try:
+            plan = load_ruleset(path)
+        except (OSError, ValueError) as e:
+            if _plan_cache['plan'] is None:
+                raise
+            logger.error(f"Failed to reload ruleset {path}, keeping version {_plan_cache['plan'].version}: {str(e)}")
+            _plan_cache['key'] = key
+            return _plan_cache['plan']
+
+        logger.info(f"Loaded ruleset version {plan.version} from {path}")
+        _plan_cache['key'] = key
+        _plan_cache['plan'] = plan
+        return plan
@@ -5,12 +5,13 @@ from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
 from .models import LoanApplication, VisitorID, FraudAlert
-from tenacity import retry, stop_after_attempt, wait_fixed
 import logging
-import re
-from datetime import timedelta
 from django.db import transaction
-from .ml_services import MLFraudEnhancer
+from .ip_index import blocklisted_range
+from .job_queue import enqueue_scoring
+from .pipeline import StageRun
+from .risk_context import RiskContext
+from .rules import get_rule_plan
 import json
 
 logger = logging.getLogger(__name__)
@@ -22,21 +23,29 @@ class RiskScoringService:
         self.IP_WEIGHT = float(os.getenv("IP_WEIGHT", 0.2))
         self.HISTORY_WEIGHT = float(os.getenv("HISTORY_WEIGHT", 0.3))
         
-        # Smart Signals thresholds
-        self.CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", 0.9))
+        # Smart Signals thresholds (the confidence threshold is read by the ruleset)
         self.VPN_DETECTION_THRESHOLD = float(os.getenv("VPN_DETECTION_THRESHOLD", 0.8))
         self.TAMPERING_THRESHOLD = float(os.getenv("TAMPERING_THRESHOLD", 0.7))
 
-    def calculate_risk_score(self, loan_application):
-        """Calculate comprehensive risk score based on multiple factors."""
-        scores = {
-            'identity': self._calculate_identity_risk(loan_application),
+    def calculate_risk_score(self, loan_application, context=None):
+        """
+        Calculate comprehensive risk score based on multiple factors.
+        Pass a RiskContext to reuse counters already loaded for this application.
+        """
+        context = context or RiskContext.load(loan_application)
+        return self.combine_scores(self.component_scores(loan_application, context))
+
+    def component_scores(self, loan_application, context):
+        """Unweighted identity, device, IP and history risk scores."""
+        return {
+            'identity': self._calculate_identity_risk(loan_application, context),
             'device': self._calculate_device_risk(loan_application),
-            'ip': self._calculate_ip_risk(loan_application),
-            'history': self._calculate_history_risk(loan_application)
+            'ip': self._calculate_ip_risk(loan_application, context),
+            'history': self._calculate_history_risk(loan_application, context)
         }
-        
-        # Weighted sum of risk scores
+
+    def combine_scores(self, scores):
+        """Weighted sum of component scores, clamped to 0-100."""
         weighted_score = (
             scores['identity'] * self.IDENTITY_WEIGHT +
             scores['device'] * self.DEVICE_WEIGHT +
@@ -46,201 +55,121 @@ class RiskScoringService:
         
         return min(max(weighted_score, 0), 100)
 
-    def _calculate_identity_risk(self, loan_application):
+    def _calculate_identity_risk(self, loan_application, context):
         """Analyze identity-related risks."""
-        if not loan_application.visitor_id:
+        if not loan_application.visitor_id_id:
             return 50  # Default medium risk if no visitor ID
             
         # Count applications with same personal details but different visitor IDs
-        similar_applications = LoanApplication.objects.filter(
-            Q(full_name=loan_application.full_name) |
-            Q(phone=loan_application.phone) |
-            Q(email=loan_application.email)
-        ).exclude(visitor_id=loan_application.visitor_id).count()
+        similar_applications = context.shared_identity_other_visitors
         
         # Count applications with same visitor ID but different identities
-        different_identities = LoanApplication.objects.filter(
-            visitor_id=loan_application.visitor_id
-        ).exclude(
-            Q(full_name=loan_application.full_name) |
-            Q(phone=loan_application.phone) |
-            Q(email=loan_application.email)
-        ).count()
+        different_identities = context.different_identities
         
         # Calculate risk based on findings
         if similar_applications > 0 or different_identities > 0:
             base_risk = 60
             multiplier = min(similar_applications + different_identities, 5)
-            return min(base_risk + (multiplier * 10), 100)
+            return max(min(base_risk + (multiplier * 10), 100), self._calculate_ring_risk(context))
             
-        return 0
+        return self._calculate_ring_risk(context)
+
+    def _calculate_ring_risk(self, context):
+        """Risk from the application's fraud ring: applications linked through any chain of shared identifiers."""
+        if context.ring_linked < settings.FRAUD_RING_MIN_LINKED:
+            return 0
+        # Larger rings and riskier members push the risk up
+        return min(40 + min(context.ring_linked, 10) * 3 + context.ring_mean_risk * 0.3, 100)
 
     def _calculate_device_risk(self, loan_application):
-        """Evaluate device and browser-related risks using smart signals."""
-        if not loan_application.visitor_id:
+        """Evaluate device and browser-related risks using the device rules of the active ruleset."""
+        if not loan_application.visitor_id_id:
             return 50  # Default medium risk if no visitor ID
             
-        def normalize_bot_value(value):
-            """Convert bot detection value to standardized boolean"""
-            if isinstance(value, bool):
-                return value
-            return str(value).lower() == 'detected'
-            
-        def evaluate_confidence_score(score):
-            """Calculate risk factor based on confidence score"""
-            if score < self.CONFIDENCE_THRESHOLD:
-                return 30
-            elif score < 0.95:
-                return 15
-            return 0
-            
-        def assess_device_behavior():
-            """Evaluate risk based on device and browser characteristics"""
-            risk_factors = []
-            
-            # Bot detection
-            if normalize_bot_value(loan_application.bot_detected):
-                risk_factors.append({
-                    'factor': 'Bot Detection',
-                    'score': 45,
-                    'description': 'Automated traffic detected'
-                })
-                
-            # VPN detection
-            if loan_application.vpn_detected:
-                risk_factors.append({
-                    'factor': 'VPN Usage',
-                    'score': 30,
-                    'description': 'VPN connection detected'
-                })
-                
-            # Proxy detection
-            if loan_application.proxy_detected:
-                risk_factors.append({
-                    'factor': 'Proxy Detection',
-                    'score': 25,
-                    'description': 'Proxy server detected'
-                })
-                
-            # Tampering detection
-            if loan_application.tampering_detected:
-                risk_factors.append({
-                    'factor': 'Tampering Detected',
-                    'score': 40,
-                    'description': 'Browser tampering detected'
-                })
-                
-            # Confidence score evaluation
-            confidence_risk = evaluate_confidence_score(loan_application.confidence_score)
-            if confidence_risk > 0:
-                risk_factors.append({
-                    'factor': 'Low Confidence Score',
-                    'score': confidence_risk,
-                    'description': f'Confidence score: {loan_application.confidence_score}'
-                })
-                
-            # Incognito mode detection
-            if loan_application.incognito:
-                risk_factors.append({
-                    'factor': 'Incognito Mode',
-                    'score': 20,
-                    'description': 'Private browsing mode detected'
-                })
-                
-            return risk_factors
-            
-        # Calculate total risk score
-        risk_factors = assess_device_behavior()
-        total_risk = sum(factor['score'] for factor in risk_factors)
+        plan = get_rule_plan()
+        total_risk, matched = plan.device_score(loan_application)
         
         # Apply device weight
         weighted_risk = min(max(total_risk * self.DEVICE_WEIGHT, 0), 100)
         
         # Log detailed risk assessment
-        logger.debug(f"Device Risk Assessment:")
-        for factor in risk_factors:
-            logger.debug(f"- {factor['factor']}: {factor['score']} ({factor['description']})")
-        logger.debug(f"Total Device Risk Score: {weighted_risk}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Device Risk Assessment (ruleset {plan.version}):")
+            for index in matched:
+                rule = plan.device_rules[index]
+                logger.debug(f"- {rule['id']}: {rule['score']} ({rule.get('description', '')})")
+            logger.debug(f"Total Device Risk Score: {weighted_risk}")
         
         return weighted_risk
 
-    def _calculate_ip_risk(self, loan_application):
-        """Assess IP address related risks."""
-        if not loan_application.ip_address:
+    def _calculate_ip_risk(self, loan_application, context):
+        """Assess IP address related risks: address and subnet velocity, and blocklisted ranges."""
+        if not loan_application.ip_address and not loan_application.public_ip:
             return 50  # Default medium risk if no IP
             
+        # Blocklisted by Smart Signals or inside a locally blocklisted range
+        if loan_application.ip_blocklisted or blocklisted_range(loan_application):
+            return 90
+            
         # Check for VPN usage and IP anomalies
-        ip_related_apps = LoanApplication.objects.filter(ip_address=loan_application.ip_address)
-        if ip_related_apps.count() > 5:  # Threshold for suspicious activity
+        if context.ip_applications > settings.IP_VELOCITY_THRESHOLD:
             return 80
+        # Rotating through addresses of one /24 or /48
+        if context.subnet_applications > settings.SUBNET_VELOCITY_THRESHOLD:
+            return 60
         return 0
 
-    def _calculate_history_risk(self, loan_application):
+    def _calculate_history_risk(self, loan_application, context):
         """Analyze application history risks."""
-        if not loan_application.visitor_id:
+        if not loan_application.visitor_id_id:
             return 50  # Default medium risk if no visitor ID
             
-        recent_applications = LoanApplication.objects.filter(
-            visitor_id=loan_application.visitor_id,
-            application_date__gte=timezone.now() - timezone.timedelta(days=7)
-        ).exclude(id=loan_application.id)
-        
-        if recent_applications.count() >= 3:
+        if context.visitor_recent >= 3:
             return 70
         return 0
 
     def get_decision(self, risk_score):
-        """Determine action based on risk score."""
-        if risk_score <= 40:
-            return 'APPROVE'
-        elif risk_score <= 70:
-            return 'REVIEW'
-        else:
-            return 'REJECT'
+        """Determine action based on risk score and the ruleset's decision thresholds."""
+        return get_rule_plan().decide(risk_score)
             
 class FraudDetectionService:
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-    def detect_fraud(self, loan_application):
-        """Detect fraud using multiple signals and risk scoring."""
+    def detect_fraud(self, loan_application, run=None):
+        """
+        Detect fraud using multiple signals and risk scoring. Each step is a
+        named stage of a StageRun: transient failures retry only the failing
+        stage, and a run passed back in resumes after its completed stages.
+        """
+        run = run or StageRun()
         try:
-            risk_scoring_service = RiskScoringService()
-            risk_score = risk_scoring_service.calculate_risk_score(loan_application)
-            decision = risk_scoring_service.get_decision(risk_score)
+            # Every counter the checks below need, loaded once
+            context = run.stage('context', lambda: RiskContext.load(loan_application))
+            
+            risk_score = run.stage(
+                'risk_score', lambda: RiskScoringService().calculate_risk_score(loan_application, context)
+            )
             
             fraud_alerts = []
             
             # Test 1: Multiple applications from same device
-            with transaction.atomic():
-                recent_applications = LoanApplication.objects.filter(
-                    visitor_id=loan_application.visitor_id,
-                    application_date__gte=timezone.now() - timedelta(days=7)
-                ).exclude(id=loan_application.id)
-                
-                if recent_applications.count() >= 1:
-                    fraud_alerts.append(f"Multiple applications ({recent_applications.count()}) "
-                                      f"from same Visitor ID in last 7 days")
+            if context.visitor_recent >= 1:
+                fraud_alerts.append(f"Multiple applications ({context.visitor_recent}) "
+                                  f"from same Visitor ID in last 7 days")
             
             # Test 2: Same personal details with different devices
-            with transaction.atomic():
-                similar_applications = LoanApplication.objects.filter(
-                    Q(full_name=loan_application.full_name) |
-                    Q(phone=loan_application.phone) |
-                    Q(email=loan_application.email)
-                ).exclude(visitor_id=loan_application.visitor_id)
-                
-                if similar_applications.exists():
-                    fraud_alerts.append("Same personal details detected across different devices")
+            if context.shared_identity_other_visitors > 0:
+                fraud_alerts.append("Same personal details detected across different devices")
             
             # Test 3: Fake data detection
-            if self._detect_fake_data(loan_application):
+            if run.stage('fake_data', lambda: self._detect_fake_data(loan_application)):
                 fraud_alerts.append("Suspicious patterns detected in personal details")
             
             # Test 4: Similar applications with varying details
-            with transaction.atomic():
-                similar_pattern_apps = self._find_similar_patterns(loan_application)
-                if similar_pattern_apps.exists():
-                    fraud_alerts.append(f"Found {similar_pattern_apps.count()} similar applications "
-                                      f"with slightly different details")
+            similar_pattern_count = run.stage(
+                'similar_patterns', lambda: self._find_similar_patterns(loan_application).count()
+            )
+            if similar_pattern_count:
+                fraud_alerts.append(f"Found {similar_pattern_count} similar applications "
+                                  f"with slightly different details")
             
             # Test 5: High risk score
             if risk_score > 70:
@@ -248,20 +177,7 @@ class FraudDetectionService:
             
             # If any fraud alerts are triggered, set the loan application status to 'PENDING'
             if fraud_alerts:
-                with transaction.atomic():
-                    # Create fraud alert with 'PENDING' status
-                    FraudAlert.objects.create(
-                        loan_application=loan_application,
-                        visitor_id=loan_application.visitor_id,
-                        reason=" | ".join(fraud_alerts),
-                        status='PENDING',  # Set status to 'PENDING' for flagged loans
-                        risk_score=float(risk_score),
-                        metadata=loan_application.metadata
-                    )
-                    # Update loan application status to 'PENDING'
-                    loan_application.status = 'PENDING'
-                    loan_application.save()
-
+                run.stage('record_alert', lambda: self._record_rule_alert(loan_application, fraud_alerts, risk_score))
                 return True, risk_score
             else:
                 return False, risk_score
@@ -270,45 +186,51 @@ class FraudDetectionService:
             logger.error(f"Error processing fraud detection: {str(e)}")
             raise
 
+    def _record_rule_alert(self, loan_application, fraud_alerts, risk_score):
+        """Record the rule-based alert (one per application) and hold the application as PENDING."""
+        FraudAlert.record(
+            f"rules:{loan_application.id}",
+            loan_application=loan_application,
+            visitor_id=loan_application.visitor_id,
+            reason=" | ".join(fraud_alerts),
+            status='PENDING',  # Set status to 'PENDING' for flagged loans
+            risk_score=float(risk_score),
+            metadata=loan_application.metadata
+        )
+        # Update loan application status to 'PENDING'
+        loan_application.status = 'PENDING'
+        loan_application.save()
+
     def _detect_fake_data(self, loan_application):
-        """Detect suspicious patterns in personal details."""
-        fake_patterns = [
-            r'^test.*@.*\.(?:com|org)$',  # Test email patterns
-            r'^(?:123|999)[0-9]{2}(?:-?)\d{3}(?:-?)\d{4}$',  # Suspicious phone numbers
-            r'(?:test|fake|sample|demo)[\w\s]*$',  # Common test names
-            r'^\d{4}-\d{2}-\d{2}$'  # Date-like strings as names
-        ]
-        for pattern in fake_patterns:
-            try:
-                if (re.match(pattern, loan_application.email.lower(), re.IGNORECASE) or
-                    re.match(pattern, loan_application.phone) or
-                    re.match(pattern, loan_application.full_name.lower())):
-                    return True
-            except re.error as e:
-                logger.error(f"Invalid regex pattern: {pattern}. Error: {str(e)}")
-                continue
-        return False
+        """Detect suspicious patterns in personal details using the ruleset's fake-data patterns."""
+        return get_rule_plan().fake_data_match(loan_application) is not None
 
     def _find_similar_patterns(self, loan_application):
-        """Find similar applications with slightly varying details."""
+        """
+        Find similar applications with slightly varying details: names that
+        extend this one (e.g. "John Smith" and "John Smith Jr"), emails
+        sharing the local part before any trailing digits, and near-duplicate
+        names or addresses ("Jon Smyth") from the MinHash/LSH index.
+        """
+        # Imported here to keep numpy out of web worker startup
+        from .similarity import get_similarity_index
+
+        similar = Q()
+        if loan_application.name_key:
+            similar |= Q(name_key__startswith=loan_application.name_key)
+        if loan_application.email_base:
+            similar |= Q(email_base=loan_application.email_base)
         try:
-            with transaction.atomic():
-                # Escape special regex characters in the full_name
-                escaped_name = re.escape(loan_application.full_name)
-                
-                similar_names = LoanApplication.objects.filter(
-                    full_name__iregex=rf'{escaped_name}'
-                ).exclude(visitor_id=loan_application.visitor_id)
-                
-                base_email = loan_application.email.split('@')[0].lower()
-                similar_emails = LoanApplication.objects.filter(
-                    email__iregex=rf'^{base_email}\d*@.*$'
-                ).exclude(visitor_id=loan_application.visitor_id)
-                
-                return similar_names.union(similar_emails)
-        except re.error as e:
-            logger.error(f"Error in similar patterns detection: {str(e)}")
+            near_duplicates = get_similarity_index().similar(loan_application)
+        except Exception as e:
+            logger.error(f"Similarity index lookup failed for {loan_application.id}: {str(e)}")
+            near_duplicates = {}
+        if near_duplicates:
+            similar |= Q(id__in=list(near_duplicates))
+        if not similar:
             return LoanApplication.objects.none()
+        
+        return LoanApplication.objects.filter(similar).exclude(visitor_id=loan_application.visitor_id)
 
     def notify_admin_dashboard(self, loan_application, risk_score):
         """Notify admin dashboard about high-risk applications."""
@@ -321,7 +243,8 @@ class FraudDetectionService:
             'timestamp': timezone.now().isoformat()
         }
         
-        FraudAlert.objects.create(
+        FraudAlert.record(
+            f"high_risk:{loan_application.id}",
             loan_application=loan_application,
             visitor_id=loan_application.visitor_id,
             reason=f"High risk score ({risk_score})",
@@ -330,87 +253,185 @@ class FraudDetectionService:
         )
 
 
-class EnhancedFraudDetectionService(FraudDetectionService):
+class MLEnhancerMixin:
+    """
+    Provides `ml_enhancer`, created on first access. The ML stack (numpy and
+    the pickled sklearn models) is only imported by processes that score.
+    """
+    
+    _ml_enhancer = None
+    
+    @property
+    def ml_enhancer(self):
+        if self._ml_enhancer is None:
+            from .ml_services import MLFraudEnhancer
+            self._ml_enhancer = MLFraudEnhancer()
+        return self._ml_enhancer
+
+class EnhancedFraudDetectionService(MLEnhancerMixin, FraudDetectionService):
     """
     Enhanced fraud detection service with ML capabilities.
     Extends your existing FraudDetectionService.
     """
     
-    def __init__(self):
-        super().__init__()
-        self.ml_enhancer = MLFraudEnhancer()
-    
     def detect_fraud_with_ml(self, loan_application):
         """
         Enhanced fraud detection that combines rule-based detection with ML analysis.
+        The ML stage runs under a latency budget; if it is exceeded or the
+        process is overloaded, the rule-based score stands and the application
+        is marked "ML pending" for later rescoring. ml_results['decision_path']
+        reports which path produced the decision ('ml' or 'rules').
+        With ML_ASYNC_SCORING the ML stage is always left to the worker.
         """
+        run = StageRun()
         try:
             # First, run the existing fraud detection
-            fraud_detected, base_risk_score = self.detect_fraud(loan_application)
-            
-            # Apply ML enhancement
-            ml_results = self.ml_enhancer.enhance_fraud_detection(
-                loan_application, base_risk_score
-            )
-            
-            enhanced_risk_score = ml_results['enhanced_risk_score']
-            behavioral_analysis = ml_results['behavioral_analysis']
+            fraud_detected, base_risk_score = self.detect_fraud(loan_application, run)
             
-            # Update fraud alerts with ML insights
-            fraud_alerts = []
-            
-            # Add behavioral anomaly alerts
-            if behavioral_analysis.get('anomaly_detected'):
-                fraud_alerts.append(
-                    f"ML Anomaly Detection: Behavioral pattern significantly deviates from normal applications"
+            if settings.ML_ASYNC_SCORING:
+                return fraud_detected, base_risk_score, self.defer_ml_scoring(
+                    loan_application, base_risk_score, 'async'
                 )
             
-            if behavioral_analysis.get('behavioral_risk') == 'high':
-                fraud_alerts.append(
-                    f"ML Risk Assessment: High behavioral risk detected ({behavioral_analysis.get('analysis_details', '')})"
+            # Apply ML enhancement within the latency budget
+            ml_results, deferral_reason = self.ml_enhancer.enhance_within_budget(
+                loan_application, base_risk_score
+            )
+            if ml_results is None:
+                return fraud_detected, base_risk_score, self.defer_ml_scoring(
+                    loan_application, base_risk_score, deferral_reason
                 )
             
-            # Create enhanced fraud alert if ML detected additional risks
-            if fraud_alerts and ml_results['ml_risk_adjustment'] > 10:
-                with transaction.atomic():
-                    FraudAlert.objects.create(
-                        loan_application=loan_application,
-                        visitor_id=loan_application.visitor_id,
-                        reason=" | ".join(fraud_alerts),
-                        status='PENDING',
-                        risk_score=float(enhanced_risk_score),
-                        metadata={
-                            'ml_analysis': behavioral_analysis,
-                            'base_risk_score': base_risk_score,
-                            'ml_risk_adjustment': ml_results['ml_risk_adjustment'],
-                            'detection_type': 'ML_ENHANCED'
-                        }
-                    )
-            
-            # Determine if fraud was detected (either by rules or ML)
-            ml_fraud_detected = (
-                behavioral_analysis.get('anomaly_detected', False) or 
-                behavioral_analysis.get('behavioral_risk') == 'high' or
-                ml_results['ml_risk_adjustment'] > 15
-            )
+            ml_results['decision_path'] = 'ml'
+            loan_application.ml_status = 'complete'
             
+            ml_fraud_detected = self.record_ml_alerts(loan_application, base_risk_score, ml_results)
             final_fraud_detected = fraud_detected or ml_fraud_detected
             
-            return final_fraud_detected, enhanced_risk_score, ml_results
+            return final_fraud_detected, ml_results['enhanced_risk_score'], ml_results
             
         except Exception as e:
             logger.error(f"Error in enhanced fraud detection: {str(e)}")
-            # Fallback to basic detection if ML fails
-            return self.detect_fraud(loan_application) + ({'error': str(e)},)
+            # Fallback to basic detection if ML fails, reusing the stages that already completed
+            return self.detect_fraud(loan_application, run) + ({'error': str(e), 'decision_path': 'rules'},)
+    
+    def record_ml_alerts(self, loan_application, base_risk_score, ml_results):
+        """Create an ML fraud alert when warranted; return whether ML flagged fraud."""
+        enhanced_risk_score = ml_results['enhanced_risk_score']
+        behavioral_analysis = ml_results['behavioral_analysis']
+        
+        # Update fraud alerts with ML insights
+        fraud_alerts = []
+        
+        # Add behavioral anomaly alerts
+        if behavioral_analysis.get('anomaly_detected'):
+            fraud_alerts.append(
+                f"ML Anomaly Detection: Behavioral pattern significantly deviates from normal applications"
+            )
+        
+        if behavioral_analysis.get('behavioral_risk') == 'high':
+            fraud_alerts.append(
+                f"ML Risk Assessment: High behavioral risk detected ({behavioral_analysis.get('analysis_details', '')})"
+            )
+        
+        # Create enhanced fraud alert if ML detected additional risks
+        if fraud_alerts and ml_results['ml_risk_adjustment'] > 10:
+            with transaction.atomic():
+                # One ML alert per application; rescoring updates it
+                FraudAlert.record(
+                    f"ml:{loan_application.id}",
+                    loan_application=loan_application,
+                    visitor_id=loan_application.visitor_id,
+                    reason=" | ".join(fraud_alerts),
+                    status='PENDING',
+                    risk_score=float(enhanced_risk_score),
+                    metadata={
+                        'ml_analysis': behavioral_analysis,
+                        'base_risk_score': base_risk_score,
+                        'ml_risk_adjustment': ml_results['ml_risk_adjustment'],
+                        'detection_type': 'ML_ENHANCED'
+                    }
+                )
+        
+        # Determine if fraud was detected by ML
+        return (
+            behavioral_analysis.get('anomaly_detected', False) or 
+            behavioral_analysis.get('behavioral_risk') == 'high' or
+            ml_results['ml_risk_adjustment'] > 15
+        )
+    
+    def defer_ml_scoring(self, loan_application, base_risk_score, reason):
+        """Keep the rule-based decision and queue the application for ML rescoring."""
+        logger.info(f"Deferring ML scoring for {loan_application.id} ({reason})")
+        
+        if loan_application.metadata:
+            try:
+                metadata = json.loads(loan_application.metadata) if isinstance(loan_application.metadata, str) else loan_application.metadata
+            except json.JSONDecodeError:
+                metadata = {}
+        else:
+            metadata = {}
+        
+        metadata['ml_status'] = 'pending'
+        metadata['decision_path'] = 'rules'
+        metadata['ml_deferred_reason'] = reason
+        loan_application.metadata = json.dumps(metadata)
+        loan_application.ml_status = 'pending'
+        enqueue_scoring(loan_application, reason)
+        
+        return {
+            'enhanced_risk_score': base_risk_score,
+            'ml_risk_adjustment': 0,
+            'behavioral_analysis': {},
+            'decision_path': 'rules',
+            'ml_status': 'pending',
+            'deferred_reason': reason
+        }
+    
+    def rescore_pending(self, applications):
+        """
+        Run the deferred ML stage for applications marked "ML pending" and
+        update their risk score and status. Returns the ids of the applications
+        rescored; the rest are left pending.
+        """
+        applications = list(applications)
+        if not applications:
+            return []
+        
+        # Scoring was deferred after rules ran, so the stored score is the rule-based one
+        base_risk_scores = [float(app.risk_score) for app in applications]
+        all_ml_results = self.ml_enhancer.enhance_many(applications, base_risk_scores)
+        
+        rescored = []
+        for loan_application, base_risk_score, ml_results in zip(applications, base_risk_scores, all_ml_results):
+            if not ml_results['behavioral_analysis'].get('model_version'):
+                continue  # No model available yet; leave it pending
+            
+            ml_results['decision_path'] = 'ml'
+            self.record_ml_alerts(loan_application, base_risk_score, ml_results)
+            decision_info = get_enhanced_decision_with_explanation(
+                loan_application, ml_results['enhanced_risk_score'], ml_results
+            )
+            
+            metadata = json.loads(loan_application.metadata)
+            metadata['ml_status'] = 'complete'
+            metadata['decision_path'] = 'ml'
+            loan_application.metadata = json.dumps(metadata)
+            loan_application.risk_score = ml_results['enhanced_risk_score']
+            loan_application.status = decision_info['decision']
+            loan_application.ml_status = 'complete'
+            loan_application.save(update_fields=['metadata', 'risk_score', 'status', 'ml_status', 'last_modified'])
+            rescored.append(loan_application.id)
+        
+        return rescored
 
-class EnhancedRiskScoringService(RiskScoringService):
+class EnhancedRiskScoringService(MLEnhancerMixin, RiskScoringService):
     """
     Enhanced risk scoring service with ML behavioral analysis.
     """
     
     def __init__(self):
         super().__init__()
-        self.ml_enhancer = MLFraudEnhancer()
         # Add ML weight to existing weights
         self.ML_WEIGHT = float(os.getenv("ML_WEIGHT", 0.15))
         
@@ -427,11 +448,12 @@ class EnhancedRiskScoringService(RiskScoringService):
         """Calculate risk score with ML behavioral analysis."""
         try:
             # Calculate traditional risk scores
+            context = RiskContext.load(loan_application)
             traditional_scores = {
-                'identity': self._calculate_identity_risk(loan_application),
+                'identity': self._calculate_identity_risk(loan_application, context),
                 'device': self._calculate_device_risk(loan_application),
-                'ip': self._calculate_ip_risk(loan_application),
-                'history': self._calculate_history_risk(loan_application)
+                'ip': self._calculate_ip_risk(loan_application, context),
+                'history': self._calculate_history_risk(loan_application, context)
             }
             
             # Calculate ML behavioral risk
@@ -518,15 +540,10 @@ def get_enhanced_decision_with_explanation(loan_application, risk_score, ml_resu
     """
     Get decision with detailed explanation including ML insights.
     """
-    if risk_score <= 40:
-        decision = 'APPROVE'
-        confidence = 'high'
-    elif risk_score <= 70:
-        decision = 'REVIEW'
-        confidence = 'medium'
-    else:
-        decision = 'REJECT'
-        confidence = 'high'
+    plan = get_rule_plan()
+    decision = plan.decide(risk_score)
+    # Scores between the outer decisions' bounds are the uncertain ones
+    confidence = 'high' if decision in (plan.decisions[0], plan.decisions[-1]) else 'medium'
     
     # Build explanation
     explanation_parts = [
@@ -1,16 +1,77 @@
 # fraud_detection/signals.py
 
+import logging
 from django.db.models.signals import post_save, post_migrate
 from django.dispatch import receiver
 from .models import LoanApplication
 from .utils import detect_fraud
+from .insights_cache import invalidate_insights
+from .identity import IDENTITY_FIELDS, identity_keys, sync_identity_keys
+from .velocity import record_application
+from .rings import RING_FIELDS, link_application, ring_keys
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+
+logger = logging.getLogger(__name__)
+
+# Fields covered by the similarity index (see similarity.SIMILARITY_FIELDS),
+# listed here so saves can be filtered without importing numpy
+SIMILARITY_INDEX_FIELDS = {'full_name', 'address'}
+
+# Registered before check_fraud so its checks see this application counted
+@receiver(post_save, sender=LoanApplication)
+def update_velocity_counters(sender, instance, created, **kwargs):
+    if created:
+        try:
+            record_application(instance)
+        except Exception as e:
+            logger.error(f"Failed to update velocity counters for {instance.id}: {str(e)}")
+
+# Registered before check_fraud so its ring includes this application
+@receiver(post_save, sender=LoanApplication)
+def update_fraud_ring(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or RING_FIELDS & set(update_fields):
+        # Relink only when the identifiers or risk score differ from the last link of this instance
+        linked = (ring_keys(instance), float(instance.risk_score or 0))
+        if getattr(instance, '_linked_ring_state', None) == linked:
+            return
+        try:
+            link_application(instance)
+            instance._linked_ring_state = linked
+        except Exception as e:
+            logger.error(f"Failed to update fraud ring for {instance.id}: {str(e)}")
 
 @receiver(post_save, sender=LoanApplication)
 def check_fraud(sender, instance, created, **kwargs):
     if created:
         detect_fraud(instance)
 
+@receiver(post_save, sender=LoanApplication)
+def update_identity_keys(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is None or IDENTITY_FIELDS & set(update_fields):
+        # A submission saves the same instance several times; resync only when its keys change
+        synced = (identity_keys(instance), instance.visitor_id_id)
+        if getattr(instance, '_synced_identity_keys', None) != synced:
+            sync_identity_keys(instance)
+            instance._synced_identity_keys = synced
+
+@receiver(post_save, sender=LoanApplication)
+def update_similarity_index(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is None or SIMILARITY_INDEX_FIELDS & set(update_fields):
+        transaction.on_commit(lambda: _index_similarity(instance))
+
+def _index_similarity(instance):
+    from .similarity import get_similarity_index
+
+    try:
+        get_similarity_index().add(instance)
+    except Exception as e:
+        logger.error(f"Failed to index application {instance.id} for similarity: {str(e)}")
+
+@receiver(post_save, sender=LoanApplication)
+def invalidate_ml_insights(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_insights(instance.id)
+
 
 
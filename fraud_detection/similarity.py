@@ -0,0 +1,259 @@
+# fraud_detection/similarity.py
+import logging
+import os
+import threading
+import uuid
+import zlib
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .models import LoanApplication
+from .normalization import normalize_name
+
+logger = logging.getLogger(__name__)
+
+# Indexed fields and the character n-gram size used to shingle each
+SIMILARITY_FIELDS = (('full_name', 2), ('address', 3))
+
+NUM_PERM = 128
+# 32 bands of 4 rows: pairs at Jaccard 0.5 become candidates ~87% of the
+# time, at 0.6 ~99%; candidates are then checked against the threshold
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+# Multiply-shift hash functions h(x) = ((a * x + b) mod 2^64) >> 32, one per permutation
+_permutations = np.random.RandomState(1).randint(0, 2 ** 64, size=(2, NUM_PERM), dtype=np.uint64)
+PERM_A, PERM_B = _permutations[0] | np.uint64(1), _permutations[1]
+
+# Fixed-size log record: one signature of one field of one application
+RECORD_DTYPE = np.dtype([
+    ('application', 'S16'),
+    ('visitor', '<i8'),
+    ('field', 'u1'),
+    ('signature', '<u4', (NUM_PERM,)),
+])
+NO_VISITOR = -1
+
+REBUILD_BATCH_SIZE = 2000
+
+
+def shingles(text, size):
+    """Character n-grams of the normalized text, padded so short words still shingle."""
+    text = normalize_name(text)
+    if not text:
+        return set()
+    text = f" {text} "
+    return {text[i:i + size] for i in range(max(len(text) - size + 1, 1))}
+
+
+def minhash(text, size):
+    """MinHash signature (uint32[NUM_PERM]) of the text's n-grams, or None for empty text."""
+    grams = shingles(text, size)
+    if not grams:
+        return None
+    hashes = np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams))
+    # uint64 arithmetic wraps, which is the mod 2^64
+    permuted = (np.outer(hashes, PERM_A) + PERM_B) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_keys(signature):
+    return [signature[i * LSH_ROWS:(i + 1) * LSH_ROWS].tobytes() for i in range(LSH_BANDS)]
+
+
+class _FieldIndex:
+    """Signatures of one field plus the LSH band tables pointing at them."""
+
+    def __init__(self):
+        self.signatures = np.zeros((0, NUM_PERM), dtype=np.uint32)
+        self.applications = []
+        self.visitors = []
+        self.size = 0
+        self.latest = {}  # application id bytes -> row of its current signature
+        self.bands = [{} for _ in range(LSH_BANDS)]
+
+    def add(self, application, visitor, signature):
+        if self.size == len(self.signatures):
+            grown = np.zeros((max(1024, 2 * self.size), NUM_PERM), dtype=np.uint32)
+            grown[:self.size] = self.signatures[:self.size]
+            self.signatures = grown
+        row = self.size
+        self.signatures[row] = signature
+        self.applications.append(application)
+        self.visitors.append(visitor)
+        self.size += 1
+        # Earlier rows for the application stay in the band tables but are skipped
+        self.latest[application] = row
+        for table, key in zip(self.bands, band_keys(signature)):
+            table.setdefault(key, []).append(row)
+
+    def current(self, application):
+        row = self.latest.get(application)
+        return None if row is None else self.signatures[row]
+
+    def query(self, signature, threshold):
+        """(application id bytes, visitor, estimated Jaccard) of rows at or above the threshold."""
+        rows = set()
+        for table, key in zip(self.bands, band_keys(signature)):
+            rows.update(table.get(key, ()))
+        rows = [row for row in rows if self.latest.get(self.applications[row]) == row]
+        if not rows:
+            return []
+        rows = np.array(rows)
+        similarity = (self.signatures[rows] == signature).mean(axis=1)
+        return [
+            (self.applications[row], self.visitors[row], float(score))
+            for row, score in zip(rows.tolist(), similarity.tolist())
+            if score >= threshold
+        ]
+
+
+class SimilarityIndex:
+    """
+    MinHash/LSH index over character n-grams of applicant names and
+    addresses, for finding near-duplicate applications ("Jon Smyth" /
+    "John Smith") without scanning the table.
+
+    Signatures are appended as fixed-size records to a log on disk; every
+    process keeps an in-memory copy and replays records it has not seen
+    before each query, so workers stay in sync without coordination. A
+    rebuild writes a new log and swaps it in, which readers notice by its
+    changed inode and reload from scratch.
+    """
+
+    def __init__(self, index_dir=None):
+        self.index_dir = Path(index_dir or settings.SIMILARITY_INDEX_DIR)
+        # Signature parameters are part of the name so a change starts a new log
+        self.log_path = self.index_dir / f"minhash-{NUM_PERM}x{LSH_BANDS}.log"
+        self.thresholds = {
+            'full_name': settings.SIMILARITY_NAME_THRESHOLD,
+            'address': settings.SIMILARITY_ADDRESS_THRESHOLD,
+        }
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, inode):
+        self._fields = {name: _FieldIndex() for name, _ in SIMILARITY_FIELDS}
+        self._inode = inode
+        self._offset = 0
+
+    def refresh(self):
+        """Replay log records appended since the last call."""
+        try:
+            stat = self.log_path.stat()
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if stat.st_ino != self._inode:
+                self._reset(stat.st_ino)
+            complete = (stat.st_size // RECORD_DTYPE.itemsize) * RECORD_DTYPE.itemsize
+            if complete <= self._offset:
+                return
+            with open(self.log_path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read(complete - self._offset)
+            self._offset = complete
+            self._apply(np.frombuffer(data, dtype=RECORD_DTYPE))
+
+    def _apply(self, records):
+        for record in records:
+            field = SIMILARITY_FIELDS[record['field']][0]
+            # Fixed-width bytes lose trailing NULs on the way out of numpy
+            application = record['application'].ljust(16, b'\0')
+            self._fields[field].add(application, int(record['visitor']), record['signature'])
+
+    def signatures(self, loan_application):
+        """{field: signature} for the application's non-empty indexed fields."""
+        result = {}
+        for name, size in SIMILARITY_FIELDS:
+            signature = minhash(getattr(loan_application, name), size)
+            if signature is not None:
+                result[name] = signature
+        return result
+
+    def add(self, loan_application):
+        """Append the application's signatures, skipping fields whose signature is unchanged."""
+        self.refresh()
+        application = loan_application.id.bytes
+        visitor = loan_application.visitor_id_id or NO_VISITOR
+        records = []
+        for position, (name, size) in enumerate(SIMILARITY_FIELDS):
+            signature = minhash(getattr(loan_application, name), size)
+            if signature is None:
+                continue
+            with self._lock:
+                current = self._fields[name].current(application)
+            if current is not None and np.array_equal(current, signature):
+                continue
+            records.append((application, visitor, position, signature))
+        if records:
+            self._append(np.array(records, dtype=RECORD_DTYPE))
+        return len(records)
+
+    def _append(self, records):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        # O_APPEND with a single write keeps records from concurrent writers whole
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, records.tobytes())
+        finally:
+            os.close(fd)
+
+    def similar(self, loan_application):
+        """
+        {application id: highest field similarity} for other visitors'
+        applications whose name or address is at least that field's
+        threshold similar to this one's.
+        """
+        self.refresh()
+        application = loan_application.id.bytes
+        visitor = loan_application.visitor_id_id or NO_VISITOR
+        matches = {}
+        with self._lock:
+            for name, signature in self.signatures(loan_application).items():
+                for other, other_visitor, score in self._fields[name].query(signature, self.thresholds[name]):
+                    if other == application or other_visitor == visitor:
+                        continue
+                    other_id = uuid.UUID(bytes=other)
+                    matches[other_id] = max(score, matches.get(other_id, 0.0))
+        return matches
+
+    def rebuild(self, batch_size=REBUILD_BATCH_SIZE):
+        """Write a fresh log from every application and swap it in; returns the number indexed."""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.log_path.with_suffix(f".tmp-{uuid.uuid4().hex[:6]}")
+        indexed = 0
+        applications = LoanApplication.objects.only('id', 'visitor_id', 'full_name', 'address').order_by('pk')
+        with open(tmp_path, 'wb') as f:
+            batch = []
+            for app in applications.iterator(chunk_size=batch_size):
+                visitor = app.visitor_id_id or NO_VISITOR
+                for position, (name, size) in enumerate(SIMILARITY_FIELDS):
+                    signature = minhash(getattr(app, name), size)
+                    if signature is not None:
+                        batch.append((app.id.bytes, visitor, position, signature))
+                indexed += 1
+                if len(batch) >= batch_size:
+                    f.write(np.array(batch, dtype=RECORD_DTYPE).tobytes())
+                    batch = []
+            if batch:
+                f.write(np.array(batch, dtype=RECORD_DTYPE).tobytes())
+        os.replace(tmp_path, self.log_path)
+        logger.info(f"Rebuilt similarity index with {indexed} applications")
+        return indexed
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_similarity_index():
+    """Per-process index, replayed from the shared log on use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SimilarityIndex()
+    return _index
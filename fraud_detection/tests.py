@@ -0,0 +1,866 @@
+# fraud_detection/tests.py
+import json
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from sklearn.ensemble import IsolationForest
+
+from fraud_detection.backtest import backtest, current_configuration, load_component_scores, score_grid
+from fraud_detection.compiled_forest import PARITY_TOLERANCE, check_parity, compile_isolation_forest
+from fraud_detection.drift import (
+    PSI_DRIFT_THRESHOLD, SKETCH_ALPHA, DriftMonitor, FeatureStats, QuantileSketch, RunningStats,
+    population_stability_index
+)
+from fraud_detection.feature_snapshot import FeatureSnapshot
+from fraud_detection.feature_store import FEATURE_NAMES, FEATURE_SCHEMA_VERSION, FeatureStore
+from fraud_detection.insights_cache import get_insights_cache
+from fraud_detection.ip_index import PrefixTrie
+from fraud_detection.job_queue import claim_jobs, enqueue_scoring, release_stale_jobs, retry_job
+from fraud_detection.ml_registry import BehavioralModelRegistry
+from fraud_detection.ml_services import BehavioralPatternAnalyzer
+from fraud_detection.models import (
+    ApplicationFeatures, FeatureDriftSnapshot, FraudAlert, IdentityKey, LoanApplication, RingMember, ScoringJob,
+    VisitorID
+)
+from fraud_detection.pipeline import CircuitOpenError, StageRun
+from fraud_detection.rescoring import Rescorer, ml_adjustment
+from fraud_detection.risk_context import RiskContext
+from fraud_detection.rules import get_rule_plan
+from fraud_detection.velocity import (
+    CacheBackend, DatabaseBackend, InMemoryBackend, bucket_counts, velocity_counts, window_start
+)
+from fraud_detection.services import FraudDetectionService, RiskScoringService, get_enhanced_decision_with_explanation
+from fraud_detection.similarity import SimilarityIndex
+
+
+def without_conflict_target():
+    """Run as on MySQL, which cannot target a unique constraint in bulk_create(update_conflicts=True)."""
+    return mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False)
+
+
+class IdentityKeySyncTests(TestCase):
+    def _keys(self, loan_application):
+        return dict(IdentityKey.objects.filter(loan_application=loan_application).values_list('key_type', 'value'))
+
+    def test_keys_follow_saves_without_conflict_target(self):
+        with without_conflict_target():
+            loan_application = LoanApplication.objects.create(
+                full_name="Jane  Doe", email="Jane.Doe@Example.com", phone="(555) 010-0200"
+            )
+            self.assertEqual(self._keys(loan_application), {
+                'name': 'jane doe', 'email': 'jane.doe@example.com', 'phone': '5550100200'
+            })
+
+            loan_application.email = "jane@example.org"
+            loan_application.phone = ""
+            loan_application.save()
+            self.assertEqual(self._keys(loan_application), {'name': 'jane doe', 'email': 'jane@example.org'})
+
+    def test_resave_with_unchanged_keys_skips_sync(self):
+        loan_application = LoanApplication.objects.create(full_name="Jane Doe", email="jane@example.org")
+        loan_application.status = "approved"
+        with CaptureQueriesContext(connection) as queries:
+            loan_application.save()
+        self.assertFalse([query for query in queries if IdentityKey._meta.db_table in query['sql']])
+
+
+class FeatureStoreTests(TestCase):
+    def test_backfill_replaces_stale_vectors_without_conflict_target(self):
+        loan_application = LoanApplication.objects.create(full_name="Jane Doe", amount_requested=1000)
+        store = FeatureStore()
+        with without_conflict_target():
+            self.assertEqual(store.backfill(), 1)
+            ApplicationFeatures.objects.filter(pk=loan_application.pk).update(
+                schema_version=FEATURE_SCHEMA_VERSION - 1, vector=b''
+            )
+            self.assertEqual(store.backfill(), 1)
+
+        stored = ApplicationFeatures.objects.get(pk=loan_application.pk)
+        self.assertEqual(stored.schema_version, FEATURE_SCHEMA_VERSION)
+        self.assertTrue(stored.vector)
+        self.assertEqual(store.get_matrix([loan_application]).shape, (1, len(FEATURE_NAMES)))
+
+
+class FraudRingSignalTests(TestCase):
+    def test_resave_relinks_only_on_ring_changes(self):
+        loan_application = LoanApplication.objects.create(full_name="Jane Doe", email="jane@example.org")
+        loan_application.status = "approved"
+        with CaptureQueriesContext(connection) as queries:
+            loan_application.save()
+        self.assertFalse([query for query in queries if RingMember._meta.db_table in query['sql']])
+
+        loan_application.risk_score = 80
+        loan_application.save()
+        self.assertEqual(RingMember.objects.get(loan_application=loan_application).risk_score, 80)
+
+
+class EnhancedDecisionTests(TestCase):
+    def test_decision_follows_the_ruleset_bounds(self):
+        plan = get_rule_plan()
+        with mock.patch.object(plan, 'decision_bounds', [10.0, 20.0]):
+            decisions = [
+                get_enhanced_decision_with_explanation(None, score) for score in (10, 15, 50)
+            ]
+        self.assertEqual([info['decision'] for info in decisions], plan.decisions)
+        self.assertEqual([info['confidence'] for info in decisions], ['high', 'medium', 'high'])
+
+
+class RulePlanReloadTests(TestCase):
+    def test_unreadable_ruleset_keeps_the_previous_plan(self):
+        plan = get_rule_plan()
+        with mock.patch('fraud_detection.rules.os.stat', side_effect=PermissionError("denied")), \
+                mock.patch('fraud_detection.rules.RELOAD_CHECK_SECONDS', 0):
+            with self.assertLogs('fraud_detection.rules', 'ERROR'):
+                self.assertIs(get_rule_plan(), plan)
+
+
+class RiskContextBatchTests(TestCase):
+    def test_windows_end_at_each_submission(self):
+        visitor = VisitorID.objects.create(visitor_id="v-old")
+        submitted = timezone.now() - timedelta(days=90)
+        applications = []
+        for minutes in (0, 5, 10):
+            loan_application = LoanApplication.objects.create(visitor_id=visitor, ip_address="81.2.69.142")
+            LoanApplication.objects.filter(pk=loan_application.pk).update(
+                application_date=submitted + timedelta(minutes=minutes)
+            )
+            applications.append(loan_application)
+        applications = list(LoanApplication.objects.filter(pk__in=[app.pk for app in applications])
+                            .order_by('application_date'))
+
+        contexts = RiskContext.load_many(applications)
+        self.assertEqual([contexts[app.id].visitor_recent for app in applications], [0, 1, 2])
+        self.assertEqual([contexts[app.id].ip_applications for app in applications], [1, 2, 3])
+        self.assertEqual([contexts[app.id].subnet_applications for app in applications], [1, 2, 3])
+
+        # Anchored at a common time the old applications fall outside every window
+        contexts = RiskContext.load_many(applications, now=timezone.now())
+        self.assertEqual({contexts[app.id].ip_applications for app in applications}, {1})
+
+
+class RiskContextLoadTests(TestCase):
+    COUNTERS = ('visitor_applications', 'shared_identity_other_visitors', 'shared_identity_same_visitor',
+                'ring_linked', 'ring_mean_risk')
+
+    def setUp(self):
+        first, second = VisitorID.objects.create(visitor_id="v-1"), VisitorID.objects.create(visitor_id="v-2")
+        rows = [
+            (first, "Jane Doe", "jane@example.org", 40),
+            (first, "Jane Doe", "jd@example.org", 60),
+            (first, "Someone Else", "se@example.org", 0),
+            (second, "Jane  Doe", "other@example.org", 80),
+            (None, "No Visitor", "jane@example.org", 0),
+            (None, "No Visitor Either", "nv@example.org", 0),
+        ]
+        self.applications = [
+            LoanApplication.objects.create(visitor_id=visitor, full_name=full_name, email=email,
+                                           phone=f"55501000{i:02d}", risk_score=risk_score)
+            for i, (visitor, full_name, email, risk_score) in enumerate(rows)
+        ]
+
+    def _counters(self, context):
+        return {name: getattr(context, name) for name in self.COUNTERS}
+
+    def test_counts(self):
+        jane, _, _, other_jane, visitorless, _ = self.applications
+        context = RiskContext.load(jane)
+        self.assertEqual(
+            (context.visitor_applications, context.shared_identity_same_visitor,
+             context.shared_identity_other_visitors, context.different_identities),
+            (2, 1, 2, 1)
+        )
+        self.assertEqual(RiskContext.load(other_jane).shared_identity_other_visitors, 2)
+        # Visitor-less applications count each other as the same visitor
+        context = RiskContext.load(visitorless)
+        self.assertEqual((context.visitor_applications, context.shared_identity_same_visitor), (1, 0))
+
+    def test_matches_load_many(self):
+        now = timezone.now()
+        batch = RiskContext.load_many(self.applications, now=now)
+        self.assertTrue(any(context.ring_linked for context in batch.values()))
+        for application in self.applications:
+            with self.subTest(application=application.full_name):
+                expected = self._counters(batch[application.id])
+                if not application.visitor_id_id:
+                    # load_many leaves visitor counts at 0 where components never read them
+                    expected['visitor_applications'] = 1
+                self.assertEqual(self._counters(RiskContext.load(application, now=now)), expected)
+
+    def test_one_query_besides_the_velocity_counters(self):
+        velocity = {'visitor_recent': 0, 'ip_applications': 0, 'subnet_applications': 0}
+        with mock.patch('fraud_detection.risk_context.velocity_counts', return_value=velocity), \
+                CaptureQueriesContext(connection) as queries:
+            RiskContext.load(self.applications[0])
+        self.assertEqual(len(queries), 1)
+
+
+class RescorerTests(TestCase):
+    def test_ml_scored_applications_keep_their_adjustment(self):
+        loan_application = LoanApplication.objects.create(
+            full_name="Jane Doe", status="APPROVE", ml_status="complete",
+            metadata=json.dumps({'ml_status': 'complete', 'ml_risk_adjustment': 35})
+        )
+        scoring = RiskScoringService()
+        context = RiskContext.load_many([loan_application])[loan_application.id]
+        scores = scoring.component_scores(loan_application, context)
+        expected = round(min(100, scoring.combine_scores(scores) + 35), 2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            list(Rescorer(Path(directory) / 'checkpoint.json').run())
+
+        loan_application.refresh_from_db()
+        self.assertEqual(float(loan_application.risk_score), expected)
+        self.assertEqual(loan_application.status, get_rule_plan().decide(expected))
+
+
+class CompiledForestParityTests(SimpleTestCase):
+    def _assert_parity(self, forest, X):
+        forest.fit(X)
+        self.assertLess(check_parity(forest, compile_isolation_forest(forest), X), PARITY_TOLERANCE)
+        rows = np.random.default_rng(1).normal(size=(200, X.shape[1]))
+        self.assertLess(check_parity(forest, compile_isolation_forest(forest), rows), PARITY_TOLERANCE)
+
+    def test_all_features(self):
+        X = np.random.default_rng(0).normal(size=(500, 6))
+        self._assert_parity(IsolationForest(n_estimators=30, random_state=0), X)
+
+    def test_feature_subsampling_remaps_columns(self):
+        X = np.random.default_rng(0).normal(size=(500, 6)) * np.arange(1, 7)
+        forest = IsolationForest(n_estimators=30, max_features=0.5, random_state=0)
+        self._assert_parity(forest, X)
+        self.assertTrue(any(len(columns) < X.shape[1] for columns in forest.estimators_features_))
+
+    def test_leaves_with_one_and_two_samples(self):
+        # Every row appears twice, so isolated rows end in two-sample leaves next to one-sample ones
+        base = np.random.default_rng(0).normal(size=(40, 3))
+        X = np.vstack([base, base, np.random.default_rng(2).normal(size=(10, 3))])
+        forest = IsolationForest(n_estimators=20, max_samples=len(X), random_state=0)
+        self._assert_parity(forest, X)
+        leaf_sizes = {
+            int(size) for estimator in forest.estimators_
+            for size, left in zip(estimator.tree_.n_node_samples, estimator.tree_.children_left) if left == -1
+        }
+        self.assertTrue({1, 2} <= leaf_sizes)
+
+
+class ActiveModelTests(TestCase):
+    def test_requests_never_train_a_missing_model(self):
+        with tempfile.TemporaryDirectory() as directory:
+            analyzer = BehavioralPatternAnalyzer(registry=BehavioralModelRegistry(directory))
+            with mock.patch.object(analyzer, 'train_model') as train_model:
+                self.assertIsNone(analyzer.get_active_model())
+                loan_application = LoanApplication.objects.create(full_name="Jane Doe")
+                analysis = analyzer.analyze_current_application(loan_application)
+            train_model.assert_not_called()
+            self.assertIsNone(analysis['model_version'])
+
+
+class FeatureSnapshotTests(TestCase):
+    def test_lookup_finds_rows_by_id(self):
+        ids = [uuid.uuid4() for _ in range(50)]
+        X = np.random.default_rng(0).normal(size=(50, len(FEATURE_NAMES))).astype(np.float32)
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot = FeatureSnapshot(directory)
+            snapshot.write(ids, X)
+            rows, found = snapshot.lookup([ids[7], uuid.uuid4(), ids[0]])
+        self.assertEqual(found.tolist(), [True, False, True])
+        np.testing.assert_array_equal(rows[[0, 2]], X[[7, 0]])
+        np.testing.assert_array_equal(rows[1], 0)
+
+    def test_scoring_reads_snapshot_rows(self):
+        applications = [LoanApplication.objects.create(full_name=f"Applicant {i}") for i in range(3)]
+        with tempfile.TemporaryDirectory() as directory:
+            analyzer = BehavioralPatternAnalyzer(registry=BehavioralModelRegistry(directory))
+            analyzer.snapshot = FeatureSnapshot(Path(directory) / 'snapshots')
+            expected = analyzer.feature_store.get_matrix(applications)
+            analyzer.snapshot.write([app.id for app in applications[:2]], expected[:2])
+
+            with CaptureQueriesContext(connection) as queries:
+                X = analyzer.application_matrix(applications[:2])
+            self.assertFalse([query for query in queries if ApplicationFeatures._meta.db_table in query['sql']])
+            np.testing.assert_array_equal(X, expected[:2])
+            # Applications outside the snapshot come from the feature store
+            np.testing.assert_array_equal(analyzer.application_matrix(applications), expected)
+
+
+class BatchFeatureExtractionTests(TestCase):
+    def test_batch_matches_single_application_path(self):
+        visitor = VisitorID.objects.create(visitor_id="v-batch")
+        metadata = json.dumps({'browserDetails': {'browser': 'Chrome'}, 'osDetails': {'os': 'Linux'}})
+        start = timezone.now().replace(hour=23, minute=30) - timedelta(days=10)
+        applicants = [
+            ("Jane Doe", "jane@gmail.com"), ("Jöhn Smíth", "john@example.org"), ("", ""), ("Ann Lee", "ann@yahoo.com")
+        ]
+        for i, (name, email) in enumerate(applicants):
+            loan_application = LoanApplication.objects.create(
+                visitor_id=visitor if i != 2 else None, full_name=name, email=email, amount_requested=500 + i,
+                confidence_score=None if i == 1 else 0.9, vpn_detected=i % 2 == 0, metadata=metadata,
+                purpose="rent" * i
+            )
+            # Spread over days and hours, including a weekend and a late hour
+            LoanApplication.objects.filter(pk=loan_application.pk).update(
+                application_date=start + timedelta(days=i * 2, hours=i * 7)
+            )
+
+        analyzer = BehavioralPatternAnalyzer()
+        applications = LoanApplication.objects.all()
+        ids, X = analyzer.extract_behavioral_features_batch(applications)
+        by_id = {app.id: app for app in applications}
+        expected = np.array([
+            [analyzer.extract_behavioral_features(by_id[app_id])[name] for name in FEATURE_NAMES] for app_id in ids
+        ], dtype=np.float32)
+        np.testing.assert_array_equal(X, expected)
+
+
+@override_settings(DETECTION_BREAKER_FAILURES=3, DETECTION_BREAKER_RESET_SECONDS=60)
+class StageRunTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict('fraud_detection.pipeline._breakers', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _failing(self, failures, result='done'):
+        calls = []
+
+        def func():
+            calls.append(1)
+            if len(calls) <= failures:
+                # A real database error, so the stage's savepoint has something to roll back
+                connection.cursor().execute("SELECT * FROM no_such_table")
+            return result
+        return func, calls
+
+    def test_failed_run_resumes_after_completed_stages(self):
+        run = StageRun(retries=0, sleep=lambda delay: None)
+        first, first_calls = self._failing(0, 'first')
+        second, second_calls = self._failing(1, 'second')
+
+        run.stage('first', first)
+        with self.assertRaises(OperationalError):
+            run.stage('second', second)
+        self.assertEqual(run.stage('first', first), 'first')
+        self.assertEqual(run.stage('second', second), 'second')
+        self.assertEqual((len(first_calls), len(second_calls)), (1, 2))
+
+    def test_transient_errors_are_retried_with_backoff(self):
+        delays = []
+        run = StageRun(retries=2, base_delay=0.1, max_delay=0.15, sleep=delays.append)
+        func, calls = self._failing(2)
+        self.assertEqual(run.stage('flaky', func), 'done')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(delays, [0.1, 0.15])
+        # The test transaction is still usable after the rolled-back savepoints
+        self.assertFalse(LoanApplication.objects.exists())
+
+    def test_breaker_opens_after_repeated_failures(self):
+        func, calls = self._failing(10)
+        for _ in range(3):
+            with self.assertRaises(OperationalError):
+                StageRun(retries=0).stage('broken', func)
+        with self.assertRaises(CircuitOpenError):
+            StageRun(retries=0).stage('broken', func)
+        self.assertEqual(len(calls), 3)
+
+
+class RuleAlertTests(TestCase):
+    def test_repeated_detection_records_one_alert(self):
+        loan_application = LoanApplication.objects.create(full_name="Jane Doe")
+        alerts = FraudAlert.objects.filter(loan_application=loan_application)
+        before = alerts.count()
+        with mock.patch.object(RiskScoringService, 'calculate_risk_score', return_value=95.0):
+            for _ in range(2):
+                self.assertEqual(FraudDetectionService().detect_fraud(loan_application), (True, 95.0))
+        self.assertEqual(alerts.filter(alert_key=f"rules:{loan_application.id}").count(), 1)
+        self.assertEqual(alerts.count(), before + 1)
+
+
+class PrefixTrieTests(SimpleTestCase):
+    def setUp(self):
+        self.trie = PrefixTrie()
+        for network in ('10.16.0.0/12', '10.20.0.0/20', '10.20.15.0/24', '2001:db8:10::/44', '2001:db8:1f::/48'):
+            self.trie.insert(network, network)
+
+    def _match(self, address):
+        match = self.trie.lookup(address)
+        return match[1] if match else None
+
+    def test_ipv4_ranges_not_aligned_to_bytes(self):
+        self.assertEqual(self._match('10.20.0.0'), '10.20.0.0/20')
+        self.assertEqual(self._match('10.20.14.255'), '10.20.0.0/20')
+        self.assertEqual(self._match('10.20.16.0'), '10.16.0.0/12')
+        self.assertEqual(self._match('10.16.0.0'), '10.16.0.0/12')
+        self.assertEqual(self._match('10.31.255.255'), '10.16.0.0/12')
+        self.assertIsNone(self._match('10.15.255.255'))
+        self.assertIsNone(self._match('10.32.0.0'))
+
+    def test_ipv4_longest_prefix_wins(self):
+        self.assertEqual(self._match('10.20.15.0'), '10.20.15.0/24')
+        self.assertEqual(self._match('10.20.15.255'), '10.20.15.0/24')
+        self.assertEqual(self._match('10.20.16.1'), '10.16.0.0/12')
+
+    def test_ipv6_ranges_not_aligned_to_bytes(self):
+        self.assertEqual(self._match('2001:db8:10::'), '2001:db8:10::/44')
+        self.assertEqual(self._match('2001:db8:1e:ffff:ffff:ffff:ffff:ffff'), '2001:db8:10::/44')
+        self.assertEqual(self._match('2001:db8:1f::1'), '2001:db8:1f::/48')
+        self.assertIsNone(self._match('2001:db8:f:ffff:ffff:ffff:ffff:ffff'))
+        self.assertIsNone(self._match('2001:db8:20::'))
+
+    def test_ipv4_mapped_addresses_match_ipv4_ranges(self):
+        self.assertEqual(self._match('::ffff:10.20.15.9'), '10.20.15.0/24')
+        self.assertIsNone(self._match('not an address'))
+
+
+class IPRiskTests(TestCase):
+    def _risk(self, context, **fields):
+        loan_application = LoanApplication(**{'ip_address': '81.2.69.142', **fields})
+        return RiskScoringService()._calculate_ip_risk(loan_application, context)
+
+    def test_blocklist_then_address_then_subnet_velocity(self):
+        busy = RiskContext(ip_applications=100, subnet_applications=100)
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as blocklist, \
+                override_settings(IP_BLOCKLIST_PATH=blocklist.name, IP_VELOCITY_THRESHOLD=5,
+                                  SUBNET_VELOCITY_THRESHOLD=15):
+            blocklist.write("81.2.64.0/20  # test range\n")
+            blocklist.flush()
+            self.assertEqual(self._risk(busy), 90)
+            self.assertEqual(self._risk(RiskContext(), ip_blocklisted=True), 90)
+            self.assertEqual(self._risk(busy, ip_address='81.2.80.1'), 80)
+            self.assertEqual(self._risk(RiskContext(ip_applications=5, subnet_applications=16),
+                                        ip_address='81.2.80.1'), 60)
+            self.assertEqual(self._risk(RiskContext(ip_applications=5, subnet_applications=15),
+                                        ip_address='81.2.80.1'), 0)
+
+
+class VelocityTests(TestCase):
+    NOW = datetime(2026, 3, 4, 12, 30, 30, tzinfo=dt_timezone.utc)
+
+    def _application(self, at, ip_address='81.2.69.142', email='jane@example.org'):
+        return LoanApplication(ip_address=ip_address, email=email, application_date=at)
+
+    def _backend(self, applications, backend=None):
+        backend = backend or InMemoryBackend()
+        backend.increment(bucket_counts(applications))
+        return backend
+
+    def test_windows_round_out_to_whole_buckets(self):
+        # 30 minutes ending 12:30:30 start with the minute bucket at 12:00:00
+        window = timedelta(minutes=30)
+        self.assertEqual(window_start(window, self.NOW), datetime(2026, 3, 4, 12, 0, tzinfo=dt_timezone.utc))
+        backend = self._backend([
+            self._application(datetime(2026, 3, 4, 11, 59, 59, tzinfo=dt_timezone.utc)),
+            self._application(datetime(2026, 3, 4, 12, 0, 0, tzinfo=dt_timezone.utc)),
+            self._application(self.NOW),
+        ])
+        self.assertEqual(backend.count('ip', '81.2.69.142', window, now=self.NOW), 2)
+
+        # Seven days are counted in hour buckets from the hour containing the start
+        week = timedelta(days=7)
+        self.assertEqual(window_start(week, self.NOW), datetime(2026, 2, 25, 12, 0, tzinfo=dt_timezone.utc))
+        backend = self._backend([
+            self._application(datetime(2026, 2, 25, 11, 59, 59, tzinfo=dt_timezone.utc)),
+            self._application(datetime(2026, 2, 25, 12, 0, 0, tzinfo=dt_timezone.utc)),
+        ])
+        self.assertEqual(backend.count('ip', '81.2.69.142', week, now=self.NOW), 1)
+
+    def test_application_is_left_out_of_its_own_counts(self):
+        current = self._application(self.NOW - timedelta(minutes=1))
+        old = self._application(self.NOW - timedelta(hours=2))
+        backend = self._backend([old, current, self._application(self.NOW - timedelta(minutes=5))])
+        windows = {'ip': ('ip', timedelta(hours=1)), 'email': ('email', timedelta(days=1)),
+                   'visitor': ('visitor', timedelta(days=1))}
+
+        self.assertEqual(velocity_counts(current, windows, backend=backend, now=self.NOW),
+                         {'ip': 1, 'email': 2, 'visitor': 0})
+        # Outside the hour window the application was never counted there, so nothing is taken off
+        self.assertEqual(velocity_counts(old, windows, backend=backend, now=self.NOW),
+                         {'ip': 2, 'email': 2, 'visitor': 0})
+
+    def test_backends_agree(self):
+        applications = [
+            self._application(self.NOW - timedelta(minutes=minutes), ip_address=f"81.2.69.{minutes % 3}",
+                              email=f"user{minutes % 2}@example.org")
+            for minutes in (0, 1, 29, 30, 31, 59, 61, 300, 2000, 9000, 20000)
+        ]
+        queries = [
+            (entity_type, key, window)
+            for entity_type, key in [('ip', '81.2.69.0'), ('ip', '81.2.69.1'), ('email', 'user0@example.org'),
+                                     ('subnet', '81.2.69.0/24'), ('phone', '5550100')]
+            for window in (timedelta(minutes=30), timedelta(hours=6), timedelta(hours=24), timedelta(days=7))
+        ]
+        cache = CacheBackend()
+        cache.cache.clear()
+        self.addCleanup(cache.cache.clear)
+        expected = self._backend(applications).count_many(queries, now=self.NOW)
+        self.assertTrue(any(expected))
+        for backend in (DatabaseBackend(), cache):
+            self.assertEqual(self._backend(applications, backend).count_many(queries, now=self.NOW), expected)
+
+
+class SimilarityIndexTests(SimpleTestCase):
+    NAME_PAIRS = [
+        ("Jonathan Smithers", "Jonathon Smithers"),
+        ("Katherine Johnson", "Katharine Johnson"),
+        ("Michael Anderson", "Micheal Anderson"),
+        ("Alexandra Petrova", "Alexandra Petrov"),
+    ]
+    ADDRESS_PAIRS = [
+        ("221 Baker Street, Flat 4, London", "221 Baker Street Flat 4 London"),
+        ("1600 Pennsylvania Avenue NW, Washington", "1600 Pennsylvania Ave NW, Washington"),
+        ("742 Evergreen Terrace, Springfield", "742 Evergreen Terrace Springfield"),
+    ]
+    UNRELATED = [
+        ("Maria Gonzalez", "Calle de Alcala 50, Madrid"),
+        ("Wei Zhang", "88 Nanjing Road, Shanghai"),
+        ("Olufemi Adeyemi", "14 Broad Street, Lagos"),
+        ("Ingrid Svensson", "Drottninggatan 3, Stockholm"),
+        ("Rahul Mehta", "Plot 9 Bandra West, Mumbai"),
+        ("Chloe Dubois", "5 Rue de Rivoli, Paris"),
+    ]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.index = SimilarityIndex(tmp.name)
+        self.visitors = iter(range(1, 1000))
+
+    def _add(self, full_name, address):
+        # Every application comes from its own visitor, so none is skipped as a self-match
+        application = LoanApplication(id=uuid.uuid4(), visitor_id_id=next(self.visitors),
+                                      full_name=full_name, address=address)
+        self.index.add(application)
+        return application
+
+    def test_near_duplicates_are_candidates_and_unrelated_rows_are_not(self):
+        unrelated = [self._add(name, address) for name, address in self.UNRELATED]
+        # Pair the near-duplicate field with an unrelated other field so each field's recall is checked alone
+        pairs = [
+            (self._add(a, f"{i} Unrelated Road {i * 7}"), self._add(b, f"Apartment {i * 13}, Nowhere {i}"))
+            for i, (a, b) in enumerate(self.NAME_PAIRS, start=1)
+        ] + [
+            (self._add(f"Person{i} Alpha", a), self._add(f"Someone{i} Omega", b))
+            for i, (a, b) in enumerate(self.ADDRESS_PAIRS, start=1)
+        ]
+        unrelated_ids = {application.id for application in unrelated}
+
+        for first, second in pairs:
+            with self.subTest(first=first.full_name, second=second.full_name):
+                matches = self.index.similar(first)
+                self.assertIn(second.id, matches)
+                self.assertEqual(set(matches) & unrelated_ids, set())
+                self.assertIn(first.id, self.index.similar(second))
+        for application in unrelated:
+            with self.subTest(unrelated=application.full_name):
+                self.assertEqual(self.index.similar(application), {})
+
+    def test_same_visitor_is_not_a_candidate(self):
+        first = self._add("Jonathan Smithers", "221 Baker Street, Flat 4, London")
+        second = LoanApplication(id=uuid.uuid4(), visitor_id_id=first.visitor_id_id,
+                                 full_name="Jonathon Smithers", address="221 Baker Street Flat 4 London")
+        self.index.add(second)
+
+        self.assertEqual(self.index.similar(first), {})
+
+
+class QuantileSketchTests(SimpleTestCase):
+    QUANTILES = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.values = np.concatenate([
+            rng.lognormal(mean=2.0, sigma=1.5, size=5000),
+            -rng.lognormal(mean=0.5, sigma=1.0, size=1000),
+            np.zeros(200),
+        ])
+        rng.shuffle(self.values)
+
+    def assertQuantilesAccurate(self, sketch, values):
+        for q in self.QUANTILES:
+            with self.subTest(q=q):
+                exact = np.quantile(values, q, method='lower')
+                self.assertLessEqual(abs(sketch.quantile(q) - exact), SKETCH_ALPHA * abs(exact) + 1e-12)
+
+    def test_quantiles_are_within_relative_accuracy(self):
+        sketch = QuantileSketch()
+        for value in self.values:
+            sketch.add(float(value))
+
+        self.assertEqual(sketch.count, len(self.values))
+        self.assertQuantilesAccurate(sketch, self.values)
+
+    def test_array_and_merged_sketches_match_a_single_sketch(self):
+        whole = QuantileSketch()
+        whole.add_array(self.values)
+        first, second = QuantileSketch(), QuantileSketch()
+        first.add_array(self.values[:2500])
+        second.add_array(self.values[2500:])
+        first.merge(second)
+
+        self.assertQuantilesAccurate(whole, self.values)
+        self.assertEqual(first.to_dict(), whole.to_dict())
+        self.assertEqual(QuantileSketch.from_dict(whole.to_dict()).quantile(0.5), whole.quantile(0.5))
+
+
+class PopulationStabilityTests(SimpleTestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(11)
+        self.training_values = self.rng.normal(50, 10, size=20000)
+        self.training = RunningStats.from_array(self.training_values)
+
+    def _exact_psi(self, expected, actual):
+        edges = np.quantile(expected, np.arange(1, 10) / 10)
+
+        def bin_masses(values):
+            below = np.searchsorted(np.sort(values), edges, side='right')
+            return np.maximum(np.diff(np.concatenate([[0], below, [len(values)]])) / len(values), 1e-4)
+
+        e, a = bin_masses(expected), bin_masses(actual)
+        return float(np.sum((a - e) * np.log(a / e)))
+
+    def test_same_distribution_is_stable(self):
+        recent = RunningStats.from_array(self.rng.normal(50, 10, size=5000))
+
+        self.assertLess(population_stability_index(self.training, recent), 0.02)
+
+    def test_shifted_distribution_drifts(self):
+        values = self.rng.normal(60, 10, size=5000)
+        psi = population_stability_index(self.training, RunningStats.from_array(values))
+
+        self.assertGreater(psi, PSI_DRIFT_THRESHOLD)
+        # Sketch bin masses are approximate, so allow a little slack against the exact figure
+        expected = self._exact_psi(self.training_values, values)
+        self.assertAlmostEqual(psi, expected, delta=0.1 * expected)
+
+
+class DriftFlushTests(TestCase):
+    HOUR = datetime(2026, 3, 4, 12, 0, tzinfo=dt_timezone.utc)
+
+    def _vector(self, value):
+        return [value] * len(FEATURE_NAMES)
+
+    def test_flush_merges_into_the_hourly_row(self):
+        monitor = DriftMonitor(flush_interval=3600)
+        for value in (1.0, 2.0, 3.0):
+            monitor.record(self._vector(value), at=self.HOUR + timedelta(minutes=5))
+        monitor.flush()
+        monitor.record(self._vector(4.0), at=self.HOUR + timedelta(minutes=50))
+        monitor.flush()
+
+        snapshot = FeatureDriftSnapshot.objects.get(hour=self.HOUR)
+        self.assertEqual(snapshot.application_count, 4)
+        self.assertEqual(FeatureStats.from_dict(snapshot.stats).features[FEATURE_NAMES[0]].mean, 2.5)
+
+    def test_flush_retries_when_a_concurrent_worker_creates_the_row(self):
+        existing = FeatureStats()
+        existing.add_vector(self._vector(10.0))
+        FeatureDriftSnapshot.objects.create(hour=self.HOUR, stats=existing.to_dict(), application_count=1)
+        monitor = DriftMonitor(flush_interval=3600)
+        monitor.record(self._vector(20.0), at=self.HOUR)
+        get_or_create = QuerySet.get_or_create
+        calls = []
+
+        def racing_get_or_create(queryset, *args, **kwargs):
+            # The first lookup loses the race: it missed the row and its insert hit the unique hour
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise IntegrityError("Duplicate entry for key 'hour'")
+            return get_or_create(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'get_or_create', autospec=True, side_effect=racing_get_or_create):
+            monitor.flush()
+
+        self.assertEqual(len(calls), 2)
+        snapshot = FeatureDriftSnapshot.objects.get(hour=self.HOUR)
+        self.assertEqual(snapshot.application_count, 2)
+        self.assertEqual(FeatureStats.from_dict(snapshot.stats).features[FEATURE_NAMES[0]].mean, 15.0)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.jobs = [
+            enqueue_scoring(LoanApplication.objects.create(full_name=f"Applicant {i}"), 'submit') for i in range(5)
+        ]
+
+    def _skip_locked(self, supported):
+        return mock.patch.object(connection.features, 'has_select_for_update_skip_locked', supported)
+
+    def test_claimed_jobs_are_not_handed_out_twice(self):
+        for supported in (True, False):
+            ScoringJob.objects.update(status='queued', locked_by=None, locked_at=None, attempts=0)
+            with self.subTest(skip_locked=supported), self._skip_locked(supported):
+                first = claim_jobs('worker-a', 3)
+                second = claim_jobs('worker-b', 3)
+                third = claim_jobs('worker-c', 3)
+
+                self.assertEqual([len(first), len(second), third], [3, 2, []])
+                claimed = [job.id for job in first + second]
+                self.assertCountEqual(claimed, [job.id for job in self.jobs])
+                self.assertEqual({job.locked_by for job in first}, {'worker-a'})
+                self.assertEqual({(job.status, job.attempts) for job in first + second}, {('running', 1)})
+
+    def test_job_taken_by_another_worker_mid_claim_is_skipped(self):
+        update = QuerySet.update
+        raced = self.jobs[0].id
+
+        def racing_update(queryset, **kwargs):
+            # Another worker claims the first job between our candidate read and our conditional update
+            if ScoringJob.objects.filter(id=raced, status='queued').exists():
+                update(ScoringJob.objects.filter(id=raced), status='running', locked_by='worker-b')
+            return update(queryset, **kwargs)
+
+        with self._skip_locked(False), \
+                mock.patch.object(QuerySet, 'update', autospec=True, side_effect=racing_update):
+            claimed = claim_jobs('worker-a', 5)
+
+        self.assertCountEqual([job.id for job in claimed], [job.id for job in self.jobs[1:]])
+        self.assertEqual(ScoringJob.objects.get(id=raced).locked_by, 'worker-b')
+
+    def test_enqueue_reuses_an_open_job(self):
+        application = self.jobs[0].loan_application
+        self.assertEqual(enqueue_scoring(application, 'rescore'), self.jobs[0])
+        claim_jobs('worker-a', 5)
+        self.assertEqual(enqueue_scoring(application, 'rescore'), self.jobs[0])
+
+    @override_settings(ML_JOB_MAX_ATTEMPTS=2)
+    def test_failed_job_is_retried_with_backoff_then_marked_failed(self):
+        job, = [job for job in claim_jobs('worker-a', 5) if job.id == self.jobs[0].id]
+        retry_job(job, ValueError("model unavailable"))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.last_error), ('queued', None, "model unavailable"))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=20))
+        # Not due again until its backoff has passed
+        self.assertEqual(claim_jobs('worker-a', 5), [])
+
+        with mock.patch('fraud_detection.job_queue.timezone.now', return_value=job.run_after):
+            job, = claim_jobs('worker-b', 5)
+        self.assertEqual((job.attempts, job.locked_by), (2, 'worker-b'))
+        with self.assertLogs('fraud_detection.job_queue', 'ERROR'):
+            retry_job(job, ValueError("still unavailable"))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_error), ('failed', "still unavailable"))
+        with mock.patch('fraud_detection.job_queue.timezone.now', return_value=timezone.now() + timedelta(days=1)):
+            self.assertEqual(claim_jobs('worker-c', 5), [])
+
+    @override_settings(ML_JOB_LOCK_TIMEOUT_SECONDS=60)
+    def test_stale_running_jobs_are_released(self):
+        claim_jobs('worker-a', 5)
+        ScoringJob.objects.filter(id=self.jobs[0].id).update(locked_at=timezone.now() - timedelta(minutes=5))
+
+        with self.assertLogs('fraud_detection.job_queue', 'WARNING'):
+            self.assertEqual(release_stale_jobs(), 1)
+        job, = claim_jobs('worker-b', 5)
+        self.assertEqual((job.id, job.attempts), (self.jobs[0].id, 2))
+
+
+class BacktestParityTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        visitors = [VisitorID.objects.create(visitor_id=f"visitor-{i}") for i in range(4)] + [None]
+        for i in range(40):
+            adjustment = float(rng.choice([0, 15, 35, -10]))
+            LoanApplication.objects.create(
+                visitor_id=visitors[i % len(visitors)],
+                full_name=["Jane Doe", "John Roe", "Test User", f"Person {i}"][int(rng.integers(4))],
+                email=["jane@example.org", "test1@example.com", f"user{i}@example.net"][int(rng.integers(3))],
+                phone=["5550100200", "12345-678-9012", f"555{i:07d}"][int(rng.integers(3))],
+                ip_address=["81.2.69.142", "81.2.69.160", f"10.0.{i}.1"][int(rng.integers(3))],
+                confidence_score=float(rng.choice([0.5, 0.92, 0.99])),
+                bot_detected=bool(rng.random() < 0.2),
+                vpn_detected=bool(rng.random() < 0.3),
+                proxy_detected=bool(rng.random() < 0.2),
+                tampering_detected=bool(rng.random() < 0.1),
+                incognito=bool(rng.random() < 0.3),
+                ml_status='complete' if adjustment else None,
+                metadata={'ml_status': 'complete', 'ml_risk_adjustment': adjustment} if adjustment else None,
+            )
+
+    def test_grid_at_current_configuration_matches_risk_scoring(self):
+        scoring = RiskScoringService()
+        plan = get_rule_plan()
+        configuration = current_configuration()
+        components = load_component_scores()
+        scores = score_grid(components, [configuration])[:, 0]
+        applications = LoanApplication.objects.in_bulk(components.ids)
+        # The counters the backtest replays: windows ending at each submission
+        contexts = RiskContext.load_many(applications.values())
+
+        expected_decisions = []
+        for application_id, score in zip(components.ids, scores):
+            application = applications[application_id]
+            rule_score = scoring.calculate_risk_score(application, contexts[application_id])
+            expected = min(100, rule_score + ml_adjustment(application))
+            expected_decisions.append(plan.decide(expected))
+            with self.subTest(application=application.full_name):
+                self.assertAlmostEqual(score, expected, places=9)
+                index = int((score > np.array(configuration['decision_bounds'])).sum())
+                self.assertEqual(plan.decisions[index], expected_decisions[-1])
+
+        self.assertEqual(len(components), 40)
+        self.assertGreater(len(set(expected_decisions)), 1)
+        baseline, _ = backtest(components, [], baseline=configuration)
+        self.assertEqual(baseline['decisions'], {
+            decision: expected_decisions.count(decision) for decision in plan.decisions
+        })
+
+
+class MLInsightsCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.model_dir = Path(directory.name)
+        model_dir_override = override_settings(ML_MODEL_DIR=directory.name)
+        model_dir_override.enable()
+        self.addCleanup(model_dir_override.disable)
+        get_insights_cache().clear()
+        self.addCleanup(get_insights_cache().clear)
+        self.loan_application = LoanApplication.objects.create(full_name="Jane Doe")
+        ApplicationFeatures.objects.filter(loan_application=self.loan_application).delete()
+        self._store_vector(np.zeros(len(FEATURE_NAMES), dtype=np.float32))
+        self._activate('v1')
+
+    def _activate(self, version):
+        (self.model_dir / 'active.json').write_text(json.dumps({'version': version}))
+
+    def _store_vector(self, vector):
+        ApplicationFeatures.objects.update_or_create(loan_application=self.loan_application, defaults={
+            'application_date': self.loan_application.application_date,
+            'schema_version': FEATURE_SCHEMA_VERSION,
+            'vector': vector.tobytes(),
+        })
+
+    def _get(self, enhancer):
+        version = json.loads((self.model_dir / 'active.json').read_text())['version']
+        enhancer.return_value.enhance_fraud_detection.side_effect = lambda app, score: {
+            'enhanced_risk_score': score, 'ml_risk_adjustment': 0, 'behavioral_analysis': {'model_version': version},
+        }
+        url = reverse('fraud_detection:get_ml_insights')
+        response = self.client.get(url, {'application_id': str(self.loan_application.id)})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['cached']
+
+    def test_cache_hits_skip_the_model_and_misses_follow_version_and_features(self):
+        with mock.patch('fraud_detection.ml_services.MLFraudEnhancer') as enhancer, \
+                mock.patch('fraud_detection.views.get_enhanced_decision_with_explanation', return_value={}):
+            self.assertFalse(self._get(enhancer))
+            self.assertTrue(self._get(enhancer))
+            self.assertEqual(enhancer.call_count, 1)
+
+            self._activate('v2')
+            self.assertFalse(self._get(enhancer))
+            self.assertTrue(self._get(enhancer))
+
+            self._store_vector(np.ones(len(FEATURE_NAMES), dtype=np.float32))
+            self.assertFalse(self._get(enhancer))
+            self.assertTrue(self._get(enhancer))
+            self.assertEqual(enhancer.call_count, 3)
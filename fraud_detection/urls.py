@@ -24,9 +24,12 @@ urlpatterns = [
     path('admin/fraud-analytics/', views.fraud_analytics, name='fraud_analytics'),
     path('admin/application/<uuid:application_id>/', views.application_details, name='application_details'),
     path('admin/application/<uuid:application_id>/update-status/', views.update_application_status, name='update_application_status'),
+    path('admin/application/<uuid:application_id>/ring/', views.application_ring, name='application_ring'),
     path('admin/export-applications/', views.export_applications, name='export_applications'),
     
     # ADMIN ML FEATURES (Protected)
     path('admin/ml-insights/', views.get_ml_insights, name='get_ml_insights'),
     path('admin/batch-analysis/', views.batch_ml_analysis, name='batch_ml_analysis'),
+    path('admin/feature-drift/', views.feature_drift, name='feature_drift'),
+    path('admin/ruleset/', views.ruleset_stats, name='ruleset_stats'),
 ]
@@ -4,11 +4,11 @@ import requests
 import logging
 from datetime import timedelta
 from django.utils.timezone import now
-from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
 from tenacity import retry, stop_after_attempt, wait_fixed
 from .models import LoanApplication, VisitorID, FraudAlert
+from .velocity import velocity_counts
 import json
 
 
@@ -18,6 +18,8 @@ FINGERPRINT_API_URL = os.getenv("FINGERPRINT_API_URL")
 
 logger = logging.getLogger(__name__)
 
+RAPID_SUBMISSION_WINDOW = timedelta(minutes=30)
+
 def get_client_ip(request):
     """Extracts client IP address from request headers."""
     x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
@@ -71,16 +73,14 @@ def detect_fraud(loan_application, extended_metadata=None):
     
     # Check for rapid submissions
     if loan_application.visitor_id:
-        recent_apps = LoanApplication.objects.filter(
-            visitor_id=loan_application.visitor_id,
-            application_date__gte=timezone.now() - timedelta(minutes=30)
-        ).exclude(id=loan_application.id)
+        recent_apps = velocity_counts(loan_application, {'visitor': ('visitor', RAPID_SUBMISSION_WINDOW)})['visitor']
         
-        if recent_apps.count() > 2:
+        if recent_apps > 2:
             fraud_reasons.append("Multiple applications in short timeframe")
     
     if fraud_reasons:
-        FraudAlert.objects.create(
+        FraudAlert.record(
+            f"signals:{loan_application.id}",
             loan_application=loan_application,
             visitor_id=loan_application.visitor_id,
             reason=" | ".join(fraud_reasons),
@@ -0,0 +1,334 @@
+# fraud_detection/velocity.py
+"""
+Time-bucketed application counters per entity (visitor, IP, /24 or /48
+subnet, email, phone). Each submission increments one minute bucket and
+one hour bucket per entity, so "applications in the last N minutes/days"
+is a sum over a bounded number of buckets instead of a COUNT over the
+applications table. Counters live behind a pluggable backend (settings.VELOCITY_BACKEND).
+"""
+import hashlib
+import logging
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .ip_index import application_subnet
+from .models import LoanApplication, VelocityCounter
+from .normalization import normalize_email, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+MINUTE = 60
+HOUR = 3600
+# Bucket width -> how long its buckets are kept
+RETENTION = {
+    MINUTE: timedelta(days=1),
+    HOUR: timedelta(days=31),
+}
+# Windows up to this long are counted in minute buckets, longer ones in hour buckets
+MINUTE_BUCKET_MAX_WINDOW = timedelta(hours=6)
+
+REBUILD_BATCH_SIZE = 2000
+
+
+def application_entities(loan_application):
+    """(entity_type, key) pairs an application is counted under."""
+    entities = []
+    if loan_application.visitor_id_id:
+        entities.append(('visitor', str(loan_application.visitor_id_id)))
+    if loan_application.ip_address:
+        entities.append(('ip', loan_application.ip_address))
+    subnet = application_subnet(loan_application)
+    if subnet:
+        entities.append(('subnet', subnet))
+    email = normalize_email(loan_application.email)
+    if email:
+        entities.append(('email', email[:255]))
+    phone = normalize_phone(loan_application.phone)
+    if phone:
+        entities.append(('phone', phone[:255]))
+    return entities
+
+
+def bucket_start(at, granularity):
+    """Epoch second at which the bucket containing `at` starts."""
+    epoch = int(at.timestamp())
+    return epoch - epoch % granularity
+
+
+def as_datetime(epoch):
+    return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+
+
+def granularity_for(window):
+    if window > RETENTION[HOUR]:
+        raise ValueError(f"Velocity windows are limited to {RETENTION[HOUR]}")
+    return MINUTE if window <= MINUTE_BUCKET_MAX_WINDOW else HOUR
+
+
+def window_buckets(window, now):
+    """
+    Granularity and the first and last bucket starts covering the window
+    ending at `now`. The oldest bucket is included whole, so windows are
+    rounded outward to the bucket width.
+    """
+    granularity = granularity_for(window)
+    return granularity, bucket_start(now - window, granularity), bucket_start(now, granularity)
+
+
+def window_start(window, now):
+    """Earliest time counted by a window ending at `now`, i.e. the start of its oldest bucket."""
+    return as_datetime(window_buckets(window, now)[1])
+
+
+def bucket_counts(loan_applications):
+    """Counter of (entity_type, key, granularity, bucket start epoch) increments for applications."""
+    counts = Counter()
+    for loan_application in loan_applications:
+        at = loan_application.application_date or timezone.now()
+        for entity_type, key in application_entities(loan_application):
+            for granularity in RETENTION:
+                counts[(entity_type, key, granularity, bucket_start(at, granularity))] += 1
+    return counts
+
+
+class VelocityBackend:
+    """
+    Counter storage. Backends implement increment(), count_many(),
+    replace() and prune(); queries are (entity_type, key, window) tuples.
+    """
+
+    def increment(self, counts):
+        """Add a Counter of (entity_type, key, granularity, bucket start epoch) increments."""
+        raise NotImplementedError
+
+    def count_many(self, queries, now=None):
+        """Applications per (entity_type, key, window) query, in query order."""
+        raise NotImplementedError
+
+    def replace(self, counts):
+        """Drop every counter and load `counts` (used by rebuilds)."""
+        raise NotImplementedError
+
+    def prune(self, now=None):
+        """Drop buckets past their retention."""
+
+    def count(self, entity_type, key, window, now=None):
+        return self.count_many([(entity_type, key, window)], now=now)[0]
+
+
+class InMemoryBackend(VelocityBackend):
+    """Per-process counters; for single-process deployments and tests."""
+
+    def __init__(self):
+        self._buckets = defaultdict(Counter)  # (entity_type, key, granularity) -> {bucket_start: count}
+        self._lock = threading.Lock()
+
+    def increment(self, counts):
+        with self._lock:
+            for (entity_type, key, granularity, start), count in counts.items():
+                self._buckets[(entity_type, key, granularity)][start] += count
+
+    def count_many(self, queries, now=None):
+        now = now or timezone.now()
+        results = []
+        with self._lock:
+            for entity_type, key, window in queries:
+                granularity, first, last = window_buckets(window, now)
+                buckets = self._buckets.get((entity_type, key, granularity), {})
+                if len(buckets) * granularity < last - first:
+                    results.append(sum(count for start, count in buckets.items() if first <= start <= last))
+                else:
+                    results.append(sum(buckets.get(start, 0) for start in range(first, last + 1, granularity)))
+        return results
+
+    def replace(self, counts):
+        with self._lock:
+            self._buckets.clear()
+        self.increment(counts)
+
+    def prune(self, now=None):
+        now = now or timezone.now()
+        with self._lock:
+            for (entity_type, key, granularity), buckets in list(self._buckets.items()):
+                cutoff = bucket_start(now - RETENTION[granularity], granularity)
+                for start in [start for start in buckets if start < cutoff]:
+                    del buckets[start]
+                if not buckets:
+                    del self._buckets[(entity_type, key, granularity)]
+
+
+class DatabaseBackend(VelocityBackend):
+    """VelocityCounter rows shared by every worker; the default backend."""
+
+    def increment(self, counts):
+        """
+        Create missing buckets at zero (ignoring ones another worker just
+        created), then add to every bucket with one UPDATE per distinct
+        increment, usually a single one.
+        """
+        if not counts:
+            return
+        by_increment = defaultdict(Q)
+        for (entity_type, key, granularity, start), count in counts.items():
+            by_increment[count] |= Q(entity_type=entity_type, key=key, granularity=granularity,
+                                     bucket_start=as_datetime(start))
+        with transaction.atomic():
+            VelocityCounter.objects.bulk_create(
+                [
+                    VelocityCounter(entity_type=entity_type, key=key, granularity=granularity,
+                                    bucket_start=as_datetime(start), count=0)
+                    for entity_type, key, granularity, start in counts
+                ],
+                ignore_conflicts=True
+            )
+            for count, buckets in by_increment.items():
+                VelocityCounter.objects.filter(buckets).update(count=F('count') + count)
+
+    def count_many(self, queries, now=None):
+        now = now or timezone.now()
+        if not queries:
+            return []
+        scope = Q()
+        sums = {}
+        for i, (entity_type, key, window) in enumerate(queries):
+            granularity, first, _ = window_buckets(window, now)
+            condition = Q(entity_type=entity_type, key=key, granularity=granularity,
+                          bucket_start__gte=as_datetime(first))
+            scope |= condition
+            sums[f"q{i}"] = Sum('count', filter=condition)
+        totals = VelocityCounter.objects.filter(scope).aggregate(**sums)
+        return [totals[f"q{i}"] or 0 for i in range(len(queries))]
+
+    def replace(self, counts):
+        with transaction.atomic():
+            VelocityCounter.objects.all().delete()
+            VelocityCounter.objects.bulk_create(
+                [
+                    VelocityCounter(entity_type=entity_type, key=key, granularity=granularity,
+                                    bucket_start=as_datetime(start), count=count)
+                    for (entity_type, key, granularity, start), count in counts.items()
+                ],
+                batch_size=REBUILD_BATCH_SIZE
+            )
+
+    def prune(self, now=None):
+        now = now or timezone.now()
+        expired = Q()
+        for granularity, retention in RETENTION.items():
+            expired |= Q(granularity=granularity, bucket_start__lt=as_datetime(bucket_start(now - retention, granularity)))
+        return VelocityCounter.objects.filter(expired).delete()[0]
+
+
+class CacheBackend(VelocityBackend):
+    """
+    Counters in the 'velocity' cache alias, one key per bucket with its
+    retention as TTL. Pointed at a Redis or Memcached cache this is the
+    shared-service backend; the default LocMem alias stands in for one.
+    """
+
+    def __init__(self, alias='velocity'):
+        self.cache = caches[alias]
+
+    def _key(self, entity_type, key, granularity, start):
+        # Hashed so emails and IPv6 addresses are valid memcached keys
+        digest = hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+        return f"velocity:{entity_type}:{digest}:{granularity}:{start}"
+
+    def increment(self, counts):
+        for (entity_type, key, granularity, start), count in counts.items():
+            cache_key = self._key(entity_type, key, granularity, start)
+            timeout = int(RETENTION[granularity].total_seconds()) + granularity
+            self.cache.add(cache_key, 0, timeout=timeout)
+            try:
+                self.cache.incr(cache_key, count)
+            except ValueError:
+                # Expired between add() and incr()
+                self.cache.add(cache_key, count, timeout=timeout)
+
+    def count_many(self, queries, now=None):
+        now = now or timezone.now()
+        keys_per_query = []
+        for entity_type, key, window in queries:
+            granularity, first, last = window_buckets(window, now)
+            keys_per_query.append([
+                self._key(entity_type, key, granularity, start) for start in range(first, last + 1, granularity)
+            ])
+        values = self.cache.get_many([key for keys in keys_per_query for key in keys])
+        return [sum(values.get(key, 0) for key in keys) for keys in keys_per_query]
+
+    def replace(self, counts):
+        # The alias is dedicated to velocity counters
+        self.cache.clear()
+        self.increment(counts)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_velocity_backend():
+    """The backend named by settings.VELOCITY_BACKEND, one instance per process."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.VELOCITY_BACKEND)()
+    return _backend
+
+
+def record_application(loan_application, backend=None):
+    """Count a new application under each of its entities."""
+    (backend or get_velocity_backend()).increment(bucket_counts([loan_application]))
+
+
+def velocity_counts(loan_application, windows, backend=None, now=None):
+    """
+    {name: other applications sharing the application's entity within the
+    window} for `windows` given as {name: (entity_type, window)}. The
+    application itself is left out when it falls inside the (bucket-rounded)
+    window, and entities it does not have count 0.
+    """
+    now = now or timezone.now()
+    entities = dict(application_entities(loan_application))
+    names = [name for name, (entity_type, _) in windows.items() if entity_type in entities]
+    counts = dict.fromkeys(windows, 0)
+    if not names:
+        return counts
+
+    queries = [(windows[name][0], entities[windows[name][0]], windows[name][1]) for name in names]
+    applied = loan_application.application_date
+    for name, count in zip(names, (backend or get_velocity_backend()).count_many(queries, now=now)):
+        if applied and applied >= window_start(windows[name][1], now):
+            count -= 1
+        counts[name] = max(count, 0)
+    return counts
+
+
+def rebuild_velocity_counters(backend=None, batch_size=REBUILD_BATCH_SIZE, now=None):
+    """Recount every application inside the retention period; returns the number counted."""
+    backend = backend or get_velocity_backend()
+    now = now or timezone.now()
+    since = now - max(RETENTION.values())
+    applications = LoanApplication.objects.filter(application_date__gte=since).only(
+        'id', 'visitor_id', 'ip_address', 'public_ip', 'email', 'phone', 'application_date'
+    )
+    counts = Counter()
+    counted = 0
+    for loan_application in applications.iterator(chunk_size=batch_size):
+        counts.update(bucket_counts([loan_application]))
+        counted += 1
+    # Minute buckets older than their retention are dropped rather than loaded
+    backend.replace(Counter({
+        bucket: count for bucket, count in counts.items()
+        if bucket[3] >= bucket_start(now - RETENTION[bucket[2]], bucket[2])
+    }))
+    logger.info(f"Rebuilt velocity counters from {counted} applications")
+    return counted
@@ -13,6 +13,8 @@ import json
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Q, Count, Avg
 from datetime import timedelta
+from .insights_cache import get_insights_cache, insights_key, stored_features
+from .model_pointer import active_version
 from .services import (
     EnhancedFraudDetectionService, 
     EnhancedRiskScoringService, 
@@ -20,7 +22,6 @@ from .services import (
     RiskScoringService, 
     FraudDetectionService
 )
-from .ml_services import MLFraudEnhancer
 from django.utils import timezone
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
@@ -33,6 +34,7 @@ from fraud_detection.services import RiskScoringService, FraudDetectionService
 from django.db import transaction
 import logging
 import requests 
+import uuid
 
 # Configure the logger
 logger = logging.getLogger(__name__)
@@ -726,6 +728,9 @@ def apply_for_loan_enhanced(request):
                 
                 loan_app.save()
                 
+                # Materialize behavioral features once, for training and scoring
+                enhanced_fraud_service.ml_enhancer.behavioral_analyzer.feature_store.materialize(loan_app)
+                
                 # ML fraud detection
                 fraud_detected, enhanced_risk_score, ml_results = enhanced_fraud_service.detect_fraud_with_ml(loan_app)
                 
@@ -756,7 +761,10 @@ def apply_for_loan_enhanced(request):
                 return JsonResponse({
                     "success": True,
                     "message": "Application submitted successfully",
-                    "redirect_url": "/success/"
+                    "redirect_url": "/success/",
+                    "decision_path": ml_results.get('decision_path', 'rules'),
+                    # Rule-based decisions may still change once the ML stage runs
+                    "provisional": loan_app.ml_status == 'pending'
                 }, status=201)
             
         except Exception as e:
@@ -772,6 +780,8 @@ def apply_for_loan_enhanced(request):
 def get_ml_insights(request):
     """
     API endpoint to get ML insights for existing applications.
+    Results are cached per application, model version and feature hash;
+    pass refresh=true to recompute.
     """
     if request.method != "GET":
         return JsonResponse({"error": "Invalid request method"}, status=405)
@@ -786,20 +796,29 @@ def get_ml_insights(request):
         except LoanApplication.DoesNotExist:
             return JsonResponse({"error": "Application not found"}, status=404)
         
-        # Initialize ML services
+        # The key needs only the active pointer and the stored feature bytes, so a
+        # cache hit loads neither the model nor the ML libraries
+        cache = get_insights_cache()
+        refresh = request.GET.get('refresh', '').lower() == 'true'
+        if not refresh:
+            insights = cache.get(insights_key(loan_app, active_version(), stored_features(loan_app.id)))
+            if insights is not None:
+                return JsonResponse({**insights, "cached": True})
+        
+        # Initialize ML services; imported here so other views never load the ML stack
+        from .ml_services import MLFraudEnhancer
         ml_enhancer = MLFraudEnhancer()
-        behavioral_analyzer = ml_enhancer.behavioral_analyzer
         
-        # Get fresh ML analysis
-        behavioral_analysis = behavioral_analyzer.analyze_current_application(loan_app)
+        # One analysis feeds both the enhanced score and the behavioral details
         ml_results = ml_enhancer.enhance_fraud_detection(loan_app, float(loan_app.risk_score))
+        behavioral_analysis = ml_results['behavioral_analysis']
         
         # Get decision explanation
         decision_info = get_enhanced_decision_with_explanation(
             loan_app, ml_results['enhanced_risk_score'], ml_results
         )
         
-        return JsonResponse({
+        insights = {
             "application_id": str(loan_app.id),
             "current_status": loan_app.status,
             "original_risk_score": float(loan_app.risk_score),
@@ -808,7 +827,14 @@ def get_ml_insights(request):
             "decision_info": decision_info,
             "behavioral_analysis": behavioral_analysis,
             "recommendations": _generate_recommendations(behavioral_analysis, loan_app)
-        })
+        }
+        model_version = behavioral_analysis.get('model_version')
+        if model_version:
+            # Keyed by the model that produced the insights and the features it read,
+            # which the analysis materializes when they were missing
+            cache.set(insights_key(loan_app, model_version, stored_features(loan_app.id)), insights)
+        
+        return JsonResponse({**insights, "cached": False})
         
     except Exception as e:
         logger.error(f"Error getting ML insights: {str(e)}")
@@ -865,6 +891,13 @@ def _generate_recommendations(behavioral_analysis, loan_app):
     
     return recommendations
 
+def _parse_uuid(value):
+    """Return value as a UUID, or None if it is not a valid application ID."""
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
 # Additional utility endpoint for batch ML analysis
 @csrf_exempt
 def batch_ml_analysis(request):
@@ -881,21 +914,37 @@ def batch_ml_analysis(request):
         if not application_ids:
             return JsonResponse({"error": "No application IDs provided"}, status=400)
         
-        # Limit batch size to prevent performance issues
-        if len(application_ids) > 50:
-            return JsonResponse({"error": "Batch size limited to 50 applications"}, status=400)
-        
         results = []
+        from .ml_services import MLFraudEnhancer
         ml_enhancer = MLFraudEnhancer()
+        chunk_size = settings.ML_BATCH_CHUNK_SIZE
         
-        for app_id in application_ids:
+        # Fetch and score in chunks so memory stays flat for large batches
+        for start in range(0, len(application_ids), chunk_size):
+            chunk_ids = application_ids[start:start + chunk_size]
+            
+            parsed_ids = [_parse_uuid(app_id) for app_id in chunk_ids]
+            applications = LoanApplication.objects.in_bulk([pk for pk in parsed_ids if pk])
+            
+            found = []
+            for app_id, pk in zip(chunk_ids, parsed_ids):
+                loan_app = applications.get(pk)
+                if loan_app is None:
+                    results.append({
+                        "application_id": app_id,
+                        "error": "Application not found"
+                    })
+                    continue
+                found.append(loan_app)
+            
             try:
-                loan_app = LoanApplication.objects.get(id=app_id)
-                
-                # Run ML analysis
-                behavioral_analysis = ml_enhancer.behavioral_analyzer.analyze_current_application(loan_app)
-                ml_results = ml_enhancer.enhance_fraud_detection(loan_app, float(loan_app.risk_score))
-                
+                chunk_results = ml_enhancer.enhance_many(found)
+            except Exception as e:
+                results.extend({"application_id": str(app.id), "error": str(e)} for app in found)
+                continue
+            
+            for loan_app, ml_results in zip(found, chunk_results):
+                behavioral_analysis = ml_results['behavioral_analysis']
                 results.append({
                     "application_id": str(loan_app.id),
                     "applicant_name": loan_app.full_name,
@@ -906,17 +955,6 @@ def batch_ml_analysis(request):
                     "anomaly_detected": behavioral_analysis.get('anomaly_detected'),
                     "recommendation": "review" if behavioral_analysis.get('anomaly_detected') else "approve"
                 })
-                
-            except LoanApplication.DoesNotExist:
-                results.append({
-                    "application_id": app_id,
-                    "error": "Application not found"
-                })
-            except Exception as e:
-                results.append({
-                    "application_id": app_id,
-                    "error": str(e)
-                })
         
         # Generate summary statistics
         successful_analyses = [r for r in results if 'error' not in r]
@@ -938,6 +976,104 @@ def batch_ml_analysis(request):
         logger.error(f"Error in batch ML analysis: {str(e)}")
         return JsonResponse({"error": "Batch analysis failed"}, status=500)
 
+@staff_member_required
+def feature_drift(request):
+    """
+    Compare behavioral feature statistics from the last `hours` hours
+    (default 24) with the training distribution of the active model.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Invalid request method"}, status=405)
+    
+    try:
+        hours = int(request.GET.get('hours', 24))
+    except ValueError:
+        return JsonResponse({"error": "hours must be an integer"}, status=400)
+    
+    try:
+        from .drift import FeatureStats, compare_to_training, get_drift_monitor, load_recent_stats
+        from .ml_registry import BehavioralModelRegistry
+        
+        model = BehavioralModelRegistry().load_active()
+        if model is None or model.feature_stats is None:
+            return JsonResponse({"error": "Active model has no training distribution; retrain it"}, status=409)
+        
+        # Include this process's buffered statistics
+        get_drift_monitor().flush()
+        since = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1)
+        recent, hourly = load_recent_stats(since)
+        
+        features = compare_to_training(FeatureStats.from_dict(model.feature_stats), recent)
+        return JsonResponse({
+            "model_version": model.version,
+            "since": since.isoformat(),
+            "applications": recent.count,
+            "drifted_features": [name for name, report in features.items() if report['drifted']],
+            "features": features,
+            "hourly": hourly
+        })
+        
+    except Exception as e:
+        logger.error(f"Error building feature drift report: {str(e)}")
+        return JsonResponse({"error": "Failed to build drift report"}, status=500)
+
+@staff_member_required
+def ruleset_stats(request):
+    """Version of the active ruleset and this process's per-rule hit counts since it was loaded."""
+    if request.method != "GET":
+        return JsonResponse({"error": "Invalid request method"}, status=405)
+    
+    try:
+        from .rules import get_rule_plan
+        
+        return JsonResponse(get_rule_plan().stats())
+    except Exception as e:
+        logger.error(f"Error loading ruleset stats: {str(e)}")
+        return JsonResponse({"error": "Failed to load ruleset"}, status=500)
+
+@staff_member_required
+def application_ring(request, application_id):
+    """
+    The fraud ring of an application: applications linked to it through
+    any chain of shared identifiers, highest risk first (up to `limit`,
+    default 100).
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Invalid request method"}, status=405)
+    
+    try:
+        limit = min(int(request.GET.get('limit', 100)), 1000)
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer"}, status=400)
+    
+    try:
+        from .rings import ring_of
+        
+        ring, members = ring_of(application_id, member_limit=limit)
+        if ring is None:
+            return JsonResponse({"error": "Application is not in a fraud ring"}, status=404)
+        
+        return JsonResponse({
+            "ring_id": str(ring.id),
+            "size": ring.size,
+            "mean_risk": round(ring.mean_risk, 2),
+            "max_risk": ring.max_risk,
+            "truncated": ring.size > len(members),
+            "members": [
+                {
+                    "application_id": str(member.loan_application_id),
+                    "full_name": member.loan_application.full_name,
+                    "status": member.loan_application.status,
+                    "risk_score": member.risk_score,
+                    "application_date": member.loan_application.application_date.isoformat(),
+                }
+                for member in members
+            ],
+        })
+    except Exception as e:
+        logger.error(f"Error loading fraud ring for {application_id}: {str(e)}")
+        return JsonResponse({"error": "Failed to load fraud ring"}, status=500)
+
 @staff_member_required
 def fraud_analytics(request):
     """
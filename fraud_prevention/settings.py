@@ -98,7 +98,106 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 # ML INSIGHTS
 ML_ANALYSIS_ENABLED = os.getenv('ENABLE_ML_ANALYSIS', 'false').lower() == 'true'
-ML_BATCH_SIZE_LIMIT = int(os.getenv('ML_BATCH_SIZE_LIMIT', 50))
+# Batch analysis fetches and scores applications in chunks of this size
+ML_BATCH_CHUNK_SIZE = int(os.getenv('ML_BATCH_CHUNK_SIZE', 500))
+
+# Deadline for the ML stage of a submission; slower or overloaded scoring
+# falls back to the rule-based score and is rescored later
+ML_SCORING_BUDGET_MS = int(os.getenv('ML_SCORING_BUDGET_MS', 500))
+ML_MAX_CONCURRENT_SCORING = int(os.getenv('ML_MAX_CONCURRENT_SCORING', 4))
+
+# Skip inline ML scoring entirely: submissions get the rule-based decision
+# and the ML stage runs in `manage.py run_scoring_worker`
+ML_ASYNC_SCORING = os.getenv('ML_ASYNC_SCORING', 'false').lower() == 'true'
+ML_JOB_MAX_ATTEMPTS = int(os.getenv('ML_JOB_MAX_ATTEMPTS', 5))
+# Running jobs locked for longer than this are assumed to belong to a dead worker
+ML_JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv('ML_JOB_LOCK_TIMEOUT_SECONDS', 300))
+
+# Load the active model at startup; enable only in processes that score
+# inline, as everything else imports the ML stack on first use
+ML_PRELOAD_MODEL = os.getenv('ML_PRELOAD_MODEL', 'false').lower() == 'true'
+
+# Versioned behavioral models are trained offline and stored here
+ML_MODEL_DIR = os.getenv('ML_MODEL_DIR', os.path.join(BASE_DIR, 'ml_models'))
+ML_TRAINING_WINDOW_DAYS = int(os.getenv('ML_TRAINING_WINDOW_DAYS', 30))
+ML_MIN_TRAINING_SAMPLES = int(os.getenv('ML_MIN_TRAINING_SAMPLES', 10))
+# Upper bound on training rows; larger windows are sampled with a fixed seed
+ML_TRAINING_SAMPLE_SIZE = int(os.getenv('ML_TRAINING_SAMPLE_SIZE', 20000))
+ML_TRAINING_SAMPLE_SEED = int(os.getenv('ML_TRAINING_SAMPLE_SEED', 42))
+
+# Cached get_ml_insights responses; point 'ml_insights' at a shared backend
+# (Redis, Memcached) in multi-process deployments
+ML_INSIGHTS_CACHE_TTL = int(os.getenv('ML_INSIGHTS_CACHE_TTL', 900))
+ML_INSIGHTS_CACHE_MAX_ENTRIES = int(os.getenv('ML_INSIGHTS_CACHE_MAX_ENTRIES', 5000))
+
+# Memory-mapped rolling-window feature matrix shared by all workers
+ML_SNAPSHOT_DIR = os.getenv('ML_SNAPSHOT_DIR', os.path.join(ML_MODEL_DIR, 'snapshots'))
+ML_SNAPSHOT_MAX_AGE_MINUTES = int(os.getenv('ML_SNAPSHOT_MAX_AGE_MINUTES', 60))
+
+# Rule-based detection stages: retries of transient errors (database, file
+# index) with exponential backoff, and a per-stage circuit breaker that fails
+# fast after repeated failures
+DETECTION_STAGE_RETRIES = int(os.getenv('DETECTION_STAGE_RETRIES', 2))
+DETECTION_RETRY_BASE_DELAY_MS = int(os.getenv('DETECTION_RETRY_BASE_DELAY_MS', 100))
+DETECTION_RETRY_MAX_DELAY_MS = int(os.getenv('DETECTION_RETRY_MAX_DELAY_MS', 1000))
+DETECTION_BREAKER_FAILURES = int(os.getenv('DETECTION_BREAKER_FAILURES', 5))
+DETECTION_BREAKER_RESET_SECONDS = int(os.getenv('DETECTION_BREAKER_RESET_SECONDS', 30))
+
+# Device risk scores, decision thresholds and fake-data patterns; the file
+# is reloaded when its mtime changes
+RISK_RULESET_PATH = os.getenv('RISK_RULESET_PATH', os.path.join(BASE_DIR, 'fraud_detection', 'rulesets', 'default.json'))
+
+# Time-bucketed application counters per visitor, IP, subnet, email and phone:
+# fraud_detection.velocity.DatabaseBackend (shared, default), CacheBackend
+# (the 'velocity' cache alias; point it at Redis in production) or
+# InMemoryBackend (single process)
+VELOCITY_BACKEND = os.getenv('VELOCITY_BACKEND', 'fraud_detection.velocity.DatabaseBackend')
+# Window of the shared-IP check in the IP risk component
+VELOCITY_IP_WINDOW_HOURS = int(os.getenv('VELOCITY_IP_WINDOW_HOURS', 24))
+
+# Applications from one address / one /24 (IPv4) or /48 (IPv6) subnet in
+# the IP window above which the IP risk component fires
+IP_VELOCITY_THRESHOLD = int(os.getenv('IP_VELOCITY_THRESHOLD', 5))
+SUBNET_VELOCITY_THRESHOLD = int(os.getenv('SUBNET_VELOCITY_THRESHOLD', 15))
+# Blocklisted CIDR ranges, one per line ('#' comments); reloaded when the
+# file changes, and a missing file blocklists nothing
+IP_BLOCKLIST_PATH = os.getenv('IP_BLOCKLIST_PATH', os.path.join(BASE_DIR, 'ip_blocklist.txt'))
+
+# Near-duplicate name/address index (MinHash/LSH), an append-only log shared
+# by all workers; build it with `manage.py rebuild_similarity_index`
+SIMILARITY_INDEX_DIR = os.getenv('SIMILARITY_INDEX_DIR', os.path.join(BASE_DIR, 'similarity_index'))
+# Minimum estimated Jaccard similarity of name bigrams / address trigrams
+SIMILARITY_NAME_THRESHOLD = float(os.getenv('SIMILARITY_NAME_THRESHOLD', 0.5))
+SIMILARITY_ADDRESS_THRESHOLD = float(os.getenv('SIMILARITY_ADDRESS_THRESHOLD', 0.7))
+
+# Fraud rings: applications linked by any shared identifier of these types
+# (visitor, ip, email, phone, address); build with `manage.py rebuild_fraud_rings`
+FRAUD_RING_KEY_TYPES = set(os.getenv('FRAUD_RING_KEY_TYPES', 'visitor,ip,email,phone,address').split(','))
+# An identifier shared by this many applications (an office IP, a busy
+# address) stops linking further ones, so hubs do not merge unrelated rings
+FRAUD_RING_MAX_KEY_APPLICATIONS = int(os.getenv('FRAUD_RING_MAX_KEY_APPLICATIONS', 25))
+# Rings with at least this many other applications raise the identity risk
+FRAUD_RING_MIN_LINKED = int(os.getenv('FRAUD_RING_MIN_LINKED', 3))
+
+# CACHES
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Least recently used entries are evicted past MAX_ENTRIES
+    "ml_insights": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "ml-insights",
+        "TIMEOUT": ML_INSIGHTS_CACHE_TTL,
+        "OPTIONS": {"MAX_ENTRIES": ML_INSIGHTS_CACHE_MAX_ENTRIES},
+    },
+    # Used by the velocity CacheBackend; entries expire with their bucket
+    "velocity": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "velocity",
+        "OPTIONS": {"MAX_ENTRIES": 200000},
+    },
+}
 
 # EMAIL CONFIGURATION (for fraud alerts)
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"